@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+
+# Feature columns per shape
+SHAPES = {"narrow": 8, "wide": 200}
+FEATURES = ("numeric", "categorical", "mixed")
+TASKS = ("regression", "binary", "multiclass")
+
+# Class labels of classification targets: 0..k-1 or strings. XGBoost
+# only accepts the former, so string labels test label handling
+LABELS = ("int", "str")
+
+# Categorical columns cycle through these cardinalities
+CARDINALITIES = (5, 50, 1000)
+
+# Share of feature values blanked so cleaning has imputation to do
+MISSING_RATE = 0.02
+
+
+def _numeric_column(rng, rows, i):
+    # Alternate normal, skewed and integer columns
+    kind = i % 3
+    if kind == 0:
+        return rng.normal(size=rows)
+    if kind == 1:
+        return rng.lognormal(sigma=1.0, size=rows)
+    return rng.integers(0, 100, rows).astype(np.float64)
+
+
+def make_dataset(rows, shape="narrow", features="mixed", task="binary", seed=0, labels="int"):
+    """A synthetic frame with a ``target`` column that depends on every
+    feature, for the given shape, feature mix and task. ``labels`` picks
+    integer or string classes for classification tasks."""
+    rng = np.random.default_rng(seed)
+    n_columns = SHAPES[shape]
+    n_categorical = {"numeric": 0, "categorical": n_columns, "mixed": n_columns // 2}[features]
+
+    columns = {}
+    signal = np.zeros(rows)
+
+    for i in range(n_columns - n_categorical):
+        values = _numeric_column(rng, rows, i)
+        signal += rng.normal() * (values - values.mean()) / (values.std() or 1)
+        columns[f"num_{i}"] = values
+
+    for j in range(n_categorical):
+        levels = CARDINALITIES[j % len(CARDINALITIES)]
+        # Zipf-like level frequencies, as in real categorical data
+        weights = 1 / np.arange(1, levels + 1)
+        codes = rng.choice(levels, size=rows, p=weights / weights.sum())
+        signal += rng.normal(size=levels)[codes]
+        values = np.array([f"c{j}_{k}" for k in range(levels)], dtype=object)
+        columns[f"cat_{j}"] = values[codes]
+
+    df = pd.DataFrame(columns)
+    for col in df.columns:
+        df.loc[rng.random(rows) < MISSING_RATE, col] = None
+
+    signal = signal / (signal.std() or 1) + rng.normal(scale=0.5, size=rows)
+    if task == "regression":
+        df["target"] = signal
+        return df
+
+    if task == "binary":
+        codes = (signal > 0).astype(np.int64)
+        names = ["no", "yes"]
+    else:
+        codes = np.digitize(signal, np.quantile(signal, [1 / 3, 2 / 3]))
+        names = ["low", "mid", "high"]
+    df["target"] = codes if labels == "int" else np.array(names, dtype=object)[codes]
+    return df
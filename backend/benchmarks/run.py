@@ -0,0 +1,426 @@
+"""Benchmark the backend pipeline on synthetic datasets.
+
+Run from backend/:
+
+    python -m benchmarks.run --suite quick
+    python -m benchmarks.run --suite standard --save-baseline
+    python -m benchmarks.run --suite standard --baseline benchmarks/results/baseline.json
+
+Every case runs in a fresh process with its own cache directory, so
+timings and peak memory are not skewed by earlier cases.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from benchmarks.datasets import FEATURES, LABELS, SHAPES, TASKS, make_dataset
+
+
+STAGES = ("ingest", "clean", "eda", "selection", "fit", "shap", "plot")
+
+# (rows, shape) per suite; features and tasks default to all of them
+SUITES = {
+    "quick": {"sizes": [(10_000, "narrow")], "features": ["mixed"]},
+    "standard": {"sizes": [(10_000, "narrow"), (10_000, "wide"), (100_000, "narrow"), (100_000, "wide")]},
+    "full": {"sizes": [
+        (10_000, "narrow"), (10_000, "wide"), (100_000, "narrow"), (100_000, "wide"),
+        (1_000_000, "narrow"), (1_000_000, "wide"), (10_000_000, "narrow"),
+    ]},
+}
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+BASELINE = os.path.join(RESULTS_DIR, "baseline.json")
+
+# A stage regresses when it is this much slower (or bigger) than the
+# baseline and the difference is above the noise floor
+REGRESSION_RATIO = 1.25
+MIN_SECONDS = 0.05
+MIN_RSS_MB = 32
+
+MB = 1024 * 1024
+
+
+# -----------------------------------
+# Measurement (case process)
+# -----------------------------------
+class PeakRSS:
+    """Samples this process's resident set size from /proc in a thread,
+    so each stage can report its own peak."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._page = os.sysconf("SC_PAGE_SIZE")
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def current(self):
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * self._page
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.current())
+
+    def start(self):
+        self.peak = self.current()
+        self._thread.start()
+        return self
+
+    def take(self):
+        """Peak since the last take (in MB), then start over from now."""
+        peak = max(self.peak, self.current())
+        self.peak = self.current()
+        return round(peak / MB, 1)
+
+    def stop(self):
+        self._stop.set()
+
+
+@contextmanager
+def _stage(stages, name, memory):
+    memory.take()
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        stages[name] = {"error": f"{type(e).__name__}: {e}"}
+        raise
+    stages[name] = {"seconds": round(time.perf_counter() - start, 4), "peak_rss_mb": memory.take()}
+
+
+def _train_marks(stages, memory):
+    """A train_model progress callback that splits its time into
+    selection (split to fit) and fit (fit to save)."""
+    marks = {"start": time.perf_counter()}
+
+    def progress(stage, **info):
+        if stage in ("fit", "save") and stage not in marks:
+            marks[stage] = time.perf_counter()
+            name, since = ("selection", "start") if stage == "fit" else ("fit", "fit")
+            stages[name] = {"seconds": round(marks[stage] - marks[since], 4), "peak_rss_mb": memory.take()}
+
+    return progress
+
+
+def run_case(spec, workdir):
+    """Run every selected stage of one case and write its results to
+    ``workdir``/result.json (runs in a spawned process)."""
+    os.environ["AUTOML_CACHE_DIR"] = os.path.join(workdir, "cache")
+    os.environ.setdefault("MPLBACKEND", "Agg")
+
+    # Library chatter (LightGBM prints from C++) goes to a log file, so
+    # the driver's output stays one line per case
+    log_path = os.path.join(workdir, "case.log")
+    log = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    os.dup2(log, 1)
+    os.dup2(log, 2)
+
+    # Imported here so the cache directory above is the one they use
+    from services import eda, plots
+    from services.cleaning import DataCleaner
+    from services.explain import shap_values
+    from services.ingest import read_csv_chunked
+    from services.model import train_model
+    from services.registry import ModelRegistry
+
+    selected = set(spec["stages"])
+    stages = {}
+    result = {**spec, "stages": stages, "log": log_path}
+    memory = PeakRSS().start()
+
+    csv_path = os.path.join(workdir, "data.csv")
+    try:
+        start = time.perf_counter()
+        df = make_dataset(
+            spec["rows"], spec["shape"], spec["features"], spec["task"], spec["seed"], spec["labels"],
+        )
+        df.to_csv(csv_path, index=False)
+        result["columns"] = len(df.columns)
+        result["csv_mb"] = round(os.path.getsize(csv_path) / MB, 1)
+        result["generate_seconds"] = round(time.perf_counter() - start, 2)
+        del df
+
+        with _stage(stages, "ingest", memory):
+            df, stats = read_csv_chunked(csv_path)
+
+        cleaner = DataCleaner()
+        with _stage(stages, "clean", memory):
+            df = cleaner.fit_transform(df, stats=stats)
+
+        if "eda" in selected:
+            with _stage(stages, "eda", memory):
+                eda.basic_eda(df)
+                eda.feature_analysis(df)
+                eda.correlation(df)
+                eda.histograms(df)
+
+        if selected & {"selection", "fit", "shap"}:
+            memory.take()
+            trained = train_model(
+                df, "target", cleaner=cleaner, selection=spec["selection"],
+                progress=_train_marks(stages, memory),
+            )
+            result["best_model"] = trained["best_model"]
+            result["cv_errors"] = trained["cv_errors"]
+
+            # A candidate that failed every fold scores -999; timings
+            # without it would look like a speed-up
+            failed = sorted(name for name, score in trained["scores"].items() if score == -999)
+            if failed:
+                raise RuntimeError(f"candidates failed in CV: {', '.join(failed)} (see cv_errors)")
+
+            if "shap" in selected:
+                model = ModelRegistry().load(trained["model_id"])
+                with _stage(stages, "shap", memory):
+                    result["shap_rows"] = shap_values(model, df)["rows"]
+
+        numeric = [col for col in df.columns if col != "target" and df[col].dtype.kind in "fiu"]
+        if "plot" in selected and numeric:
+            renderer = plots.PlotRenderer(workers=1)
+            try:
+                # Spawning and warming the worker is app startup, not plotting
+                renderer.render("distribution", plots.histogram_summary([0.0, 1.0]), ["warm-up"], (100, 100))
+                with _stage(stages, "plot", memory):
+                    for kind, columns in [
+                        ("distribution", numeric[:1]), ("box", numeric[:1]), ("scatter", (numeric * 2)[:2]),
+                    ]:
+                        summary = plots.SUMMARIES[kind](df, columns)
+                        renderer.render(kind, summary, list(columns), plots.plot_size(kind))
+            finally:
+                renderer.shutdown()
+
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+
+    memory.stop()
+    # ru_maxrss is in KB on Linux
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    result["stages"] = {name: stages[name] for name in STAGES if name in stages and name in selected}
+
+    with open(os.path.join(workdir, "result.json"), "w") as f:
+        json.dump(result, f)
+
+
+# -----------------------------------
+# Driver
+# -----------------------------------
+def parse_rows(text):
+    """Row counts from text like ``10k,1M``."""
+    scale = {"k": 1_000, "m": 1_000_000}
+    rows = []
+    for part in text.split(","):
+        part = part.strip().lower()
+        rows.append(int(float(part[:-1]) * scale[part[-1]]) if part[-1] in scale else int(part))
+    return rows
+
+
+def build_cases(args):
+    suite = SUITES[args.suite]
+    sizes = suite["sizes"]
+    if args.rows:
+        shapes = args.shape.split(",") if args.shape else sorted({shape for _, shape in sizes})
+        sizes = [(rows, shape) for rows in parse_rows(args.rows) for shape in shapes]
+    elif args.shape:
+        sizes = [(rows, shape) for rows, shape in sizes if shape in args.shape.split(",")]
+
+    features = args.features.split(",") if args.features else suite.get("features", FEATURES)
+    tasks = args.task.split(",") if args.task else suite.get("tasks", TASKS)
+    stages = args.stages.split(",") if args.stages else list(STAGES)
+
+    # String labels get their own case names, so baselines stay comparable
+    suffix = "" if args.labels == "int" else f"-{args.labels}"
+    return [
+        {
+            "case": f"{shape}-{feature}-{task}-{rows}{suffix}",
+            "rows": rows, "shape": shape, "features": feature, "task": task, "labels": args.labels,
+            "seed": args.seed, "selection": args.selection, "stages": stages,
+        }
+        for rows, shape in sizes for feature in features for task in tasks
+    ]
+
+
+def run_isolated(spec, timeout=None):
+    """run_case in a fresh spawned process; failures are recorded, not
+    raised. Only the case's log is left in its work directory."""
+    workdir = tempfile.mkdtemp(prefix="automl-bench-")
+    context = multiprocessing.get_context("spawn")
+    process = context.Process(target=run_case, args=(spec, workdir))
+    process.start()
+    process.join(timeout)
+
+    error = None
+    if process.is_alive():
+        process.terminate()
+        process.join()
+        error = f"timed out after {timeout}s"
+
+    try:
+        with open(os.path.join(workdir, "result.json")) as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        # Killed before writing, e.g. by the OOM killer
+        result = {**spec, "stages": {}, "log": os.path.join(workdir, "case.log")}
+        error = error or f"case process exited with code {process.exitcode}"
+    if error:
+        result["error"] = error
+
+    # The CSV and cache can be gigabytes
+    for name in os.listdir(workdir):
+        path = os.path.join(workdir, name)
+        if name == "case.log":
+            continue
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.unlink(path)
+    return result
+
+
+def merge_repeats(runs):
+    """Median seconds and highest peak memory per stage over repeats."""
+    merged = dict(runs[0])
+    stages = {}
+    for name in runs[0]["stages"]:
+        seconds = sorted(r["stages"][name]["seconds"] for r in runs if "seconds" in r["stages"].get(name, {}))
+        if not seconds:
+            stages[name] = runs[0]["stages"][name]
+            continue
+        stages[name] = {
+            "seconds": seconds[len(seconds) // 2],
+            "peak_rss_mb": max(r["stages"][name]["peak_rss_mb"] for r in runs if "seconds" in r["stages"].get(name, {})),
+        }
+    merged["stages"] = stages
+    merged["peak_rss_mb"] = max(r.get("peak_rss_mb", 0) for r in runs)
+    merged["repeats"] = len(runs)
+    return merged
+
+
+def environment():
+    import numpy
+    import pandas
+    import sklearn
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10,
+            cwd=os.path.dirname(__file__),
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": numpy.__version__,
+        "pandas": pandas.__version__,
+        "scikit-learn": sklearn.__version__,
+    }
+
+
+def compare(results, baseline, ratio=REGRESSION_RATIO):
+    """Print each stage against the baseline; returns the regressions."""
+    base = {r["case"]: r for r in baseline["results"]}
+    regressions = []
+
+    print(f"\n{'case':36s} {'stage':10s} {'base s':>9s} {'new s':>9s} {'ratio':>6s} {'base MB':>8s} {'new MB':>8s}")
+    for result in results:
+        old_case = base.get(result["case"])
+        if old_case is None:
+            continue
+        for name, new in result["stages"].items():
+            old = old_case["stages"].get(name, {})
+            if "seconds" not in new or "seconds" not in old:
+                continue
+
+            time_ratio = new["seconds"] / max(old["seconds"], 1e-9)
+            slower = time_ratio > ratio and new["seconds"] - old["seconds"] > MIN_SECONDS
+            bigger = (new["peak_rss_mb"] > old["peak_rss_mb"] * ratio
+                      and new["peak_rss_mb"] - old["peak_rss_mb"] > MIN_RSS_MB)
+            flag = " ".join(label for label, hit in [("SLOWER", slower), ("MORE-MEMORY", bigger)] if hit)
+            if flag:
+                regressions.append({"case": result["case"], "stage": name, "regression": flag})
+
+            print(f"{result['case']:36s} {name:10s} {old['seconds']:9.3f} {new['seconds']:9.3f} "
+                  f"{time_ratio:6.2f} {old['peak_rss_mb']:8.0f} {new['peak_rss_mb']:8.0f} {flag}")
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ingest, cleaning, EDA, training, SHAP and plotting.")
+    parser.add_argument("--suite", choices=sorted(SUITES), default="quick")
+    parser.add_argument("--rows", help="comma-separated row counts, e.g. 10k,1M (overrides the suite)")
+    parser.add_argument("--shape", help=f"comma-separated: {','.join(SHAPES)}")
+    parser.add_argument("--features", help=f"comma-separated: {','.join(FEATURES)}")
+    parser.add_argument("--task", help=f"comma-separated: {','.join(TASKS)}")
+    parser.add_argument("--stages", help=f"comma-separated subset of {','.join(STAGES)}")
+    parser.add_argument("--labels", choices=LABELS, default="int", help="class labels of classification targets")
+    parser.add_argument("--selection", choices=("full", "adaptive"), default="full")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case (median time is kept)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, help="seconds per case run")
+    parser.add_argument("--output", help="results file (default: results/<time>.json)")
+    parser.add_argument("--baseline", help="compare against this results file; exit 1 on regressions")
+    parser.add_argument("--save-baseline", action="store_true", help=f"also write the results to {BASELINE}")
+    parser.add_argument("--ratio", type=float, default=REGRESSION_RATIO, help="slowdown counted as a regression")
+    args = parser.parse_args(argv)
+
+    for option, choices in [("shape", SHAPES), ("features", FEATURES), ("task", TASKS), ("stages", STAGES)]:
+        value = getattr(args, option)
+        unknown = set(value.split(",")) - set(choices) if value else set()
+        if unknown:
+            parser.error(f"unknown --{option}: {', '.join(sorted(unknown))}")
+
+    results = []
+    for spec in build_cases(args):
+        runs = [run_isolated(spec, args.timeout) for _ in range(args.repeat)]
+        result = merge_repeats(runs)
+        results.append(result)
+
+        timings = " ".join(
+            f"{name}={stage['seconds']:.2f}s" if "seconds" in stage else f"{name}=FAILED"
+            for name, stage in result["stages"].items()
+        )
+        print(f"{spec['case']:36s} {timings} peak={result['peak_rss_mb']:.0f}MB"
+              + (f" error: {result['error']}" if "error" in result else ""), flush=True)
+
+    report = {"environment": environment(), "results": results}
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    for path in [output] + ([BASELINE] if args.save_baseline else []):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {path}")
+
+    status = 0
+    failed = [result["case"] for result in results if "error" in result]
+    if failed:
+        print(f"\n{len(failed)} case(s) failed: {', '.join(failed)}")
+        status = 1
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.ratio)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.baseline}")
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
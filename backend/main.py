@@ -1,20 +1,48 @@
-from fastapi import FastAPI, UploadFile, HTTPException
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, UploadFile, HTTPException, Body
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 import pandas as pd
 import numpy as np
 import os
-import matplotlib.pyplot as plt
+import time
 import base64
-from io import BytesIO
-
-from services.cleaning import clean_data
-from services.eda import basic_eda, correlation, histograms
-from services.statistics import auto_test
-from services.model import train_model
-from services.explain import shap_values
 
-app = FastAPI(title="AutoML API")
+from services.cleaning import DataCleaner
+from services.statistics import StatTestPool, auto_test, column_normality, stat_test_matrix
+from services.explain import (
+    shap_values, explain_rows, frame_chunks, upload_chunks,
+    SHAP_SAMPLE_ROWS, SHAP_BACKGROUND_ROWS,
+)
+from services.model import SELECTION_MODES, MAX_TUNING_SECONDS, TUNING_TRIALS
+from services.datasets import DatasetStore
+from services.ingest import read_csv_chunked, read_excel
+from services.jobs import JobManager
+from services.registry import ModelRegistry
+from services.serving import PredictionService, read_chunks, score_chunks
+from services.compiled import compile_model
+from services.plots import PlotRenderer
+from services import eda, plots, storage
+
+jobs = JobManager()
+models = ModelRegistry()
+serving = PredictionService(models)
+renderer = PlotRenderer()
+stat_pool = StatTestPool()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    renderer.start()
+    yield
+    serving.shutdown()
+    renderer.shutdown()
+    stat_pool.shutdown()
+    jobs.shutdown()
+
+
+app = FastAPI(title="AutoML API", lifespan=lifespan)
 
 # ----------------------------
 # CORS
@@ -29,47 +57,130 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-global_df = None
+def load_cached_dataset(dataset_id):
+    df = storage.load_frame(dataset_id)
+    if df is None:
+        return None
+    return df, storage.cache_path(dataset_id)
+
+
+datasets = DatasetStore(loader=load_cached_dataset)
 
 
 # ----------------------------
 # Utility
 # ----------------------------
-def check_dataset():
-    if global_df is None:
-        raise HTTPException(status_code=400, detail="No dataset uploaded yet")
+def get_dataset(dataset_id):
+    entry = datasets.get(dataset_id)
+    if entry is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Dataset not found. Upload it again."
+        )
+    return entry
+
+
+def resolve_model_id(model_id=None, dataset_id=None):
+    # Without an ID, the latest model (trained on the dataset, if given)
+    if model_id is not None:
+        return model_id
+
+    latest = models.latest(dataset_id=dataset_id)
+    if latest is None:
+        raise HTTPException(
+            status_code=400,
+            detail="No trained model found. Train model first."
+        )
+    return latest["model_id"]
+
+
+def get_model(model_id=None, dataset_id=None):
+    model = models.load(resolve_model_id(model_id, dataset_id))
+    if model is None:
+        raise HTTPException(status_code=404, detail="Model not found")
+    return model
+
 
+def get_cleaner(entry):
+    # Datasets reloaded from the disk cache pick their cleaner up lazily
+    if "cleaner" not in entry.artifacts:
+        entry.artifacts["cleaner"] = storage.load_cleaner(entry.dataset_id)
+    return entry.artifacts["cleaner"]
 
-def fig_to_base64(fig):
-    buffer = BytesIO()
-    fig.savefig(buffer, format="png", bbox_inches="tight")
-    buffer.seek(0)
-    img_str = base64.b64encode(buffer.read()).decode()
-    plt.close(fig)
-    return img_str
+
+def plot_source(entry, approx, columns):
+    # Approximate plots draw from the sketch's uniform row sample
+    if approx:
+        sample = eda.artifact(entry, "sketch").sample.rows
+        if sample is not None and all(c in sample.columns for c in columns):
+            return sample
+    return entry.df
+
+
+PLOT_FORMATS = {"png": None, "data": "application/json", "arrow": "application/vnd.apache.arrow.stream"}
+
+
+def render_plot(entry, kind, columns, approx, width, height, format):
+    # png: base64 image; data: the binned summary as JSON; arrow: the
+    # same as an Arrow IPC stream. Only png renders anything.
+    if format not in PLOT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(PLOT_FORMATS)}")
+
+    df = plot_source(entry, approx, columns)
+    try:
+        if format == "png":
+            image = plots.png(entry, renderer, kind, columns, df, plots.plot_size(kind, width, height), approx)
+            return {"image": base64.b64encode(image).decode()}
+        data = plots.payload(entry, kind, columns, df, format, approx)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Cannot plot {', '.join(columns)}: {e}")
+    return Response(data, media_type=PLOT_FORMATS[format])
 
 
 # ----------------------------
 # Upload
 # ----------------------------
 @app.post("/upload")
-async def upload(file: UploadFile):
-    global global_df
+def upload(file: UploadFile):
 
-    if file.filename.endswith(".csv"):
-        global_df = pd.read_csv(file.file)
-    elif file.filename.endswith(".xlsx"):
-        global_df = pd.read_excel(file.file)
-    else:
+    if not file.filename.endswith((".csv", ".xlsx")):
         raise HTTPException(status_code=400, detail="Unsupported file type")
 
-    global_df = clean_data(global_df)
+    # Identical bytes were already cleaned: reuse the cached frame
+    digest = storage.file_digest(file.file)
+    entry = datasets.get(digest)
+    cached = entry is not None
+
+    if entry is None:
+        start = time.perf_counter()
+        try:
+            if file.filename.endswith(".csv"):
+                df, stats = read_csv_chunked(file.file)
+            else:
+                df, stats = read_excel(file.file)
+        except (ValueError, pd.errors.ParserError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        timings = {"ingest": time.perf_counter() - start}
+        cleaner = DataCleaner()
+        df = cleaner.fit_transform(df, stats=stats, timings=timings)
+        path = storage.save_frame(digest, df)
+        storage.save_cleaner(digest, cleaner)
+        entry = datasets.add(df, dataset_id=digest, path=path)
+        entry.artifacts["ingest_stats"] = stats
+        entry.artifacts["cleaner"] = cleaner
+        entry.artifacts["timings"] = timings
+
+    df = entry.df
 
     return {
+        "dataset_id": entry.dataset_id,
+        "cached": cached,
+        "timings": entry.artifacts.get("timings", {}),
         "dataset_info": {
-            "rows": len(global_df),
-            "columns": len(global_df.columns),
-            "column_names": list(global_df.columns),
+            "rows": len(df),
+            "columns": len(df.columns),
+            "column_names": list(df.columns),
         }
     }
 
@@ -78,183 +189,358 @@ async def upload(file: UploadFile):
 # EDA
 # ----------------------------
 @app.get("/eda")
-def get_eda():
-    check_dataset()
-    return basic_eda(global_df)
+def get_eda(dataset_id: str, approx: bool = False):
+    return eda.cached_basic_eda(get_dataset(dataset_id), approx)
 
 
 @app.get("/eda_full")
-def get_eda_full():
-    check_dataset()
-    return {
-        "correlation": correlation(global_df),
-        "histograms": histograms(global_df),
+def get_eda_full(dataset_id: str, approx: bool = False):
+    entry = get_dataset(dataset_id)
+    result = {
+        "correlation": eda.artifact(entry, "correlation", approx),
+        "histograms": eda.artifact(entry, "histograms", approx),
     }
+    if approx:
+        result["approximate"] = eda.error_bounds(entry)
+    return result
 
 
 @app.get("/feature_analysis")
-def get_feature_analysis():
-    check_dataset()
-    numeric_df = global_df.select_dtypes(include=["int64", "float64"])
-    return {
-        "missing": global_df.isnull().sum().to_dict(),
-        "unique": global_df.nunique().to_dict(),
-        "describe": numeric_df.describe().to_dict(),
-    }
+def get_feature_analysis(dataset_id: str, approx: bool = False):
+    return eda.cached_feature_analysis(get_dataset(dataset_id), approx)
 
 
 @app.get("/correlation")
-def get_corr():
-    check_dataset()
-    return correlation(global_df)
+def get_corr(dataset_id: str, approx: bool = False):
+    return eda.artifact(get_dataset(dataset_id), "correlation", approx)
 
 
 @app.get("/histograms")
-def get_hist():
-    check_dataset()
-    return histograms(global_df)
+def get_hist(dataset_id: str, approx: bool = False):
+    return eda.artifact(get_dataset(dataset_id), "histograms", approx)
 
 
 # ----------------------------
 # Statistical Test
 # ----------------------------
 @app.get("/stat_test")
-def stat_test(col1: str, col2: str):
-    check_dataset()
+def stat_test(dataset_id: str, col1: str, col2: str):
+    entry = get_dataset(dataset_id)
+    df = entry.df
 
-    if col1 not in global_df.columns or col2 not in global_df.columns:
+    if col1 not in df.columns or col2 not in df.columns:
         raise HTTPException(status_code=400, detail="Invalid columns")
 
-    return auto_test(global_df, col1, col2)
+    return auto_test(df, col1, col2, column_normality(df, [col1, col2], entry.artifacts))
+
+
+@app.get("/stat_test/matrix")
+def stat_test_all_pairs(dataset_id: str, columns: str = None):
+    # columns=a,b,c limits the matrix to those columns; default all
+    entry = get_dataset(dataset_id)
+    df = entry.df
+
+    selected = list(dict.fromkeys(columns.split(","))) if columns else list(df.columns)
+    if len(selected) < 2 or any(col not in df.columns for col in selected):
+        raise HTTPException(status_code=400, detail="Invalid columns")
+
+    key = ("stat_matrix", tuple(selected))
+    if key not in entry.artifacts:
+        entry.artifacts[key] = stat_test_matrix(
+            df, selected, cache=entry.artifacts, pool=stat_pool,
+            dataset_id=entry.dataset_id if entry.path else None,
+        )
+    return entry.artifacts[key]
 
 
 # ----------------------------
 # Distribution Plot
 # ----------------------------
 @app.get("/plot/distribution")
-def distribution_plot(col: str = None, column: str = None):
-    check_dataset()
+def distribution_plot(dataset_id: str, col: str = None, column: str = None, approx: bool = False,
+                      width: int = None, height: int = None, format: str = "png"):
+    entry = get_dataset(dataset_id)
     column = col or column
-    if not column or column not in global_df.columns:
+    if not column or column not in entry.df.columns:
         raise HTTPException(status_code=400, detail="Invalid column")
-
-    fig, ax = plt.subplots(figsize=(8, 4))
-    ax.hist(global_df[column].dropna(), bins=30, color='#7c3aed', edgecolor='white', alpha=0.85)
-    ax.set_title(f"Distribution of {column}", fontsize=14, fontweight='bold')
-    ax.set_xlabel(column)
-    ax.set_ylabel("Frequency")
-    ax.set_facecolor('#0f0f2a')
-    fig.patch.set_facecolor('#0a0a1a')
-    ax.tick_params(colors='#a0a0c0')
-    ax.spines[['bottom','left','top','right']].set_color('#2d2d4e')
-
-    return {"image": fig_to_base64(fig)}
+    return render_plot(entry, "distribution", [column], approx, width, height, format)
 
 
 # ----------------------------
 # Box Plot
 # ----------------------------
 @app.get("/plot/box")
-def box_plot(col: str = None, column: str = None):
-    check_dataset()
+def box_plot(dataset_id: str, col: str = None, column: str = None, approx: bool = False,
+             width: int = None, height: int = None, format: str = "png"):
+    entry = get_dataset(dataset_id)
     column = col or column
-    if not column or column not in global_df.columns:
+    if not column or column not in entry.df.columns:
         raise HTTPException(status_code=400, detail="Invalid column")
-
-    fig, ax = plt.subplots(figsize=(6, 6))
-    bp = ax.boxplot(global_df[column].dropna(), patch_artist=True)
-    for patch in bp['boxes']:
-        patch.set_facecolor('#7c3aed')
-        patch.set_alpha(0.7)
-    ax.set_title(f"Boxplot of {column}", fontsize=14, fontweight='bold')
-    ax.set_facecolor('#0f0f2a')
-    fig.patch.set_facecolor('#0a0a1a')
-    ax.tick_params(colors='#a0a0c0')
-    ax.spines[['bottom','left','top','right']].set_color('#2d2d4e')
-
-    return {"image": fig_to_base64(fig)}
+    return render_plot(entry, "box", [column], approx, width, height, format)
 
 
 # ----------------------------
 # Scatter Plot
 # ----------------------------
 @app.get("/plot/scatter")
-def scatter_plot(col1: str, col2: str):
-    check_dataset()
+def scatter_plot(dataset_id: str, col1: str, col2: str, approx: bool = False,
+                 width: int = None, height: int = None, format: str = "png"):
+    entry = get_dataset(dataset_id)
 
-    if col1 not in global_df.columns or col2 not in global_df.columns:
+    if col1 not in entry.df.columns or col2 not in entry.df.columns:
         raise HTTPException(status_code=400, detail="Invalid columns")
-
-    fig, ax = plt.subplots(figsize=(8, 5))
-    ax.scatter(global_df[col1], global_df[col2], color='#06b6d4', alpha=0.6, edgecolors='#7c3aed', linewidths=0.5, s=30)
-    ax.set_xlabel(col1, color='#a0a0c0')
-    ax.set_ylabel(col2, color='#a0a0c0')
-    ax.set_title(f"{col1} vs {col2}", fontsize=14, fontweight='bold', color='white')
-    ax.set_facecolor('#0f0f2a')
-    fig.patch.set_facecolor('#0a0a1a')
-    ax.tick_params(colors='#a0a0c0')
-    ax.spines[['bottom','left','top','right']].set_color('#2d2d4e')
-
-    return {"image": fig_to_base64(fig)}
+    return render_plot(entry, "scatter", [col1, col2], approx, width, height, format)
 
 
 # ----------------------------
 # Train Model
 # ----------------------------
 @app.post("/train")
-def train(target: str):
+def train(
+    dataset_id: str,
+    target: str,
+    selection: str = "full",
+    tune_seconds: float = 0,
+    tune_trials: int = TUNING_TRIALS,
+    resume: bool = True,
+    row_budget: int = None,
+    learning_curve: bool = False,
+    out_of_core: bool = False,
+):
+
+    entry = get_dataset(dataset_id)
+    df = entry.df
+
+    if target not in df.columns:
+        raise HTTPException(status_code=400, detail="Invalid target column")
 
-    check_dataset()
+    if selection not in SELECTION_MODES:
+        raise HTTPException(status_code=400, detail="Invalid selection mode")
 
-    if target not in global_df.columns:
-        raise HTTPException(status_code=400, detail="Invalid target column")
+    if not 0 <= tune_seconds <= MAX_TUNING_SECONDS or tune_trials < 1:
+        raise HTTPException(status_code=400, detail="Invalid tuning budget")
+
+    if row_budget is not None and row_budget < 0:
+        raise HTTPException(status_code=400, detail="Invalid row budget")
 
+    if out_of_core and not entry.path:
+        raise HTTPException(status_code=400, detail="Out-of-core training needs a cached dataset")
+
+    if out_of_core and tune_seconds > 0:
+        raise HTTPException(status_code=400, detail="Tuning is not available out of core")
+
+    if out_of_core:
+        # Streams the memory-mapped Arrow file instead of the in-memory frame
+        job = jobs.submit(entry, target, cleaner=get_cleaner(entry), out_of_core=True)
+        return jobs.get(job.job_id)
+
+    # Training runs in the job pool; poll /jobs/{job_id} for progress
+    # The study is named after the dataset and target, so tuning the same
+    # problem again continues where the last run stopped
+    job = jobs.submit(
+        entry, target, cleaner=get_cleaner(entry), selection=selection,
+        tune_seconds=tune_seconds, tune_trials=tune_trials,
+        study_name=f"{entry.dataset_id}:{target}", resume=resume,
+        row_budget=row_budget, learning_curve=learning_curve,
+    )
+    return jobs.get(job.job_id)
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    status = jobs.get(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return status
+
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    if not jobs.cancel(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return jobs.get(job_id)
+
+
+# ----------------------------
+# Model registry
+# ----------------------------
+@app.get("/models")
+def list_models(dataset_id: str = None, target: str = None):
+    return models.list(dataset_id=dataset_id, target=target)
+
+
+@app.get("/models/{model_id}")
+def get_model_metadata(model_id: str):
+    meta = models.metadata(model_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Model not found")
+    return meta
+
+
+def compiled_path(model_id):
+    # Compiled on first request, then served from the registry
+    path = models.artifact_path(model_id, "compiled.npz")
+    if path is None:
+        model = get_model(model_id)
+        holdout = models.holdout(model_id)
+        if holdout is None:
+            raise HTTPException(
+                status_code=400,
+                detail="Model has no held-out sample to verify the export against; retrain it",
+            )
+        try:
+            data = compile_model(
+                model.pipeline, model.cleaner, model.meta.get("problem_type"),
+                model.meta.get("features", []), holdout=holdout,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        path = models.add_artifact(model_id, "compiled.npz", data)
+    return path
+
+
+@app.post("/models/{model_id}/compile")
+def compile_registered_model(model_id: str):
+    path = compiled_path(model_id)
+    return {"model_id": model_id, "path": os.path.basename(path), "bytes": os.path.getsize(path)}
+
+
+# ----------------------------
+# Prediction
+# ----------------------------
+@app.post("/predict")
+def predict(rows: list[dict] = Body(..., embed=True), model_id: str = None):
+    # Raw rows as uploaded; cleaning and encoding are applied here
+    if not rows:
+        raise HTTPException(status_code=400, detail="No rows to score")
+
+    model_id = resolve_model_id(model_id)
     try:
-        result = train_model(global_df, target)
-        return result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        result = serving.predict(model_id, pd.DataFrame(rows))
+    except (ValueError, TypeError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail="Model not found")
+
+    response = {"model_id": model_id, "predictions": result["predictions"].tolist()}
+    if "probabilities" in result:
+        response["classes"] = np.asarray(result["classes"]).tolist()
+        response["probabilities"] = result["probabilities"].tolist()
+    return response
+
+
+@app.post("/predict/batch")
+def predict_batch(file: UploadFile, model_id: str = None):
+    if not file.filename.endswith((".csv", ".parquet")):
+        raise HTTPException(status_code=400, detail="Unsupported file type")
+
+    model = serving.model(resolve_model_id(model_id))
+    if model is None:
+        raise HTTPException(status_code=404, detail="Model not found")
+
+    # Scored chunk by chunk as the response is sent
+    return StreamingResponse(
+        score_chunks(model, read_chunks(file.file, file.filename)),
+        media_type="text/csv",
+        headers={"Content-Disposition": "attachment; filename=predictions.csv"},
+    )
+
+
+@app.get("/predict/stats")
+def predict_stats():
+    # Latency percentiles of /predict per model
+    return serving.stats()
 
 
 # ----------------------------
 # SHAP
 # ----------------------------
 @app.get("/shap")
-def shap_api():
+def shap_api(dataset_id: str, model_id: str = None, rows: int = SHAP_SAMPLE_ROWS):
 
-    check_dataset()
+    entry = get_dataset(dataset_id)
+    model = get_model(model_id, dataset_id=dataset_id)
 
-    if not os.path.exists("best_model.pkl"):
-        raise HTTPException(
-            status_code=400,
-            detail="No trained model found. Train model first."
-        )
+    if rows < 1:
+        raise HTTPException(status_code=400, detail="Invalid sample size")
 
     try:
-        return shap_values(global_df)
+        return shap_values(model, entry.df, entry.artifacts, rows)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/shap/rows")
+def shap_rows(dataset_id: str, model_id: str = None, rows: str = None,
+              start: int = 0, limit: int = 100):
+    # rows=3,17,42 picks rows by position; otherwise start/limit
+    entry = get_dataset(dataset_id)
+    model = get_model(model_id, dataset_id=dataset_id)
+    X = entry.df.reindex(columns=model.pipeline.feature_names_)
+
+    if rows:
+        try:
+            positions = [int(r) for r in rows.split(",")]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="rows must be comma-separated integers")
+    else:
+        if start < 0 or limit < 1:
+            raise HTTPException(status_code=400, detail="Invalid row range")
+        positions = list(range(start, min(start + limit, len(X))))
+
+    if any(not 0 <= p < len(X) for p in positions):
+        raise HTTPException(status_code=400, detail="Row out of range")
+
+    background = X.sample(min(len(X), SHAP_BACKGROUND_ROWS), random_state=0)
+    return StreamingResponse(
+        explain_rows(model, frame_chunks(X, positions), background),
+        media_type="application/x-ndjson",
+    )
+
+
+@app.post("/shap/rows/batch")
+def shap_rows_batch(file: UploadFile, model_id: str = None):
+    if not file.filename.endswith((".csv", ".parquet")):
+        raise HTTPException(status_code=400, detail="Unsupported file type")
+
+    model = get_model(model_id)
+    frames = read_chunks(file.file, file.filename)
+    return StreamingResponse(
+        explain_rows(model, upload_chunks(model, frames)),
+        media_type="application/x-ndjson",
+    )
+
+
 # ----------------------------
 # Preview & Download
 # ----------------------------
 @app.get("/preview")
-def get_preview():
-    check_dataset()
+def get_preview(dataset_id: str):
+    df = get_dataset(dataset_id).df
     # Return top 10 rows and column names for preview
     return {
-        "columns": list(global_df.columns),
-        "rows": global_df.head(10).values.tolist()
+        "columns": list(df.columns),
+        "rows": df.head(10).values.tolist()
     }
 
 @app.get("/download_model")
-def download_model():
-    if not os.path.exists("best_model.pkl"):
+def download_model(model_id: str = None, format: str = "pickle"):
+    # Defaults to the most recently trained model; format=compiled returns
+    # the compact inference artifact (see services/compiled.py)
+    if format not in ("pickle", "compiled"):
+        raise HTTPException(status_code=400, detail="Invalid format")
+
+    model_id = model_id or (models.latest() or {}).get("model_id")
+    path = models.artifact_path(model_id)
+    if path is None:
         raise HTTPException(status_code=404, detail="Model file not found")
-    
+
+    filename = "best_model.pkl"
+    if format == "compiled":
+        path, filename = compiled_path(model_id), "best_model.npz"
+
     from fastapi.responses import FileResponse
     return FileResponse(
-        path="best_model.pkl",
-        filename="best_model.pkl",
+        path=path,
+        filename=filename,
         media_type="application/octet-stream"
-    )
+    )
\ No newline at end of file
@@ -1,77 +1,301 @@
+import time
+import warnings
+from contextlib import contextmanager
+
 import pandas as pd
 import numpy as np
-from sklearn.impute import SimpleImputer
 
+from services.schema import numeric_columns, categorical_columns
 
-def clean_data(df):
 
-    df = df.copy()
+# Non-null values tried per text column before a full datetime conversion
+DATE_SAMPLE_SIZE = 200
 
-    # -----------------------------------
-    # 1. Remove duplicates
-    # -----------------------------------
-    df = df.drop_duplicates()
 
-    # -----------------------------------
-    # 2. Strip whitespace from column names
-    # -----------------------------------
-    df.columns = df.columns.str.strip()
+@contextmanager
+def _stage(timings, name):
+    start = time.perf_counter()
+    yield
+    if timings is not None:
+        timings[name] = time.perf_counter() - start
 
-    # -----------------------------------
-    # 3. Try to convert date columns
-    # -----------------------------------
-    for col in df.columns:
-        if df[col].dtype == "object":
-            try:
-                parsed = pd.to_datetime(df[col], errors="raise")
-                if parsed.notna().sum() > 0.8 * len(df):
-                    df[col] = parsed
-            except Exception:
-                pass
 
-    # -----------------------------------
-    # 4. Remove columns with too many missing values (>50%)
-    # -----------------------------------
-    missing_ratio = df.isnull().mean()
-    df = df.loc[:, missing_ratio < 0.5]
+def _is_text(series):
+    return series.dtype == "object" or pd.api.types.is_string_dtype(series)
 
-    # -----------------------------------
-    # 5. Remove constant columns
-    # -----------------------------------
-    nunique = df.nunique()
-    df = df.loc[:, nunique > 1]
 
-    # -----------------------------------
-    # 6. Separate column types
-    # -----------------------------------
-    num_cols = df.select_dtypes(include=["int64", "float64"]).columns
-    cat_cols = df.select_dtypes(include=["object"]).columns
+def _parse_dates(series):
+    """Return the column as datetimes, or None if it is not a date column.
 
-    # -----------------------------------
-    # 7. Impute missing values
-    # -----------------------------------
-    if len(num_cols) > 0:
-        df[num_cols] = SimpleImputer(strategy="median").fit_transform(df[num_cols])
+    A small spread-out sample has to parse completely before the full
+    column is converted, so free-text columns are rejected after a few
+    hundred values instead of failing somewhere deep in the column.
+    """
+    values = series.dropna()
+    if len(values) == 0:
+        return None
 
-    if len(cat_cols) > 0:
-        df[cat_cols] = SimpleImputer(strategy="most_frequent").fit_transform(df[cat_cols])
+    step = max(len(values) // DATE_SAMPLE_SIZE, 1)
+    sample = values.iloc[::step][:DATE_SAMPLE_SIZE]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        try:
+            if pd.to_datetime(sample, errors="coerce").isna().any():
+                return None
+            parsed = pd.to_datetime(series, errors="coerce")
+        except (TypeError, ValueError, OverflowError):
+            return None
+
+    if parsed.notna().sum() > 0.8 * len(series):
+        return parsed
+    return None
+
+
+def _imputed_quartile_levels(observed, nulls):
+    """Quantile levels of the observed values that equal the quartiles once
+    ``nulls`` copies of the median are added. The copies sit in the middle
+    of the sorted column, so only the ranks of the quartiles shift."""
+    if observed <= 1:
+        return 0.25, 0.75
+    shift = 0.25 * (observed + nulls - 1) / (observed - 1)
+    return min(shift, 0.5), max(1 - shift, 0.5)
+
+
+class DataCleaner:
+    """Cleaning as a fit/transform object.
+
+    ``fit_transform`` cleans the training upload and records everything it
+    decided: kept and dropped columns, parsed date columns, imputation
+    values and IQR clip bounds. ``transform`` re-applies exactly those
+    decisions to new data (e.g. rows to score) with a few vectorized
+    calls and no refitting. Instances are plain attributes and pickle
+    with joblib next to the model.
+    """
+
+    def __init__(self):
+        self.columns_ = []
+        self.dropped_columns_ = {}
+        self.date_columns_ = []
+        self.fill_values_ = {}
+        self.clip_lower_ = {}
+        self.clip_upper_ = {}
 
     # -----------------------------------
-    # 8. Outlier Handling (IQR clipping)
+    # Fit
     # -----------------------------------
-    for col in num_cols:
-        Q1 = df[col].quantile(0.25)
-        Q3 = df[col].quantile(0.75)
-        IQR = Q3 - Q1
+    def fit(self, df, stats=None, timings=None):
+        self.fit_transform(df, stats=stats, timings=timings)
+        return self
+
+    def fit_transform(self, df, stats=None, timings=None):
+        """Fit on ``df`` and return it cleaned.
+
+        ``stats`` is an optional ``DatasetSketch`` collected while the file
+        was streamed, i.e. before de-duplication. Null counts are always
+        taken from the de-duplicated frame (one cheap scan); the sketch's
+        quantiles are used only when no duplicate rows were removed, so
+        they describe the same rows, and are then approximate within the
+        KLL rank error. If ``timings`` is a dict it is filled with the
+        seconds spent in each stage.
+        """
+
+        # -----------------------------------
+        # 1. Remove duplicates (returns a new frame, so no extra copy needed)
+        # -----------------------------------
+        with _stage(timings, "deduplicate"):
+            rows = len(df)
+            df = df.drop_duplicates()
+            if stats is not None and len(df) < rows:
+                stats = None
+
+        # -----------------------------------
+        # 2. Strip whitespace from column names
+        # -----------------------------------
+        original_columns = df.columns
+        df.columns = df.columns.str.strip()
+        if stats is not None:
+            stats.rename(dict(zip(original_columns, df.columns)))
+
+        # -----------------------------------
+        # 3. Detect date columns on a sample, then convert
+        # -----------------------------------
+        with _stage(timings, "parse_dates"):
+            self.date_columns_ = []
+            for col in df.columns:
+                if _is_text(df[col]):
+                    parsed = _parse_dates(df[col])
+                    if parsed is not None:
+                        df[col] = parsed
+                        self.date_columns_.append(col)
+
+        # -----------------------------------
+        # 4. Remove columns with too many missing values (>50%)
+        # -----------------------------------
+        with _stage(timings, "missing"):
+            null_counts = df.isnull().sum()
+            missing_ratio = null_counts / max(len(df), 1)
 
-        lower = Q1 - 1.5 * IQR
-        upper = Q3 + 1.5 * IQR
+            too_sparse = list(df.columns[(missing_ratio >= 0.5).to_numpy()])
+            self.dropped_columns_ = dict.fromkeys(too_sparse, "missing")
+            df = df.drop(columns=too_sparse)
 
-        df[col] = np.clip(df[col], lower, upper)
+        # -----------------------------------
+        # 5. Remove constant columns
+        # -----------------------------------
+        with _stage(timings, "constant"):
+            num_cols = numeric_columns(df)
+            other_cols = df.columns.difference(num_cols, sort=False)
+
+            # min == max is a cheap reduction; nunique would hash every value
+            bounds = df[num_cols].agg(["min", "max"])
+            constant = list(num_cols[(bounds.loc["min"] == bounds.loc["max"]).to_numpy()])
+            constant += list(num_cols[bounds.isna().all().to_numpy()])
+
+            if len(other_cols) > 0:
+                nunique = df[other_cols].nunique()
+                constant += list(nunique.index[nunique <= 1])
+
+            self.dropped_columns_.update(dict.fromkeys(constant, "constant"))
+            df = df.drop(columns=constant)
+
+        self.columns_ = list(df.columns)
+        self.date_columns_ = [c for c in self.date_columns_ if c in self.columns_]
+
+        # -----------------------------------
+        # 6. Separate column types
+        # -----------------------------------
+        num_cols = numeric_columns(df)
+        cat_cols = categorical_columns(df)
+
+        # -----------------------------------
+        # 7. Quantiles for imputation and IQR clipping in one call
+        # -----------------------------------
+        with _stage(timings, "quantiles"):
+            quantiles = pd.DataFrame(index=[0.25, 0.5, 0.75])
+            if stats is not None:
+                quantiles = stats.quantiles([0.25, 0.5, 0.75])
+
+            missing_q = num_cols.difference(quantiles.columns, sort=False)
+            if len(missing_q) > 0:
+                quantiles = pd.concat(
+                    [quantiles, df[missing_q].quantile([0.25, 0.5, 0.75])], axis=1
+                )
+            quantiles = quantiles.reindex(columns=num_cols).astype(np.float64)
+
+            # Outliers are clipped after imputation, so the IQR of a column
+            # with nulls includes its fill values (the median)
+            imputed_cols = [c for c in num_cols if null_counts[c] > 0]
+            sketched = [c for c in imputed_cols if stats is not None and c in stats.quantile_sketches]
+            for col in sketched:
+                lo, hi = _imputed_quartile_levels(len(df) - null_counts[col], null_counts[col])
+                quantiles.loc[[0.25, 0.75], col] = stats.quantile_sketches[col].quantiles([lo, hi])
+
+            exact = [c for c in imputed_cols if c not in sketched]
+            if exact:
+                imputed = df[exact].fillna(quantiles.loc[0.5, exact])
+                quantiles.loc[[0.25, 0.75], exact] = imputed.quantile([0.25, 0.75]).to_numpy()
+
+        # -----------------------------------
+        # 8. Imputation values and clip bounds
+        # -----------------------------------
+        with _stage(timings, "fit"):
+            self.fill_values_ = {}
+
+            # Every column gets a fill value, not only those with nulls in
+            # the training data, so transform() can impute new data too
+            for col in num_cols:
+                self.fill_values_[col] = float(quantiles.loc[0.5, col])
+
+            for col in cat_cols:
+                counts = df[col].value_counts(sort=False)
+                if len(counts) > 0:
+                    self.fill_values_[col] = counts.idxmax()
+
+            q1, q3 = quantiles.loc[0.25], quantiles.loc[0.75]
+            iqr = q3 - q1
+            self.clip_lower_ = (q1 - 1.5 * iqr).to_dict()
+            self.clip_upper_ = (q3 + 1.5 * iqr).to_dict()
+
+        # -----------------------------------
+        # 9. Impute and clip, then reset index
+        # -----------------------------------
+        with_nulls = null_counts.index[(null_counts > 0).to_numpy()]
+        df = self._impute_and_clip(df, timings, only=set(with_nulls))
+        df = df.reset_index(drop=True)
+
+        return df
 
     # -----------------------------------
-    # 9. Reset index
+    # Transform
     # -----------------------------------
-    df = df.reset_index(drop=True)
+    def transform(self, df, timings=None):
+        """Apply the fitted cleaning to new rows.
+
+        Rows are neither deduplicated nor reordered, so results line up
+        with the input. Columns dropped at fit time are removed; kept
+        columns missing from ``df`` (such as the target when scoring)
+        are simply skipped.
+        """
+        df = df.rename(columns=lambda c: c.strip() if isinstance(c, str) else c)
+        df = df[[c for c in self.columns_ if c in df.columns]]
+
+        with _stage(timings, "parse_dates"):
+            for col in self.date_columns_:
+                if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+                    df[col] = pd.to_datetime(df[col], errors="coerce")
+
+        return self._impute_and_clip(df, timings)
+
+    def _impute_and_clip(self, df, timings=None, only=None):
+        # ``only`` limits imputation to columns known to contain nulls
+
+        # -----------------------------------
+        # Impute missing values (one fillna; keeps the downcast dtypes)
+        # -----------------------------------
+        with _stage(timings, "impute"):
+            fill = {}
+            for col, value in self.fill_values_.items():
+                if col not in df.columns or (only is not None and col not in only):
+                    continue
+                if pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col]):
+                    value = df[col].dtype.type(value)
+                fill[col] = value
+
+            if fill:
+                df = df.fillna(value=fill)
+
+        # -----------------------------------
+        # Outlier Handling (IQR clipping, broadcast over all columns)
+        # -----------------------------------
+        with _stage(timings, "clip"):
+            num_cols = [
+                c for c in numeric_columns(df) if c in self.clip_lower_
+            ]
+
+            if num_cols:
+                lower = pd.Series(self.clip_lower_)[num_cols]
+                upper = pd.Series(self.clip_upper_)[num_cols]
+
+                # One clip per dtype with bounds in that dtype, so float32 and
+                # downcast integer columns are not promoted
+                dtypes = df[num_cols].dtypes
+                for dtype in dtypes.unique():
+                    cols = dtypes.index[dtypes == dtype]
+                    lo, hi = lower[cols], upper[cols]
+
+                    if pd.api.types.is_integer_dtype(dtype):
+                        # nextafter: float(int64 max) rounds up and would overflow
+                        info = np.iinfo(dtype)
+                        top = np.nextafter(float(info.max), 0)
+                        lo = np.ceil(lo).clip(info.min, top)
+                        hi = np.floor(hi).clip(info.min, top)
+
+                    df[cols] = df[cols].clip(lo.astype(dtype), hi.astype(dtype), axis=1)
+
+        return df
+
 
-    return df
\ No newline at end of file
+def clean_data(df, stats=None, timings=None):
+    """Clean a frame with a freshly fitted ``DataCleaner``."""
+    return DataCleaner().fit_transform(df, stats=stats, timings=timings)
@@ -0,0 +1,362 @@
+import io
+import json
+
+import numpy as np
+import pandas as pd
+
+
+# Compact inference artifacts.
+#
+# A registered Pipeline predicts through sklearn's ColumnTransformer,
+# imputers, OneHotEncoder and estimator wrappers, which dominates the cost
+# of small batches. compile_model flattens all of that into one .npz file:
+#   - a preprocessing plan: per numeric column the cleaner's fill value and
+#     clip bounds, the imputer median and the scaler's center/scale; per
+#     categorical column the fill value and a category -> index map. The
+#     dtypes the arithmetic ran in are recorded too: one ulp of difference
+#     in a standardized feature is enough to cross a tree split threshold
+#   - the model in its fastest form: native XGBoost/LightGBM boosters,
+#     RandomForest trees packed into flat node arrays, or linear weights
+# CompiledModel scores it with NumPy (and the booster library, if any);
+# sklearn is never imported. compile_model refuses to produce an artifact
+# whose predictions differ from the pipeline's on a held-out sample.
+
+# Largest probability or relative regression difference accepted by the
+# fidelity check (labels must match exactly)
+FIDELITY_TOLERANCE = 1e-5
+
+
+# -----------------------------------
+# Compilation (sklearn objects -> arrays)
+# -----------------------------------
+def _numpy_dtype(name):
+    dtype = pd.api.types.pandas_dtype(name)
+    return np.dtype(getattr(dtype, "numpy_dtype", dtype))
+
+
+def _scaling_dtype(columns, dtypes):
+    # sklearn validates the numeric block as one array of the columns'
+    # common type, kept if it is a float type and float64 otherwise
+    try:
+        dtype = np.result_type(*[_numpy_dtype(dtypes[col]) for col in columns])
+    except (KeyError, TypeError):
+        return "float64"
+    return dtype.name if dtype in (np.float32, np.float64) else "float64"
+
+
+def _plan_preprocessor(pre, cleaner, dtypes=None):
+    """``dtypes`` maps input columns to their training dtype names."""
+    dtypes = dtypes or {}
+    numeric, categorical = [], []
+    scaling = "float64"
+
+    if hasattr(pre, "transformers_"):
+        # ColumnTransformer from build_preprocessor: num then cat
+        for name, transformer, columns in pre.transformers_:
+            if name == "num" and len(columns):
+                steps = transformer.named_steps
+                numeric = [
+                    {"name": col, "fill": float(fill), "center": float(center), "scale": float(scale)}
+                    for col, fill, center, scale in zip(
+                        columns, steps["imputer"].statistics_,
+                        steps["scaler"].mean_, steps["scaler"].scale_,
+                    )
+                ]
+                scaling = _scaling_dtype(columns, dtypes)
+            elif name == "cat" and len(columns):
+                steps = transformer.named_steps
+                categorical = [
+                    {"name": col, "fill": fill, "categories": list(categories)}
+                    for col, fill, categories in zip(
+                        columns, steps["imputer"].statistics_, steps["onehot"].categories_,
+                    )
+                ]
+    else:
+        # StreamingPreprocessor (out-of-core training); NaN -> mean, and
+        # the block is standardized in float32
+        scaling = "float32"
+        numeric = [
+            {"name": col, "fill": float(mean), "center": float(mean), "scale": float(scale)}
+            for col, mean, scale in zip(pre.numeric_, pre.mean_, pre.scale_)
+        ]
+        categorical = [
+            {"name": col, "fill": None, "categories": list(pre.categories_[col])}
+            for col in pre.categorical_
+        ]
+
+    # The cleaner's imputation and clipping run before the pipeline, in
+    # each column's own dtype (integers are exact in float64)
+    for column in numeric:
+        column["dtype"] = scaling
+    if cleaner is not None:
+        for column in numeric:
+            col = column["name"]
+            dtype = _numpy_dtype(dtypes.get(col, "float64"))
+            column["dtype"] = "float32" if dtype == np.float32 else "float64"
+            if col in cleaner.fill_values_:
+                column["fill"] = float(cleaner.fill_values_[col])
+            lo = float(cleaner.clip_lower_.get(col, -np.inf))
+            hi = float(cleaner.clip_upper_.get(col, np.inf))
+            if dtype.kind in "iu":
+                # The cleaner clips integer columns to whole numbers
+                lo, hi = np.ceil(lo), np.floor(hi)
+            column["lo"], column["hi"] = lo, hi
+        for column in categorical:
+            if column["name"] in cleaner.fill_values_:
+                column["fill"] = cleaner.fill_values_[column["name"]]
+
+    # A ColumnTransformer returns a sparse matrix when one-hot columns make
+    # the output mostly zeros; XGBoost reads its unstored zeros as missing
+    sparse = bool(getattr(pre, "sparse_output_", False))
+    return {"numeric": numeric, "categorical": categorical, "scaling_dtype": scaling, "sparse": sparse}
+
+
+def _pack_forest(estimators):
+    """Concatenate fitted trees into flat node arrays with global child
+    indices; leaves point to themselves."""
+    left, right, feature, threshold, value, roots = [], [], [], [], [], []
+    offset, depth = 0, 0
+
+    for estimator in estimators:
+        tree = estimator.tree_
+        nodes = np.arange(tree.node_count)
+        leaf = tree.children_left < 0
+
+        left.append(np.where(leaf, nodes, tree.children_left) + offset)
+        right.append(np.where(leaf, nodes, tree.children_right) + offset)
+        feature.append(np.where(leaf, 0, tree.feature))
+        threshold.append(np.where(leaf, np.inf, tree.threshold))
+        value.append(tree.value[:, 0, :])
+        roots.append(offset)
+
+        offset += tree.node_count
+        depth = max(depth, tree.max_depth)
+
+    return {
+        "left": np.concatenate(left).astype(np.int32),
+        "right": np.concatenate(right).astype(np.int32),
+        "feature": np.concatenate(feature).astype(np.int32),
+        "threshold": np.concatenate(threshold),
+        "value": np.concatenate(value),
+        "roots": np.asarray(roots, dtype=np.int32),
+        "depth": np.asarray(depth),
+    }
+
+
+def _plan_model(model):
+    """Return (meta, arrays) for the pipeline's final estimator."""
+    kind = getattr(model, "kind", None)
+
+    if kind is not None:
+        # StreamedModel from out-of-core training
+        meta = {"y_mean": model.y_mean, "y_std": model.y_std}
+        if kind == "XGBoost":
+            return {**meta, "format": "xgboost"}, {"booster": np.frombuffer(model.model.save_raw("ubj"), np.uint8)}
+        if kind == "LightGBM":
+            return {**meta, "format": "lightgbm"}, {"booster": np.frombuffer(model.model.model_to_string().encode(), np.uint8)}
+        estimator = model.model
+        link = "ovr" if model.classes is not None else "identity"
+        return {**meta, "format": "linear", "link": link}, {
+            "coef": np.atleast_2d(estimator.coef_), "intercept": np.atleast_1d(estimator.intercept_),
+        }
+
+    name = type(model).__name__
+    if name.startswith("XGB"):
+        return {"format": "xgboost"}, {"booster": np.frombuffer(model.get_booster().save_raw("ubj"), np.uint8)}
+    if name.startswith("LGBM"):
+        return {"format": "lightgbm"}, {"booster": np.frombuffer(model.booster_.model_to_string().encode(), np.uint8)}
+    if name.startswith("RandomForest"):
+        return {"format": "forest"}, _pack_forest(model.estimators_)
+    if name == "LogisticRegression":
+        link = "softmax" if len(model.classes_) > 2 else "logistic"
+        return {"format": "linear", "link": link}, {
+            "coef": np.atleast_2d(model.coef_), "intercept": np.atleast_1d(model.intercept_),
+        }
+
+    raise ValueError(f"Cannot compile {name}")
+
+
+def compile_model(pipeline, cleaner=None, problem_type=None, features=(), holdout=None):
+    """Serialize a fitted pipeline (and the cleaner run before it) to the
+    compact format; returns the .npz file's bytes. ``features`` is the
+    registry's input schema. With a ``holdout`` frame of the pipeline's
+    input rows, a ValueError is raised instead if the artifact does not
+    reproduce ``pipeline.predict`` on them (see ``check_fidelity``)."""
+    model = pipeline.named_steps["model"]
+    model_meta, arrays = _plan_model(model)
+
+    classes = getattr(model, "classes_", None)
+    meta = {
+        "problem_type": problem_type,
+        "classes": None if classes is None or problem_type == "regression" else np.asarray(classes).tolist(),
+        "preprocessing": _plan_preprocessor(
+            pipeline.named_steps["preprocessor"], cleaner,
+            {f["name"]: f["dtype"] for f in features},
+        ),
+        "model": model_meta,
+    }
+
+    preprocessing = meta["preprocessing"]
+    for key in ("fill", "lo", "hi", "center", "scale"):
+        default = {"lo": -np.inf, "hi": np.inf}.get(key, 0.0)
+        arrays[f"num_{key}"] = np.array([c.get(key, default) for c in preprocessing["numeric"]], dtype=np.float64)
+
+    buffer = io.BytesIO()
+    np.savez(buffer, meta=np.frombuffer(json.dumps(meta, default=str).encode(), np.uint8), **arrays)
+    data = buffer.getvalue()
+
+    if holdout is not None:
+        check_fidelity(data, pipeline, holdout, problem_type)
+    return data
+
+
+def check_fidelity(data, pipeline, holdout, problem_type=None, tolerance=FIDELITY_TOLERANCE):
+    """Raise ValueError unless the compiled ``data`` predicts ``holdout``
+    like ``pipeline``: the same labels (and probabilities within
+    ``tolerance``) for classifiers, values within ``tolerance`` otherwise."""
+    compiled = CompiledModel(data)
+    expected = np.asarray(pipeline.predict(holdout))
+    actual = compiled.predict(holdout)
+
+    if compiled.classes is None or problem_type == "regression":
+        wrong = ~np.isclose(actual, expected.astype(np.float64), rtol=tolerance, atol=tolerance)
+    else:
+        wrong = actual != expected
+        if hasattr(pipeline, "predict_proba"):
+            gap = np.abs(compiled.predict_proba(holdout) - np.asarray(pipeline.predict_proba(holdout)))
+            wrong |= (gap > tolerance).any(axis=1)
+
+    if wrong.any():
+        raise ValueError(
+            f"Compiled model disagrees with the pipeline on {int(wrong.sum())} of "
+            f"{len(wrong)} held-out rows"
+        )
+
+
+# -----------------------------------
+# Scoring
+# -----------------------------------
+def _sigmoid(z):
+    return 1 / (1 + np.exp(-z))
+
+
+class CompiledModel:
+    """Scores raw rows from a compiled artifact with vectorized NumPy."""
+
+    def __init__(self, data):
+        with np.load(io.BytesIO(data)) as npz:
+            self.arrays = {key: npz[key] for key in npz.files}
+        meta = json.loads(self.arrays.pop("meta").tobytes())
+
+        self.problem_type = meta["problem_type"]
+        self.classes = None if meta["classes"] is None else np.asarray(meta["classes"])
+        numeric = meta["preprocessing"]["numeric"]
+        self.numeric = [c["name"] for c in numeric]
+        self.categorical = meta["preprocessing"]["categorical"]
+        # Artifacts from before dtypes were recorded ran in float64
+        self.scaling_dtype = np.dtype(meta["preprocessing"].get("scaling_dtype", "float64"))
+        dtypes = np.array([c.get("dtype", "float64") for c in numeric])
+        self.numeric_groups = [
+            (np.dtype(dtype), np.flatnonzero(dtypes == dtype)) for dtype in np.unique(dtypes)
+        ]
+        self.sparse = meta["preprocessing"].get("sparse", False)
+        self.model = meta["model"]
+        self.n_features = len(self.numeric) + sum(len(c["categories"]) for c in self.categorical)
+
+        self._booster = None
+        fmt = self.model["format"]
+        if fmt == "xgboost":
+            import xgboost as xgb
+            self._booster = xgb.Booster()
+            self._booster.load_model(bytearray(self.arrays["booster"].tobytes()))
+        elif fmt == "lightgbm":
+            import lightgbm as lgb
+            self._booster = lgb.Booster(model_str=self.arrays["booster"].tobytes().decode())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+    def transform(self, df):
+        """Raw rows (DataFrame or dict of columns) -> model input matrix."""
+        if not isinstance(df, pd.DataFrame):
+            df = pd.DataFrame(df)
+        a = self.arrays
+        X = np.zeros((len(df), self.n_features))
+
+        k = len(self.numeric)
+        if k:
+            values = df.reindex(columns=self.numeric).apply(pd.to_numeric, errors="coerce").to_numpy(np.float64)
+
+            # Fill and clip in each column's dtype, then standardize in
+            # the pipeline's dtype, so rounding matches step for step
+            block = np.empty(values.shape, dtype=self.scaling_dtype)
+            for dtype, cols in self.numeric_groups:
+                v = values[:, cols].astype(dtype)
+                v = np.where(np.isnan(v), a["num_fill"][cols].astype(dtype), v)
+                block[:, cols] = np.clip(v, a["num_lo"][cols].astype(dtype), a["num_hi"][cols].astype(dtype))
+
+            dtype = self.scaling_dtype
+            X[:, :k] = (block - a["num_center"].astype(dtype)) / a["num_scale"].astype(dtype)
+
+        rows = np.arange(len(df))
+        for column in self.categorical:
+            categories = column["categories"]
+            values = df[column["name"]] if column["name"] in df.columns else pd.Series([None] * len(df))
+            if column["fill"] is not None:
+                values = values.astype(object).where(values.notna(), column["fill"])
+            # intp codes (Categorical codes are int8 for few categories, and
+            # k + codes would overflow); unknown values and NaN give -1
+            codes = pd.Index(categories).get_indexer(values)
+            hit = codes >= 0
+            X[rows[hit], k + codes[hit]] = 1.0
+            k += len(categories)
+
+        return X
+
+    def _forest(self, X):
+        a = self.arrays
+        # Trees compare float32 features against float64 thresholds
+        X = X.astype(np.float32).astype(np.float64)
+        nodes = np.broadcast_to(a["roots"], (len(X), len(a["roots"]))).copy()
+        rows = np.arange(len(X))[:, None]
+        for _ in range(int(a["depth"])):
+            go_left = X[rows, a["feature"][nodes]] <= a["threshold"][nodes]
+            nodes = np.where(go_left, a["left"][nodes], a["right"][nodes])
+        return a["value"][nodes].mean(axis=1)
+
+    def _raw(self, X):
+        fmt = self.model["format"]
+        if fmt == "xgboost":
+            return self._booster.inplace_predict(X, missing=0.0 if self.sparse else np.nan)
+        if fmt == "lightgbm":
+            return self._booster.predict(X)
+        if fmt == "forest":
+            value = self._forest(X)
+            return value[:, 0] if self.classes is None else value
+
+        z = X @ self.arrays["coef"].T + self.arrays["intercept"]
+        link = self.model["link"]
+        if link == "identity":
+            return z[:, 0]
+        if link == "softmax":
+            z = np.exp(z - z.max(axis=1, keepdims=True))
+            return z / z.sum(axis=1, keepdims=True)
+        if z.shape[1] == 1:
+            return _sigmoid(z[:, 0])
+        # One-vs-rest (SGDClassifier): normalized per-class sigmoids
+        proba = _sigmoid(z)
+        return proba / proba.sum(axis=1, keepdims=True)
+
+    def predict_proba(self, df):
+        proba = np.asarray(self._raw(self.transform(df)), dtype=np.float64)
+        if proba.ndim == 1:
+            proba = np.column_stack([1 - proba, proba])
+        return proba
+
+    def predict(self, df):
+        if self.classes is not None:
+            return self.classes[np.argmax(self.predict_proba(df), axis=1)]
+        raw = np.asarray(self._raw(self.transform(df)), dtype=np.float64)
+        return raw * self.model.get("y_std", 1.0) + self.model.get("y_mean", 0.0)
@@ -0,0 +1,171 @@
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+# Total bytes of cleaned frames and their cached artifacts (EDA results,
+# plots, ...) kept in memory before the least recently used datasets are
+# evicted.
+MAX_DATASET_BYTES = int(os.environ.get("AUTOML_MAX_DATASET_BYTES", 2 * 1024 ** 3))
+
+
+def _sizeof(value, depth=0):
+    """Approximate bytes held by a cached value."""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+
+    size = sys.getsizeof(value)
+    if depth > 4:
+        return size
+    if isinstance(value, dict):
+        return size + sum(_sizeof(k, depth + 1) + _sizeof(v, depth + 1) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return size + sum(_sizeof(v, depth + 1) for v in value)
+    if hasattr(value, "__dict__"):
+        # Plain objects such as sketches and cleaners
+        return size + _sizeof(vars(value), depth + 1)
+    return size
+
+
+class ArtifactCache(dict):
+    """An entry's derived results. Storing a value charges its size to the
+    entry, so cached artifacts count against the store's byte budget."""
+
+    def __init__(self, entry):
+        super().__init__()
+        self._entry = entry
+        self._sizes = {}
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        size = _sizeof(value)
+        self._entry.charge(size - self._sizes.get(key, 0))
+        self._sizes[key] = size
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._entry.charge(-self._sizes.pop(key, 0))
+
+    def pop(self, key, *default):
+        if key in self:
+            value = super().__getitem__(key)
+            del self[key]
+            return value
+        return super().pop(key, *default)
+
+
+class DatasetEntry:
+    """A cleaned dataset plus everything derived from it.
+
+    ``nbytes`` is the frame's memory plus that of its ``artifacts``;
+    ``on_resize`` is called whenever the artifacts grow or shrink.
+    """
+
+    def __init__(self, dataset_id, df, path=None):
+        self.dataset_id = dataset_id
+        self.df = df
+        self.path = path
+        self.nbytes = int(df.memory_usage(deep=True).sum())
+        self.on_resize = None
+        self._lock = threading.Lock()
+        self.artifacts = ArtifactCache(self)
+        self.created = time.time()
+        self.last_access = self.created
+
+    def touch(self):
+        self.last_access = time.time()
+
+    def charge(self, nbytes):
+        with self._lock:
+            self.nbytes += nbytes
+        if nbytes and self.on_resize is not None:
+            self.on_resize()
+
+
+class DatasetStore:
+    """Thread-safe registry of datasets keyed by ID with LRU eviction.
+
+    Eviction is driven by the summed memory footprint of the stored frames
+    and their cached artifacts, re-checked whenever an artifact is stored;
+    the most recently used dataset is always kept, even if it alone
+    exceeds the budget.
+
+    ``loader`` is called with an unknown ID on a miss and may return
+    ``(df, path)`` to repopulate the store, e.g. from the on-disk cache.
+    """
+
+    def __init__(self, max_bytes=MAX_DATASET_BYTES, loader=None):
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, df, dataset_id=None, path=None):
+        dataset_id = dataset_id or uuid.uuid4().hex
+        entry = DatasetEntry(dataset_id, df, path=path)
+        entry.on_resize = self._resized
+
+        with self._lock:
+            self._entries.pop(dataset_id, None)
+            self._entries[dataset_id] = entry
+            self._evict()
+
+        return entry
+
+    def get(self, dataset_id):
+        with self._lock:
+            entry = self._entries.get(dataset_id)
+            if entry is not None:
+                self._entries.move_to_end(dataset_id)
+
+        if entry is None:
+            return self._load(dataset_id)
+
+        entry.touch()
+        return entry
+
+    def _load(self, dataset_id):
+        loaded = self.loader(dataset_id) if self.loader else None
+        if loaded is None:
+            return None
+
+        df, path = loaded
+        return self.add(df, dataset_id=dataset_id, path=path)
+
+    def remove(self, dataset_id):
+        with self._lock:
+            return self._entries.pop(dataset_id, None) is not None
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(e.nbytes for e in self._entries.values())
+
+    def _resized(self):
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        total = sum(e.nbytes for e in self._entries.values())
+        while total > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            total -= evicted.nbytes
+
+    def __contains__(self, dataset_id):
+        with self._lock:
+            return dataset_id in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
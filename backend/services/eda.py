@@ -1,29 +1,363 @@
+import threading
+
 import numpy as np
 
+from services import storage
+from services.schema import numeric_columns
+from services.sketches import DatasetSketch
+
+
+HIST_BINS = 10
+QUANTILES = (0.25, 0.5, 0.75)
+
+# Cells per block in the second sweep of numeric_summary; bounds the
+# temporary centered copy and histogram indices (~16 MB of float32).
+BLOCK_CELLS = 1 << 22
+
+# Rows per chunk when sketching a dataset for approximate EDA
+SKETCH_CHUNK_ROWS = 200_000
+
+
+# -----------------------------------
+# Fused numeric kernel
+# -----------------------------------
+def numeric_summary(df, bins=HIST_BINS):
+    """All numeric statistics the EDA endpoints need, from one float32 matrix.
+
+    The first sweep takes counts, means and min/max with whole-matrix
+    reductions. The second sweep walks row blocks once, centering each
+    block and feeding it both to the Gram matrix (a float32 ``Xc.T @ Xc``
+    accumulated in float64) and to a single ``bincount`` for the
+    histograms of every column. NaNs are skipped everywhere. With NaNs
+    present, the block loop also accumulates pairwise non-null counts,
+    sums and sums of squares, so covariance and correlation are
+    pairwise-complete (as in ``DataFrame.cov``/``corr``) and the diagonal
+    of ``cov`` equals ``var``.
+    """
+    columns = list(numeric_columns(df))
+    X = df[columns].to_numpy(dtype=np.float32)
+    n, p = X.shape
+
+    nan_mask = np.isnan(X)
+    has_nans = bool(nan_mask.any())
+
+    nulls = nan_mask.sum(axis=0)
+    count = n - nulls
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        total = np.nansum(X, axis=0, dtype=np.float64) if has_nans else X.sum(axis=0, dtype=np.float64)
+        mean = total / count
+
+    if n > 0:
+        minimum = np.nanmin(X, axis=0) if has_nans else X.min(axis=0)
+        maximum = np.nanmax(X, axis=0) if has_nans else X.max(axis=0)
+        quantiles = (np.nanquantile if has_nans else np.quantile)(X, QUANTILES, axis=0)
+    else:
+        minimum = maximum = np.full(p, np.nan)
+        quantiles = np.full((len(QUANTILES), p), np.nan)
+
+    minimum = minimum.astype(np.float64)
+    maximum = maximum.astype(np.float64)
+
+    # np.histogram widens a zero-width range by 0.5 on each side
+    lo = np.where(minimum == maximum, minimum - 0.5, minimum)
+    hi = np.where(minimum == maximum, maximum + 0.5, maximum)
+    scale = bins / (hi - lo)
+    offsets = np.arange(p) * bins
+
+    gram = np.zeros((p, p))
+    hist = np.zeros(p * bins, dtype=np.int64)
+    if has_nans:
+        # [i, j] over rows where both i and j are present
+        pair_count = np.zeros((p, p))
+        pair_sum = np.zeros((p, p))
+        pair_sq = np.zeros((p, p))
+    mean32 = mean.astype(np.float32)
+
+    block = max(1, BLOCK_CELLS // max(p, 1))
+    for start in range(0, n, block):
+        Xb = X[start:start + block]
+        mb = nan_mask[start:start + block]
+
+        Xc = Xb - mean32
+        if has_nans:
+            Xc[mb] = 0
+        gram += (Xc.T @ Xc).astype(np.float64)
+
+        if has_nans:
+            present = (~mb).astype(np.float32)
+            pair_count += (present.T @ present).astype(np.float64)
+            pair_sum += (Xc.T @ present).astype(np.float64)
+            pair_sq += ((Xc * Xc).T @ present).astype(np.float64)
+
+        idx = np.floor((Xb - lo) * scale)
+        np.clip(idx, 0, bins - 1, out=idx)
+        if has_nans:
+            idx[mb] = 0
+        idx = idx.astype(np.int64) + offsets
+        hist += np.bincount(idx[~mb], minlength=p * bins)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        var = np.diag(gram) / (count - 1)
+        std = np.sqrt(var)
+        if has_nans:
+            # Centering by the column means leaves these shift-invariant
+            # formulas exact; they only improve their conditioning
+            pair_var = (pair_sq - pair_sum ** 2 / pair_count) / (pair_count - 1)
+            cov = (gram - pair_sum * pair_sum.T / pair_count) / (pair_count - 1)
+            corr = cov / np.sqrt(pair_var * pair_var.T)
+        else:
+            cov = gram / (n - 1)
+            corr = cov / np.outer(std, std)
+
+    edges = lo[:, None] + (hi - lo)[:, None] * np.linspace(0, 1, bins + 1)
+
+    return {
+        "columns": columns,
+        "rows": n,
+        "count": count,
+        "nulls": nulls,
+        "mean": mean,
+        "var": var,
+        "std": std,
+        "min": minimum,
+        "max": maximum,
+        "quantiles": quantiles.astype(np.float64),
+        "cov": cov,
+        "corr": corr,
+        "hist_edges": edges,
+        "hist_counts": hist.reshape(p, bins),
+    }
+
+
+def _describe_from(summary):
+    result = {}
+    for j, col in enumerate(summary["columns"]):
+        q = summary["quantiles"][:, j]
+        result[col] = {
+            "count": float(summary["count"][j]),
+            "mean": float(summary["mean"][j]),
+            "std": float(summary["std"][j]),
+            "min": float(summary["min"][j]),
+            "25%": float(q[0]),
+            "50%": float(q[1]),
+            "75%": float(q[2]),
+            "max": float(summary["max"][j]),
+        }
+    return result
+
+
+def _correlation_from(summary):
+    columns = summary["columns"]
+    corr = np.nan_to_num(summary["corr"], nan=0.0)
+    return {
+        col: dict(zip(columns, corr[:, j].tolist()))
+        for j, col in enumerate(columns)
+    }
+
+
+def _histograms_from(summary):
+    return {
+        col: {
+            "bins": summary["hist_edges"][j].tolist(),
+            "counts": summary["hist_counts"][j].tolist(),
+        }
+        for j, col in enumerate(summary["columns"])
+    }
+
+
+# -----------------------------------
+# Endpoint payloads
+# -----------------------------------
+def missing_counts(df):
+    return df.isnull().sum().to_dict()
+
+
+def unique_counts(df):
+    return df.nunique().to_dict()
+
+
+def describe(df):
+    return _describe_from(numeric_summary(df))
+
+
 def basic_eda(df):
 
+    summary = numeric_summary(df)
     return {
         "shape": df.shape,
         "columns": list(df.columns),
-        "missing": df.isnull().sum().to_dict(),
-        "describe": df.describe().to_dict()
+        "missing": missing_counts(df),
+        "describe": _describe_from(summary)
     }
 
+
+def feature_analysis(df):
+
+    return {
+        "missing": missing_counts(df),
+        "unique": unique_counts(df),
+        "describe": describe(df),
+    }
+
+
 def correlation(df):
 
-    numeric = df.select_dtypes(include=['int64','float64'])
-    return numeric.corr().fillna(0).to_dict()
+    return _correlation_from(numeric_summary(df))
+
 
 def histograms(df):
 
-    numeric = df.select_dtypes(include=['int64','float64'])
+    return _histograms_from(numeric_summary(df))
+
+
+# -----------------------------------
+# Approximate mode (sketches)
+# -----------------------------------
+def iter_chunks(entry, rows=SKETCH_CHUNK_ROWS):
+    """Yield the dataset as DataFrame chunks.
+
+    Cached datasets are read batch by batch from the memory-mapped Arrow
+    file, so only one chunk is materialized at a time.
+    """
+    table = storage.load_table(entry.dataset_id) if entry.path else None
+
+    if table is None:
+        for start in range(0, len(entry.df), rows):
+            yield entry.df.iloc[start:start + rows]
+        return
+
+    for batch in table.to_batches(max_chunksize=rows):
+        yield batch.to_pandas()
+
+
+def build_sketch(chunks):
+    sketch = DatasetSketch()
+    for chunk in chunks:
+        sketch.merge(sketch.spawn().update(chunk))
+    return sketch
+
+
+def _approx_describe(sketch):
+    quantiles = sketch.quantiles(QUANTILES)
+    result = {}
+    for col, (count, mean, _) in sketch.moments.items():
+        q = quantiles[col]
+        result[col] = {
+            "count": float(count),
+            "mean": float(mean),
+            "std": float(sketch.std(col)),
+            "min": float(sketch.min[col]),
+            "25%": float(q.iloc[0]),
+            "50%": float(q.iloc[1]),
+            "75%": float(q.iloc[2]),
+            "max": float(sketch.max[col]),
+        }
+    return result
+
+
+def _approx_histograms(sketch, bins=HIST_BINS):
+    # Exact edges from min/max; counts from the row sample scaled up to
+    # the column's non-null count
+    sample = sketch.sample.rows
     data = {}
+    for col, (count, _, _) in sketch.moments.items():
+        values = sample[col].dropna().to_numpy()
+        lo, hi = float(sketch.min[col]), float(sketch.max[col])
+        if lo == hi:
+            lo, hi = lo - 0.5, hi + 0.5
 
-    for col in numeric.columns:
-        counts, bins = np.histogram(numeric[col], bins=10)
+        counts, edges = np.histogram(values, bins=bins, range=(lo, hi))
+        scale = count / max(len(values), 1)
         data[col] = {
-            "bins": bins.tolist(),
-            "counts": counts.tolist()
+            "bins": edges.tolist(),
+            "counts": np.rint(counts * scale).astype(np.int64).tolist(),
         }
+    return data
 
-    return data
\ No newline at end of file
+
+def _approx_correlation(sketch):
+    # Only numeric columns are sampled; without any there is nothing to
+    # correlate, as on the exact path
+    if sketch.sample.rows is None:
+        return {}
+    return _correlation_from(numeric_summary(sketch.sample.rows))
+
+
+def _approx_missing(sketch):
+    return {k: int(v) for k, v in sketch.null_counts.items()}
+
+
+def error_bounds(entry):
+    return artifact(entry, "sketch").error_bounds()
+
+
+# -----------------------------------
+# Per-dataset artifact cache
+# -----------------------------------
+# Results live in the dataset entry's ``artifacts`` dict. An entry is
+# replaced (with empty artifacts) whenever the data behind its ID changes
+# and is dropped when the store evicts it, so nothing stale is served and
+# repeated dashboard loads are dictionary lookups.
+# describe, correlation and histograms are all views of one cached
+# numeric_summary, so the fused kernel runs once per dataset.
+ARTIFACTS = {
+    "numeric_summary": lambda entry: numeric_summary(entry.df),
+    "missing": lambda entry: missing_counts(entry.df),
+    "unique": lambda entry: unique_counts(entry.df),
+    "describe": lambda entry: _describe_from(artifact(entry, "numeric_summary")),
+    "correlation": lambda entry: _correlation_from(artifact(entry, "numeric_summary")),
+    "histograms": lambda entry: _histograms_from(artifact(entry, "numeric_summary")),
+    "sketch": lambda entry: build_sketch(iter_chunks(entry)),
+    "approx_missing": lambda entry: _approx_missing(artifact(entry, "sketch")),
+    "approx_unique": lambda entry: artifact(entry, "sketch").distinct_counts(),
+    "approx_describe": lambda entry: _approx_describe(artifact(entry, "sketch")),
+    "approx_correlation": lambda entry: _approx_correlation(artifact(entry, "sketch")),
+    "approx_histograms": lambda entry: _approx_histograms(artifact(entry, "sketch")),
+}
+
+_locks_guard = threading.Lock()
+
+
+def artifact(entry, name, approx=False):
+    # approx=True serves the sketch-based variant of the same artifact
+    if approx and name != "sketch":
+        name = f"approx_{name}"
+
+    key = ("eda", name)
+    if key in entry.artifacts:
+        return entry.artifacts[key]
+
+    # The dashboard fires its EDA requests together; one computes, the
+    # others wait for the result instead of repeating the scan.
+    with _locks_guard:
+        lock = entry.artifacts.setdefault(("eda_lock", name), threading.Lock())
+
+    with lock:
+        if key not in entry.artifacts:
+            entry.artifacts[key] = ARTIFACTS[name](entry)
+
+    return entry.artifacts[key]
+
+
+def cached_basic_eda(entry, approx=False):
+    result = {
+        "shape": entry.df.shape,
+        "columns": list(entry.df.columns),
+        "missing": artifact(entry, "missing", approx),
+        "describe": artifact(entry, "describe", approx),
+    }
+    if approx:
+        result["approximate"] = error_bounds(entry)
+    return result
+
+
+def cached_feature_analysis(entry, approx=False):
+    result = {
+        "missing": artifact(entry, "missing", approx),
+        "unique": artifact(entry, "unique", approx),
+        "describe": artifact(entry, "describe", approx),
+    }
+    if approx:
+        result["approximate"] = error_bounds(entry)
+    return result
@@ -1,59 +1,230 @@
-import joblib
-import shap
-import numpy as np
+import json
 import os
-from fastapi import HTTPException
+import threading
+import time
 
+import numpy as np
+import shap
+from scipy import sparse
 
-def shap_values(df):
+from services.model import selection_sample
+from services.serving import prepare_frame
 
-    if not os.path.exists("best_model.pkl"):
-        raise HTTPException(
-            status_code=400,
-            detail="No trained model found. Train model first."
-        )
 
-    pipeline = joblib.load("best_model.pkl")
+# Rows explained for global importance (stratified by the target for
+# classifiers) and rows the linear / model-agnostic explainers integrate
+# over. TreeExplainer needs no background: it uses the trees' own cover.
+SHAP_SAMPLE_ROWS = int(os.environ.get("AUTOML_SHAP_ROWS", 2000))
+SHAP_BACKGROUND_ROWS = int(os.environ.get("AUTOML_SHAP_BACKGROUND", 100))
 
-    # Separate X (drop last trained target assumption unsafe)
-    # Instead use pipeline feature names
-    try:
-        feature_names = pipeline.named_steps["preprocessor"].get_feature_names_out()
-    except:
-        feature_names = None
+# Exact tree SHAP grows with leaves x depth^2, so fully grown forests can
+# take seconds per hundred rows. The sample is explained in chunks until
+# this many seconds have passed; it is shuffled, so any prefix is still
+# a stratified sample.
+SHAP_MAX_SECONDS = float(os.environ.get("AUTOML_SHAP_SECONDS", 10))
+SHAP_CHUNK_ROWS = 100
 
-    # Extract original X correctly
-    X = df.copy()
+TREE_MODELS = ("XGB", "LGBM", "RandomForest")
 
-    # Remove target if stored in pipeline metadata
-    if hasattr(pipeline, "feature_names_in_"):
-        X = X[pipeline.feature_names_in_]
+_locks_guard = threading.Lock()
 
-    # Transform data
-    X_transformed = pipeline.named_steps["preprocessor"].transform(X)
 
-    model = pipeline.named_steps["model"]
+# -----------------------------------
+# Explainer
+# -----------------------------------
+def transform(pipeline, X):
+    """Model input for raw feature rows, as a dense float matrix."""
+    Xt = pipeline.named_steps["preprocessor"].transform(X)
+    if sparse.issparse(Xt):
+        Xt = Xt.toarray()
+    return np.asarray(Xt, dtype=np.float64)
 
-    # Use TreeExplainer for tree models (more stable)
-    try:
-        explainer = shap.TreeExplainer(model)
-    except:
-        explainer = shap.Explainer(model)
-
-    shap_vals = explainer(X_transformed)
-
-    values = shap_vals.values
 
-    # Handle multiclass case
-    if len(values.shape) == 3:
-        values = values[:, :, 0]
+def feature_names(pipeline, n_features):
+    try:
+        return list(pipeline.named_steps["preprocessor"].get_feature_names_out())
+    except (AttributeError, ValueError):
+        return [f"feature_{i}" for i in range(n_features)]
 
-    importance = np.abs(values).mean(axis=0)
 
-    if feature_names is None:
-        feature_names = [f"feature_{i}" for i in range(len(importance))]
+def build_explainer(pipeline, background):
+    """TreeExplainer on the native model for boosters and forests,
+    LinearExplainer for linear models, and a permutation explainer
+    around predict_proba/predict for anything else."""
+    model = pipeline.named_steps["model"]
 
-    return {
-        "features": list(feature_names),
-        "importance": importance.tolist()
-    }
\ No newline at end of file
+    # Out-of-core StreamedModel: explain the booster or SGD model inside
+    kind = getattr(model, "kind", None)
+    if kind in ("XGBoost", "LightGBM"):
+        return shap.TreeExplainer(model.model)
+    if kind is not None:
+        return shap.LinearExplainer(model.model, background)
+
+    name = type(model).__name__
+    if name.startswith(TREE_MODELS):
+        return shap.TreeExplainer(model)
+    if hasattr(model, "coef_"):
+        return shap.LinearExplainer(model, background)
+
+    predict = model.predict_proba if hasattr(model, "predict_proba") else model.predict
+    return shap.Explainer(predict, background)
+
+
+def explainer(model, X):
+    """The cached explainer of a LoadedModel, built on first use with a
+    background drawn from ``X``."""
+    if "shap_explainer" in model.artifacts:
+        return model.artifacts["shap_explainer"]
+
+    with _locks_guard:
+        lock = model.artifacts.setdefault("shap_lock", threading.Lock())
+
+    with lock:
+        if "shap_explainer" not in model.artifacts:
+            background = X.sample(min(len(X), SHAP_BACKGROUND_ROWS), random_state=0)
+            model.artifacts["shap_explainer"] = build_explainer(
+                model.pipeline, transform(model.pipeline, background)
+            )
+
+    return model.artifacts["shap_explainer"]
+
+
+def contributions(explainer, Xt):
+    """SHAP values as (rows, features, outputs) and base values as
+    (rows, outputs).
+
+    Binary boosters and linear models explain one output (the log-odds of
+    the positive class); forests and multiclass models one per class.
+    """
+    explanation = explainer(Xt)
+    values = np.asarray(explanation.values)
+    if values.ndim == 2:
+        values = values[:, :, None]
+
+    base = np.reshape(np.asarray(explanation.base_values, dtype=np.float64), (-1, values.shape[2]))
+    return values, np.broadcast_to(base, (len(Xt), values.shape[2]))
+
+
+# -----------------------------------
+# Global importance
+# -----------------------------------
+def shap_values(model, df, cache=None, rows=SHAP_SAMPLE_ROWS):
+    """Mean |SHAP| per model feature over a sample of ``df``.
+
+    Only the model's input columns are used, so the target and any extra
+    columns are ignored. At most ``rows`` rows are explained, stratified
+    by the target for classifiers, and fewer if explaining them takes more
+    than ``SHAP_MAX_SECONDS`` (``rows`` in the result says how many were
+    used). Results are memoized in ``cache`` (the dataset entry's
+    artifacts, which count against the dataset store's memory budget)
+    per model and sample size. For models with one output per class, ``importance``
+    averages the classes and ``per_class`` gives each.
+    """
+    key = ("shap", model.model_id, rows)
+    if cache is not None and key in cache:
+        return cache[key]
+
+    pipeline = model.pipeline
+    X = df.reindex(columns=pipeline.feature_names_)
+    target = getattr(pipeline, "target_name_", None)
+    if target in df.columns:
+        X, _ = selection_sample(X, df[target], model.meta.get("problem_type"), rows)
+    elif rows and len(X) > rows:
+        X = X.sample(rows, random_state=42)
+
+    Xt = transform(pipeline, X)
+    shap_explainer = explainer(model, X)
+
+    start = time.perf_counter()
+    total, explained = 0, 0
+    for offset in range(0, len(Xt), SHAP_CHUNK_ROWS):
+        values, _ = contributions(shap_explainer, Xt[offset:offset + SHAP_CHUNK_ROWS])
+        total = total + np.abs(values).sum(axis=0)
+        explained += len(values)
+        if time.perf_counter() - start > SHAP_MAX_SECONDS:
+            break
+    importance = total / max(explained, 1)
+
+    result = {
+        "features": feature_names(pipeline, Xt.shape[1]),
+        "importance": importance.mean(axis=1).tolist(),
+        "rows": explained,
+    }
+
+    classes = getattr(pipeline, "classes_", None)
+    if classes is not None and importance.shape[1] == len(classes):
+        result["per_class"] = {
+            str(cls): importance[:, k].tolist() for k, cls in enumerate(classes)
+        }
+
+    if cache is not None:
+        cache[key] = result
+    return result
+
+
+# -----------------------------------
+# Per-row contributions
+# -----------------------------------
+def output_names(model, n_outputs):
+    """What each explained output is: a class, the positive class's
+    log-odds, or the regression target."""
+    pipeline = model.pipeline
+    classes = getattr(pipeline, "classes_", None)
+    if classes is not None and n_outputs == len(classes):
+        return [str(cls) for cls in classes]
+    if classes is not None and n_outputs == 1:
+        return [str(classes[-1])]
+    return [str(getattr(pipeline, "target_name_", "value"))]
+
+
+def explain_rows(model, chunks, background=None):
+    """Yield per-row SHAP contributions as NDJSON lines, chunk by chunk.
+
+    ``chunks`` yields ``(row_ids, X)`` with X in the model's input
+    columns; ``background`` (raw rows) seeds the explainer if it is not
+    cached yet, otherwise the first chunk does. The first line names the
+    features and outputs; each following line is one row with its base
+    value and contributions per output (every class for multiclass
+    models), so ``base_values[k] + sum(shap_values[k])`` is the model's
+    raw output ``k``.
+    """
+    header = None
+    for row_ids, X in chunks:
+        if len(X) == 0:
+            continue
+
+        Xt = transform(model.pipeline, X)
+        values, base = contributions(explainer(model, X if background is None else background), Xt)
+
+        lines = []
+        if header is None:
+            header = {
+                "features": feature_names(model.pipeline, Xt.shape[1]),
+                "outputs": output_names(model, values.shape[2]),
+            }
+            lines.append(json.dumps(header))
+
+        for i, row_id in enumerate(row_ids):
+            lines.append(json.dumps({
+                "row": int(row_id),
+                "base_values": base[i].tolist(),
+                "shap_values": values[i].T.tolist(),
+            }))
+        yield "\n".join(lines) + "\n"
+
+
+def frame_chunks(X, positions, rows=SHAP_CHUNK_ROWS):
+    """(row_ids, X) chunks of the rows of ``X`` at ``positions``."""
+    for start in range(0, len(positions), rows):
+        chunk = positions[start:start + rows]
+        yield chunk, X.iloc[chunk]
+
+
+def upload_chunks(model, frames):
+    """(row_ids, X) chunks of raw uploaded frames, cleaned and aligned
+    like rows sent to /predict; row ids count from 0 over the file."""
+    offset = 0
+    for frame in frames:
+        X = prepare_frame(model, frame)
+        yield range(offset, offset + len(X)), X
+        offset += len(X)
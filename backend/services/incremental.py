@@ -0,0 +1,483 @@
+import os
+import tempfile
+import time
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import xgboost as xgb
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.linear_model import SGDClassifier, SGDRegressor
+from sklearn.metrics import accuracy_score, r2_score
+from sklearn.pipeline import Pipeline
+
+from services import storage
+from services.model import (
+    detect_problem_type, evaluation_metrics, _report,
+    EARLY_STOPPING_ROUNDS, TRAIN_THREADS,
+)
+from services.registry import ModelRegistry, feature_schema, HOLDOUT_ROWS
+from services.schema import numeric_columns, categorical_columns
+
+
+# Rows per batch streamed from the Arrow file; bounds the memory of each
+# transformed block
+STREAM_BATCH_ROWS = int(os.environ.get("AUTOML_STREAM_BATCH_ROWS", 100_000))
+
+# One-hot levels kept per categorical column (most frequent first); rarer
+# levels share the all-zero code
+MAX_CATEGORIES = 50
+
+# Rows are assigned to train / validation / test by a hash of their row
+# number, so every pass over the file agrees without storing a split.
+# Validation drives boosting early stopping; test picks the winner.
+SPLIT_BUCKETS = 10
+VALID_BUCKET = 0
+TEST_BUCKET = 1
+
+SGD_EPOCHS = 3
+BOOST_ROUNDS = 500
+
+
+# -----------------------------------
+# Streaming from the Arrow cache
+# -----------------------------------
+def iter_batches(table, rows=STREAM_BATCH_ROWS):
+    """Yield (offset, DataFrame) blocks of a memory-mapped table."""
+    for offset in range(0, table.num_rows, rows):
+        yield offset, table.slice(offset, rows).to_pandas()
+
+
+def split_bucket(index):
+    # splitmix64 finalizer: well mixed, cheap and deterministic
+    z = np.asarray(index, dtype=np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    z = z ^ (z >> np.uint64(31))
+    return (z % np.uint64(SPLIT_BUCKETS)).astype(np.int8)
+
+
+class StreamingPreprocessor(BaseEstimator, TransformerMixin):
+    """Standardize numeric columns and one-hot encode categoricals, fitted
+    in one pass over batches.
+
+    Means and variances are merged across batches with Chan's formulas
+    and category counts are summed, so nothing but per-column
+    statistics is held. Missing numerics become the mean (0 after
+    scaling). Output is a dense float32 block per batch.
+    """
+
+    def __init__(self, max_categories=MAX_CATEGORIES):
+        self.max_categories = max_categories
+
+    def partial_fit(self, X, y=None):
+        if not hasattr(self, "numeric_"):
+            self.numeric_ = list(numeric_columns(X))
+            self.categorical_ = list(categorical_columns(X))
+            self.count_ = np.zeros(len(self.numeric_))
+            self.mean_ = np.zeros(len(self.numeric_))
+            self.m2_ = np.zeros(len(self.numeric_))
+            self.category_counts_ = {col: pd.Series(dtype=np.int64) for col in self.categorical_}
+
+        values = X[self.numeric_].to_numpy(dtype=np.float64)
+        n_b = np.sum(~np.isnan(values), axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_b = np.where(n_b > 0, np.nansum(values, axis=0) / n_b, 0.0)
+            m2_b = np.nansum((values - mean_b) ** 2, axis=0)
+
+        n = self.count_ + n_b
+        delta = mean_b - self.mean_
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.mean_ = np.where(n > 0, self.mean_ + delta * n_b / n, 0.0)
+            self.m2_ = self.m2_ + m2_b + np.where(n > 0, delta * delta * self.count_ * n_b / n, 0.0)
+        self.count_ = n
+
+        for col in self.categorical_:
+            counts = X[col].astype(str).where(X[col].notna()).value_counts()
+            self.category_counts_[col] = self.category_counts_[col].add(counts, fill_value=0)
+
+        return self
+
+    def finalize(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.sqrt(self.m2_ / np.maximum(self.count_ - 1, 1))
+        self.scale_ = np.where(std > 0, std, 1.0).astype(np.float32)
+        self.categories_ = {
+            col: list(counts.sort_values(ascending=False).index[:self.max_categories])
+            for col, counts in self.category_counts_.items()
+        }
+        self.n_features_out_ = len(self.numeric_) + sum(len(c) for c in self.categories_.values())
+        return self
+
+    def transform(self, X):
+        out = np.zeros((len(X), self.n_features_out_), dtype=np.float32)
+
+        k = len(self.numeric_)
+        if k:
+            block = (X[self.numeric_].to_numpy(dtype=np.float32) - self.mean_.astype(np.float32)) / self.scale_
+            np.nan_to_num(block, copy=False, nan=0.0)
+            out[:, :k] = block
+
+        rows = np.arange(len(X))
+        for col in self.categorical_:
+            levels = self.categories_[col]
+            codes = pd.Categorical(X[col].astype(str).where(X[col].notna()), categories=levels).codes
+            hit = codes >= 0
+            out[rows[hit], k + codes[hit]] = 1.0
+            k += len(levels)
+
+        return out
+
+    def get_feature_names_out(self, input_features=None):
+        names = [f"num__{col}" for col in self.numeric_]
+        for col in self.categorical_:
+            names += [f"cat__{col}_{level}" for level in self.categories_[col]]
+        return np.asarray(names, dtype=object)
+
+
+# -----------------------------------
+# Fitted model wrapper
+# -----------------------------------
+class StreamedModel(BaseEstimator):
+    """Uniform predict/predict_proba over the estimators trained here
+    (an SGD model, or a native XGBoost / LightGBM booster)."""
+
+    def __init__(self, kind, model, classes=None, y_mean=0.0, y_std=1.0):
+        self.kind = kind
+        self.model = model
+        self.classes = classes
+        self.y_mean = y_mean
+        self.y_std = y_std
+
+    def fit(self, X=None, y=None):
+        # Trained by train_out_of_core; present so Pipeline accepts the step
+        return self
+
+    def __sklearn_is_fitted__(self):
+        return True
+
+    @property
+    def classes_(self):
+        return None if self.classes is None else np.asarray(self.classes)
+
+    def _raw(self, X):
+        if self.kind == "XGBoost":
+            return self.model.inplace_predict(X)
+        if self.kind == "LightGBM":
+            return self.model.predict(X)
+        if self.classes is not None:
+            return self.model.predict_proba(X)
+        return self.model.predict(X)
+
+    def predict_proba(self, X):
+        proba = np.asarray(self._raw(X), dtype=np.float64)
+        if proba.ndim == 1:
+            proba = np.column_stack([1 - proba, proba])
+        return proba
+
+    def predict(self, X):
+        if self.classes is not None:
+            return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+        return np.asarray(self._raw(X), dtype=np.float64) * self.y_std + self.y_mean
+
+
+# -----------------------------------
+# Data access for the boosters
+# -----------------------------------
+class _FrameFeatures:
+    # The preprocessor applied to a file batch that still has the target
+    def __init__(self, preprocessor, target):
+        self.preprocessor = preprocessor
+        self.target = target
+
+    def transform(self, frame):
+        return self.preprocessor.transform(frame.drop(columns=[self.target]))
+
+
+class _BatchIter(xgb.DataIter):
+    """Feeds one split of the file to XGBoost batch by batch."""
+
+    def __init__(self, table, preprocessor, labels, bucket_filter, cache_prefix):
+        self.table = table
+        self.preprocessor = preprocessor
+        self.labels = labels
+        self.bucket_filter = bucket_filter
+        self._offsets = list(range(0, table.num_rows, STREAM_BATCH_ROWS))
+        self._it = 0
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data):
+        if self._it >= len(self._offsets):
+            return 0
+        offset = self._offsets[self._it]
+        self._it += 1
+
+        frame = self.table.slice(offset, STREAM_BATCH_ROWS).to_pandas()
+        keep = self.bucket_filter(split_bucket(np.arange(offset, offset + len(frame))))
+        input_data(
+            data=self.preprocessor.transform(frame)[keep],
+            label=self.labels[offset:offset + len(frame)][keep],
+        )
+        return 1
+
+    def reset(self):
+        self._it = 0
+
+
+class _RowSequence(lgb.Sequence):
+    """Random access to selected rows of the file for LightGBM.
+
+    LightGBM samples rows one at a time (in ascending order) to find bin
+    edges and then reads slices; the last transformed block is kept so
+    consecutive single-row reads cost one transform per block. Rows are
+    served as float64, the only dtype LightGBM samples from.
+    """
+
+    def __init__(self, table, preprocessor, rows):
+        self.table = table
+        self.preprocessor = preprocessor
+        self.rows = rows
+        self.batch_size = STREAM_BATCH_ROWS
+        self._block = (None, None)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _take(self, rows):
+        frame = self.table.take(pa.array(rows)).to_pandas()
+        return self.preprocessor.transform(frame).astype(np.float64)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return self._take(self.rows[idx])
+
+        block = idx // self.batch_size
+        if self._block[0] != block:
+            start = block * self.batch_size
+            self._block = (block, self._take(self.rows[start:start + self.batch_size]))
+        return self._block[1][idx - block * self.batch_size]
+
+
+# -----------------------------------
+# Out-of-core training
+# -----------------------------------
+def _scan(table, target, progress):
+    """First pass: fit the preprocessor and collect the labels."""
+    preprocessor = StreamingPreprocessor()
+    labels, uniques = [], set()
+    target_dtype = None
+
+    for offset, frame in iter_batches(table):
+        _report(progress, "scan", rows=offset + len(frame), total=table.num_rows)
+        y = frame[target]
+        target_dtype = y.dtype
+        preprocessor.partial_fit(frame.drop(columns=[target]))
+        labels.append(y.to_numpy())
+        if len(uniques) <= 20:
+            uniques.update(y.dropna().unique().tolist())
+
+    preprocessor.finalize()
+    labels = np.concatenate(labels) if labels else np.empty(0)
+    problem_type = detect_problem_type(pd.Series(sorted(uniques, key=str), dtype=target_dtype))
+    return preprocessor, labels, problem_type
+
+
+def _fit_sgd(table, preprocessor, target, y, problem_type, classes, progress):
+    train_rows = split_bucket(np.arange(len(y))) > TEST_BUCKET
+
+    if problem_type == "regression":
+        y_mean, y_std = float(np.mean(y[train_rows])), float(np.std(y[train_rows]) or 1.0)
+        model = SGDRegressor(random_state=42)
+    else:
+        y_mean, y_std = 0.0, 1.0
+        model = SGDClassifier(loss="log_loss", random_state=42)
+
+    rng = np.random.default_rng(42)
+    for epoch in range(SGD_EPOCHS):
+        for offset, frame in iter_batches(table):
+            _report(progress, "fit", model="SGD", epoch=epoch, rows=offset + len(frame))
+            keep = train_rows[offset:offset + len(frame)]
+            X = preprocessor.transform(frame.drop(columns=[target]))[keep]
+            yb = y[offset:offset + len(frame)][keep]
+            order = rng.permutation(len(yb))
+            if problem_type == "regression":
+                model.partial_fit(X[order], (yb[order] - y_mean) / y_std)
+            else:
+                model.partial_fit(X[order], yb[order], classes=np.arange(len(classes)))
+
+    return StreamedModel("SGD", model, classes, y_mean, y_std)
+
+
+def _fit_xgboost(table, preprocessor, target, y, problem_type, classes, threads, progress):
+    _report(progress, "fit", model="XGBoost")
+    params = {"tree_method": "hist", "nthread": threads, "verbosity": 0}
+    if problem_type == "regression":
+        params["objective"] = "reg:squarederror"
+    elif problem_type == "binary":
+        params.update(objective="binary:logistic", eval_metric="logloss")
+    else:
+        params.update(objective="multi:softprob", num_class=len(classes), eval_metric="mlogloss")
+
+    features = _FrameFeatures(preprocessor, target)
+    with tempfile.TemporaryDirectory(dir=storage.CACHE_DIR) as cache:
+        # Pages of the quantized matrix are spilled to the cache directory
+        dtrain = xgb.ExtMemQuantileDMatrix(
+            _BatchIter(table, features, y, lambda b: b > TEST_BUCKET, os.path.join(cache, "train")),
+            nthread=threads,
+        )
+        dvalid = xgb.ExtMemQuantileDMatrix(
+            _BatchIter(table, features, y, lambda b: b == VALID_BUCKET, os.path.join(cache, "valid")),
+            ref=dtrain, nthread=threads,
+        )
+        booster = xgb.train(
+            params, dtrain, num_boost_round=BOOST_ROUNDS, evals=[(dvalid, "valid")],
+            early_stopping_rounds=EARLY_STOPPING_ROUNDS, verbose_eval=False,
+        )
+
+    booster = booster[:booster.best_iteration + 1]
+    return StreamedModel("XGBoost", booster, classes)
+
+
+def _fit_lightgbm(table, preprocessor, target, y, problem_type, classes, threads, progress):
+    _report(progress, "fit", model="LightGBM")
+    params = {"num_threads": threads, "verbose": -1}
+    if problem_type == "regression":
+        params["objective"] = "regression"
+    elif problem_type == "binary":
+        params["objective"] = "binary"
+    else:
+        params.update(objective="multiclass", num_class=len(classes))
+
+    buckets = split_bucket(np.arange(len(y)))
+    train_rows = np.flatnonzero(buckets > TEST_BUCKET)
+    valid_rows = np.flatnonzero(buckets == VALID_BUCKET)
+
+    features = _FrameFeatures(preprocessor, target)
+    dtrain = lgb.Dataset(
+        _RowSequence(table, features, train_rows), label=y[train_rows], params=params,
+    )
+    dvalid = lgb.Dataset(
+        _RowSequence(table, features, valid_rows), label=y[valid_rows], reference=dtrain,
+    )
+    booster = lgb.train(
+        params, dtrain, num_boost_round=BOOST_ROUNDS, valid_sets=[dvalid],
+        callbacks=[lgb.early_stopping(EARLY_STOPPING_ROUNDS, verbose=False)],
+    )
+    return StreamedModel("LightGBM", booster, classes)
+
+
+def _predict_test(table, preprocessor, target, models, progress):
+    """Stream the test split once, predicting with every model. Also
+    returns the first ``HOLDOUT_ROWS`` test rows (without the target)."""
+    y_true, preds, probas = [], {name: [] for name in models}, {name: [] for name in models}
+    holdout, held = [], 0
+    for offset, frame in iter_batches(table):
+        _report(progress, "evaluate", rows=offset + len(frame))
+        keep = split_bucket(np.arange(offset, offset + len(frame))) == TEST_BUCKET
+        frame = frame[keep]
+        if held < HOLDOUT_ROWS:
+            holdout.append(frame.drop(columns=[target]).head(HOLDOUT_ROWS - held))
+            held += len(holdout[-1])
+        X = preprocessor.transform(frame.drop(columns=[target]))
+        y_true.append(frame[target].to_numpy())
+        for name, model in models.items():
+            preds[name].append(model.predict(X))
+            if model.classes is not None:
+                probas[name].append(model.predict_proba(X))
+
+    y_true = np.concatenate(y_true)
+    preds = {name: np.concatenate(p) for name, p in preds.items()}
+    probas = {name: np.concatenate(p) for name, p in probas.items() if p}
+    holdout = pd.concat(holdout, ignore_index=True) if holdout else None
+    return y_true, preds, probas, holdout
+
+
+def train_out_of_core(dataset_id, target, cleaner=None, progress=None, threads=None):
+    """Train on a cached dataset without loading it into memory.
+
+    The cleaned Arrow file is memory-mapped and read in
+    ``STREAM_BATCH_ROWS`` batches: one pass fits a streaming
+    preprocessor and collects the labels (the only per-row state kept),
+    then an SGD model learns with ``partial_fit`` over a few epochs,
+    XGBoost builds an external-memory quantile matrix from a data
+    iterator, and LightGBM bins a ``Sequence`` over the file. The model
+    with the best score on a hashed 10% test split is saved like the
+    in-memory path's pipeline in the model registry.
+    """
+    threads = max(1, threads or TRAIN_THREADS)
+    table = storage.load_table(dataset_id)
+    if table is None:
+        raise ValueError("Dataset is not cached on disk; out-of-core training needs the Arrow file")
+    if target not in table.column_names:
+        raise ValueError("Invalid target column")
+
+    start = time.perf_counter()
+    preprocessor, labels, problem_type = _scan(table, target, progress)
+
+    classes = None
+    if problem_type == "regression":
+        y = labels.astype(np.float32)
+    else:
+        # Classes keep the target's own type (int, bool or str), so
+        # predictions match the in-memory pipeline's
+        if pd.isna(labels).any():
+            raise ValueError("Target column has missing values")
+        classes, y = np.unique(labels, return_inverse=True)
+        classes = classes.tolist()
+
+    models, seconds = {}, {}
+    fitters = {
+        "SGD": lambda: _fit_sgd(table, preprocessor, target, y, problem_type, classes, progress),
+        "XGBoost": lambda: _fit_xgboost(table, preprocessor, target, y, problem_type, classes, threads, progress),
+        "LightGBM": lambda: _fit_lightgbm(table, preprocessor, target, y, problem_type, classes, threads, progress),
+    }
+    for name, fit in fitters.items():
+        began = time.perf_counter()
+        models[name] = fit()
+        seconds[name] = time.perf_counter() - began
+
+    y_true, preds, probas, holdout = _predict_test(table, preprocessor, target, models, progress)
+
+    score = r2_score if problem_type == "regression" else accuracy_score
+    scores = {name: float(score(y_true, pred)) for name, pred in preds.items()}
+    best_model_name = max(scores, key=scores.get)
+
+    pipeline = Pipeline([
+        ("preprocessor", preprocessor),
+        ("model", models[best_model_name])
+    ])
+    pipeline.feature_names_ = [c for c in table.column_names if c != target]
+    pipeline.target_name_ = target
+
+    _report(progress, "save", model=best_model_name)
+    registered = ModelRegistry().register(
+        pipeline, cleaner,
+        holdout=holdout,
+        dataset_id=dataset_id,
+        target=target,
+        problem_type=problem_type,
+        best_model=best_model_name,
+        scores=scores,
+        training_seconds=time.perf_counter() - start,
+        features=feature_schema(table.schema.empty_table().to_pandas().drop(columns=[target])),
+    )
+
+    positive = probas.get(best_model_name)
+    return {
+        "model_id": registered["model_id"],
+        "problem_type": problem_type,
+        "best_model": best_model_name,
+        "scores": scores,
+        "fit_seconds": seconds,
+        "selection": {
+            "mode": "out_of_core",
+            "rows": int(table.num_rows),
+            "test_rows": int(len(y_true)),
+            "seconds": time.perf_counter() - start,
+        },
+        "metrics": evaluation_metrics(
+            problem_type, y_true, preds[best_model_name],
+            None if positive is None else (lambda: positive[:, 1]),
+        ),
+    }
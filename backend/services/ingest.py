@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from services.sketches import DatasetSketch
+
+
+CHUNK_ROWS = 100_000
+SAMPLE_ROWS = 10_000
+
+# Object columns whose sample has at most this many distinct values (and
+# fewer than CATEGORY_MAX_RATIO of the sampled rows) are stored as category.
+CATEGORY_MAX_UNIQUE = 1000
+CATEGORY_MAX_RATIO = 0.5
+
+
+
+# -----------------------------------
+# Dtype inference / downcasting
+# -----------------------------------
+def _looks_like_dates(sample):
+    values = sample.dropna()
+    if len(values) == 0:
+        return False
+    try:
+        parsed = pd.to_datetime(values, errors="coerce", format="mixed")
+    except (TypeError, ValueError):
+        return False
+    return parsed.notna().mean() > 0.8
+
+
+def infer_category_columns(sample):
+    """Pick low-cardinality text columns from a sample of the file."""
+    columns = []
+
+    for col in sample.columns:
+        s = sample[col]
+        if pd.api.types.is_numeric_dtype(s) or pd.api.types.is_datetime64_any_dtype(s):
+            continue
+
+        n_unique = s.nunique()
+        if n_unique > CATEGORY_MAX_UNIQUE or n_unique >= CATEGORY_MAX_RATIO * max(len(s), 1):
+            continue
+
+        # Leave date-like text alone so cleaning can still parse it
+        if _looks_like_dates(s):
+            continue
+
+        columns.append(col)
+
+    return columns
+
+
+def downcast_frame(df, category_columns=()):
+    """Shrink numeric dtypes in place and convert the given columns to category."""
+
+    for col in df.columns:
+        s = df[col]
+
+        if pd.api.types.is_bool_dtype(s):
+            continue
+        if pd.api.types.is_integer_dtype(s):
+            df[col] = pd.to_numeric(s, downcast="integer")
+        elif pd.api.types.is_float_dtype(s):
+            df[col] = s.astype(np.float32)
+        elif col in category_columns and not isinstance(s.dtype, pd.CategoricalDtype):
+            df[col] = s.astype("category")
+
+    return df
+
+
+def _as_category(series, categories_dtype):
+    # Category columns are picked from the first chunk; a later chunk can
+    # parse the same column as numbers (or all-NaN float), so its values
+    # are turned back into text with NaN kept
+    if isinstance(series.dtype, pd.CategoricalDtype) and series.cat.categories.dtype == categories_dtype:
+        return series
+
+    values = series.astype(object)
+    present = values.notna()
+    values[present] = values[present].astype(str)
+    categories = pd.Index(pd.unique(values[present]), dtype=categories_dtype)
+    return pd.Series(pd.Categorical(values, categories=categories), index=series.index, name=series.name)
+
+
+def _concat_chunks(chunks, category_columns):
+    # Categories differ between chunks; union them so the result stays
+    # categorical instead of falling back to object.
+    columns = list(chunks[0].columns)
+    merged = {}
+    for col in category_columns:
+        categories_dtype = chunks[0][col].cat.categories.dtype
+        merged[col] = union_categoricals(
+            [_as_category(c[col], categories_dtype) for c in chunks], ignore_order=True
+        )
+
+    df = pd.concat(
+        [c.drop(columns=list(merged)) for c in chunks],
+        ignore_index=True,
+    )
+
+    for col in sorted(merged, key=columns.index):
+        df.insert(columns.index(col), col, merged[col])
+
+    # Integer chunks promoted by a float chunk can end up as float64
+    for col in df.columns:
+        if df[col].dtype == np.float64:
+            df[col] = df[col].astype(np.float32)
+
+    return df
+
+
+# -----------------------------------
+# Readers
+# -----------------------------------
+def read_csv_chunked(source, chunk_rows=CHUNK_ROWS, sample_rows=SAMPLE_ROWS):
+    """Stream a CSV into a downcast DataFrame.
+
+    Only one chunk is held at full precision at a time, so peak memory is
+    roughly the size of the compact result plus one chunk. Each chunk is
+    sketched on its own and merged into the running ``DatasetSketch``.
+
+    Returns (df, stats).
+    """
+    stats = DatasetSketch()
+    chunks = []
+    category_columns = None
+
+    for chunk in pd.read_csv(source, chunksize=chunk_rows):
+
+        if category_columns is None:
+            category_columns = infer_category_columns(chunk.head(sample_rows))
+
+        stats.merge(stats.spawn().update(chunk))
+        chunks.append(downcast_frame(chunk, category_columns))
+
+    if not chunks:
+        raise ValueError("Uploaded file contains no rows")
+
+    df = _concat_chunks(chunks, category_columns)
+    return df, stats
+
+
+def read_excel(source):
+    df = pd.read_excel(source)
+
+    stats = DatasetSketch().update(df)
+
+    df = downcast_frame(df, infer_category_columns(df.head(SAMPLE_ROWS)))
+    return df, stats
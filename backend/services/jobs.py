@@ -0,0 +1,199 @@
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from services import storage
+from services.model import train_model, TrainingCancelled, TRAIN_THREADS
+from services.incremental import train_out_of_core
+
+
+# Trainings allowed to run at once on this host; further jobs wait in the
+# queue.
+MAX_CONCURRENT_TRAININGS = int(os.environ.get("AUTOML_MAX_TRAININGS", 2))
+
+# Concurrent trainings share the host's cores instead of each assuming
+# it has all of them
+THREADS_PER_TRAINING = max(1, TRAIN_THREADS // MAX_CONCURRENT_TRAININGS)
+
+# Finished jobs (and their results) are forgotten after this many seconds,
+# and only the most recent ones are kept
+JOB_TTL_SECONDS = float(os.environ.get("AUTOML_JOB_TTL", 3600))
+MAX_FINISHED_JOBS = int(os.environ.get("AUTOML_MAX_FINISHED_JOBS", 100))
+
+
+# -----------------------------------
+# Worker side (runs in the process pool)
+# -----------------------------------
+def _run_training(job_id, dataset_id, df, target, cleaner, options, progress, cancel):
+    """Train in a pool process, publishing progress into the shared dict."""
+
+    def report(stage, **info):
+        if cancel.get(job_id):
+            raise TrainingCancelled()
+        progress[job_id] = {"stage": stage, **info}
+
+    if options.pop("out_of_core", False):
+        return train_out_of_core(
+            dataset_id, target, cleaner=cleaner, progress=report,
+            threads=THREADS_PER_TRAINING,
+        )
+
+    report("load")
+    if df is None:
+        # Cached datasets are memory-mapped here instead of being pickled
+        # across the process boundary
+        df = storage.load_frame(dataset_id)
+
+    return train_model(
+        df, target, cleaner=cleaner, progress=report,
+        threads=THREADS_PER_TRAINING, dataset_id=dataset_id, **options
+    )
+
+
+# -----------------------------------
+# Job manager (runs in the API process)
+# -----------------------------------
+class Job:
+
+    def __init__(self, job_id, dataset_id, target):
+        self.job_id = job_id
+        self.dataset_id = dataset_id
+        self.target = target
+        self.future = None
+        self.created = time.time()
+        self.finished = None
+
+
+class JobManager:
+    """Runs trainings in a process pool and tracks them by job ID.
+
+    At most ``max_workers`` trainings run concurrently; the rest are
+    queued by the executor. Workers report their stage through a managed
+    dict and check a second one for cancellation requests, so a running
+    job stops when its next (model, fold) task starts. Finished jobs are
+    pruned after ``ttl`` seconds or once more than ``max_finished`` have
+    accumulated, oldest first.
+    """
+
+    def __init__(self, max_workers=MAX_CONCURRENT_TRAININGS, ttl=JOB_TTL_SECONDS,
+                 max_finished=MAX_FINISHED_JOBS):
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self.max_finished = max_finished
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._manager = None
+        self._progress = None
+        self._cancel = None
+
+    def _start(self):
+        # Lazily, so importing the app does not fork anything
+        if self._executor is None:
+            context = multiprocessing.get_context("spawn")
+            self._manager = context.Manager()
+            self._progress = self._manager.dict()
+            self._cancel = self._manager.dict()
+            self._executor = ProcessPoolExecutor(self.max_workers, mp_context=context)
+
+    def submit(self, entry, target, cleaner=None, **options):
+        # options are passed through to train_model (e.g. selection)
+        job = Job(uuid.uuid4().hex, entry.dataset_id, target)
+        df = None if entry.path else entry.df
+
+        with self._lock:
+            self._start()
+            self._prune()
+            self._progress[job.job_id] = {"stage": "queued"}
+            job.future = self._executor.submit(
+                _run_training, job.job_id, entry.dataset_id, df, target,
+                cleaner, options, self._progress, self._cancel,
+            )
+            self._jobs[job.job_id] = job
+
+        job.future.add_done_callback(lambda _: self._finish(job))
+        return job
+
+    def _finish(self, job):
+        job.finished = time.time()
+
+    def _prune(self):
+        # Called with the lock held; running and queued jobs are never pruned
+        finished = sorted(
+            (job for job in self._jobs.values() if job.finished is not None),
+            key=lambda job: job.finished,
+        )
+        expired = [job for job in finished if job.finished < time.time() - self.ttl]
+        expired += finished[len(expired):max(len(expired), len(finished) - self.max_finished)]
+
+        for job in expired:
+            del self._jobs[job.job_id]
+            self._progress.pop(job.job_id, None)
+            self._cancel.pop(job.job_id, None)
+
+    def get(self, job_id):
+        with self._lock:
+            if self._executor is not None:
+                self._prune()
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+
+        progress = dict(self._progress.get(job_id, {}))
+
+        future = job.future
+        status = "queued" if progress.get("stage") == "queued" else "running"
+        result = error = None
+
+        if future.cancelled():
+            status = "cancelled"
+        elif future.done():
+            exc = future.exception()
+            if isinstance(exc, TrainingCancelled):
+                status = "cancelled"
+            elif exc is not None:
+                status, error = "failed", str(exc)
+            else:
+                status, result = "done", future.result()
+        elif self._cancel.get(job_id):
+            status = "cancelling"
+
+        end = job.finished or time.time()
+        return {
+            "job_id": job_id,
+            "dataset_id": job.dataset_id,
+            "target": job.target,
+            "status": status,
+            "stage": progress.get("stage"),
+            "model": progress.get("model"),
+            "fold": progress.get("fold"),
+            "folds": progress.get("folds"),
+            "tasks_done": progress.get("done"),
+            "tasks": progress.get("tasks"),
+            "elapsed": end - job.created,
+            "result": result,
+            "error": error,
+        }
+
+    def cancel(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return False
+
+        # Queued jobs never start; running ones stop at the next report
+        if not job.future.cancel() and not job.future.done():
+            self._cancel[job_id] = True
+        return True
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                for job_id, job in self._jobs.items():
+                    if not job.future.done():
+                        self._cancel[job_id] = True
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._manager.shutdown()
+                self._executor = None
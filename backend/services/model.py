@@ -1,7 +1,17 @@
+import hashlib
+import logging
+import os
+import time
+import warnings
+
 import numpy as np
-import joblib
+import pandas as pd
+
+from joblib import Parallel, delayed
+from threadpoolctl import threadpool_limits
 
-from sklearn.model_selection import train_test_split, cross_val_score, StratifiedKFold
+from sklearn.base import clone
+from sklearn.model_selection import train_test_split, KFold, StratifiedKFold
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import OneHotEncoder, StandardScaler
@@ -12,12 +22,25 @@ from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
 from sklearn.metrics import (
     accuracy_score, f1_score, precision_score, recall_score,
     confusion_matrix, roc_curve, auc,
-    mean_squared_error, r2_score
+    mean_squared_error, r2_score, get_scorer
 )
 
+from scipy.stats import kendalltau
+
 from xgboost import XGBClassifier, XGBRegressor
+import lightgbm as lgb
 from lightgbm import LGBMClassifier, LGBMRegressor
 
+from services.registry import ModelRegistry, feature_schema, HOLDOUT_ROWS
+from services.schema import numeric_columns, categorical_columns
+
+
+logger = logging.getLogger(__name__)
+
+# Cores one training run may use across all of its CV workers and
+# estimator thread pools
+TRAIN_THREADS = int(os.environ.get("AUTOML_TRAIN_THREADS", os.cpu_count() or 1))
+
 
 # -----------------------------------
 # Detect Problem Type (Improved)
@@ -27,7 +50,7 @@ def detect_problem_type(y):
     unique_values = y.nunique()
 
     # Numeric with many unique values → regression
-    if y.dtype in ["int64", "float64"] and unique_values > 20:
+    if pd.api.types.is_numeric_dtype(y) and unique_values > 20:
         return "regression"
 
     # Exactly 2 classes → binary
@@ -43,8 +66,8 @@ def detect_problem_type(y):
 # -----------------------------------
 def build_preprocessor(X):
 
-    numeric_features = X.select_dtypes(include=["int64", "float64"]).columns
-    categorical_features = X.select_dtypes(include=["object"]).columns
+    numeric_features = numeric_columns(X)
+    categorical_features = categorical_columns(X)
 
     numeric_transformer = Pipeline(steps=[
         ("imputer", SimpleImputer(strategy="median")),
@@ -69,6 +92,34 @@ def build_preprocessor(X):
 # -----------------------------------
 # Get Models
 # -----------------------------------
+class XGBLabelClassifier(XGBClassifier):
+    """XGBClassifier for arbitrary class labels. XGBoost only accepts
+    0..k-1, so labels (eval_set too) are encoded for fitting and
+    ``classes_``/``predict`` give the original labels back."""
+
+    def fit(self, X, y, **kwargs):
+        labels, codes = np.unique(np.asarray(y), return_inverse=True)
+        if kwargs.get("eval_set"):
+            kwargs["eval_set"] = [
+                (X_eval, np.searchsorted(labels, np.asarray(y_eval)))
+                for X_eval, y_eval in kwargs["eval_set"]
+            ]
+        self.__dict__.pop("labels_", None)
+        super().fit(X, codes, **kwargs)
+        self.labels_ = labels
+        return self
+
+    @property
+    def classes_(self):
+        # XGBoost's own 0..k-1 while fitting
+        labels = self.__dict__.get("labels_")
+        return labels if labels is not None else np.arange(self.n_classes_)
+
+    def predict(self, X, **kwargs):
+        codes = super().predict(X, **kwargs)
+        return codes if kwargs.get("output_margin") else self.classes_[codes]
+
+
 def get_models(problem_type):
 
     if problem_type == "regression":
@@ -81,101 +132,475 @@ def get_models(problem_type):
     return {
         "LogisticRegression": LogisticRegression(max_iter=1000),
         "RandomForest": RandomForestClassifier(random_state=42),
-        "XGBoost": XGBClassifier(eval_metric="logloss", random_state=42, verbosity=0),
+        "XGBoost": XGBLabelClassifier(eval_metric="logloss", random_state=42, verbosity=0),
         "LightGBM": LGBMClassifier(random_state=42)
     }
 
 
 # -----------------------------------
-# Compare Models
+# Progress / Cancellation
 # -----------------------------------
-def compare_models(models, preprocessor, X_train, y_train, problem_type):
+class TrainingCancelled(Exception):
+    """Raised by a progress callback to stop a training run."""
 
-    scores = {}
 
-    for name, model in models.items():
+def _report(progress, stage, **info):
+    # progress(stage, **info) may raise TrainingCancelled
+    if progress is not None:
+        progress(stage, **info)
 
-        pipeline = Pipeline([
-            ("preprocessor", preprocessor),
-            ("model", model)
-        ])
 
-        try:
+# -----------------------------------
+# Thread budget
+# -----------------------------------
+# Estimators that start their own thread pools; their n_jobs is set from
+# the scheduler's thread budget instead of defaulting to every core
+THREADED_MODELS = (
+    RandomForestClassifier, RandomForestRegressor,
+    XGBClassifier, XGBRegressor,
+    LGBMClassifier, LGBMRegressor,
+)
 
-            if problem_type == "regression":
-                score = cross_val_score(
-                    pipeline,
-                    X_train,
-                    y_train,
-                    cv=5,
-                    scoring="r2",
-                    n_jobs=-1
-                ).mean()
 
-            else:
-                cv = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
+def thread_budget(tasks, threads=None):
+    """Split ``threads`` cores into (workers, threads per estimator)."""
+    threads = max(1, threads or TRAIN_THREADS)
+    workers = max(1, min(tasks, threads))
+    return workers, max(1, threads // workers)
 
-                score = cross_val_score(
-                    pipeline,
-                    X_train,
-                    y_train,
-                    cv=cv,
-                    scoring="accuracy",
-                    n_jobs=-1
-                ).mean()
 
-            scores[name] = score
+def with_threads(model, threads):
+    if isinstance(model, THREADED_MODELS):
+        model = clone(model).set_params(n_jobs=threads)
+    return model
 
-        except Exception:
-            scores[name] = -999  # prevent crash
 
-    return scores
+# -----------------------------------
+# Fold-level preprocessing cache
+# -----------------------------------
+def _preprocess_fold(preprocessor, X, train_idx, test_idx):
+    preprocessor = clone(preprocessor)
+    Xt_train = preprocessor.fit_transform(X.iloc[train_idx])
+    return Xt_train, preprocessor.transform(X.iloc[test_idx])
+
+
+class FoldCache:
+    """Preprocessed train/validation matrices per CV split.
+
+    Every candidate model shares the same preprocessor, so each split's
+    imputation, scaling and one-hot encoding is fit and applied once and
+    the matrices are reused by all candidates. Entries are keyed by the
+    split's row indices, so any later pass over the same split hits the
+    cache too.
+    """
+
+    def __init__(self, preprocessor, X, y):
+        self.preprocessor = preprocessor
+        self.X = X
+        self.y = np.asarray(y)
+        self._folds = {}
+
+    @staticmethod
+    def key(train_idx, test_idx):
+        h = hashlib.sha1(np.ascontiguousarray(train_idx).tobytes())
+        h.update(b"|")
+        h.update(np.ascontiguousarray(test_idx).tobytes())
+        return h.hexdigest()
+
+    def prepare(self, splits, n_jobs=1, progress=None, **info):
+        """Preprocess every split not cached yet, in parallel."""
+        missing = {}
+        for train_idx, test_idx in splits:
+            key = self.key(train_idx, test_idx)
+            if key not in self._folds:
+                missing[key] = (train_idx, test_idx)
+
+        def tasks():
+            # Consumed lazily by joblib: each split is reported (and a
+            # cancellation checked) as it is handed to a worker
+            for i, (train_idx, test_idx) in enumerate(missing.values()):
+                _report(progress, "preprocess", fold=i + 1, folds=len(missing), **info)
+                yield delayed(_preprocess_fold)(self.preprocessor, self.X, train_idx, test_idx)
+
+        results = Parallel(
+            n_jobs=min(n_jobs, max(len(missing), 1)), pre_dispatch="n_jobs", batch_size=1
+        )(tasks())
+        for (key, (train_idx, test_idx)), (Xt_train, Xt_test) in zip(missing.items(), results):
+            self._folds[key] = (Xt_train, self.y[train_idx], Xt_test, self.y[test_idx])
+
+    def get(self, train_idx, test_idx):
+        """(Xt_train, y_train, Xt_test, y_test) for a split."""
+        key = self.key(train_idx, test_idx)
+        if key not in self._folds:
+            self.prepare([(train_idx, test_idx)])
+        return self._folds[key]
+
+    def __len__(self):
+        return len(self._folds)
 
 
 # -----------------------------------
-# Train Best Model
+# Compare Models
 # -----------------------------------
-def train_model(df, target):
+# Adaptive selection: each successive-halving rung keeps the best 1/ETA
+# of the candidates; earlier rungs use fewer rows and folds
+HALVING_ETA = 3
+HALVING_MIN_ROWS = 1000
 
-    if target not in df.columns:
-        raise Exception("Invalid target column")
+# Candidates whose mean fold score trails the leader by more than this
+# many standard errors are dropped
+RACING_Z = 2.0
 
-    X = df.drop(columns=[target])
-    y = df[target]
+# Boosters hold out this share of each training fold and stop adding
+# trees once the holdout score has not improved for this many rounds
+EARLY_STOPPING_FRACTION = 0.1
+EARLY_STOPPING_ROUNDS = 20
 
-    problem_type = detect_problem_type(y)
+BOOSTED_MODELS = (XGBClassifier, XGBRegressor, LGBMClassifier, LGBMRegressor)
+
+SELECTION_MODES = ("full", "adaptive")
+
+# Optional tuning stage: the best candidates after selection are tuned,
+# for at most this many finished trials unless the time budget runs out first
+TUNING_CANDIDATES = 2
+TUNING_TRIALS = 100
+
+# Candidates are compared on at most this many training rows (stratified
+# for classification); only the winner is refit on everything
+SELECTION_ROW_BUDGET = int(os.environ.get("AUTOML_SELECTION_ROWS", 200_000))
+
+# Learning-curve check: sample fractions scored besides the full sample,
+# and the Kendall tau against the full ranking counted as settled
+LEARNING_CURVE_FRACTIONS = (0.25, 0.5)
+RANKING_STABLE_TAU = 0.6
 
+# Upper bound for the tuning wall-clock budget a request may ask for
+MAX_TUNING_SECONDS = float(os.environ.get("AUTOML_MAX_TUNING_SECONDS", 600))
+
+
+def _cv(problem_type):
     if problem_type == "regression":
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42
-        )
-    else:
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, stratify=y, random_state=42
+        return KFold(n_splits=5), "r2"
+    return StratifiedKFold(n_splits=5, shuffle=True, random_state=42), "accuracy"
+
+
+def _fit_early_stopping(model, Xt_train, y_train, rounds):
+    # Trees are added until a holdout carved from the training fold stops
+    # improving; the validation fold stays untouched for scoring
+    order = np.random.default_rng(42).permutation(len(y_train))
+    n_eval = max(1, int(len(order) * EARLY_STOPPING_FRACTION))
+    fit_idx, eval_idx = np.sort(order[n_eval:]), np.sort(order[:n_eval])
+    eval_set = [(Xt_train[eval_idx], y_train[eval_idx])]
+
+    if isinstance(model, (XGBClassifier, XGBRegressor)):
+        model.set_params(early_stopping_rounds=rounds)
+        model.fit(Xt_train[fit_idx], y_train[fit_idx], eval_set=eval_set, verbose=False)
+        return model.best_iteration + 1
+
+    # LightGBM 4.6 deprecated eval_set for eval_X/eval_y, but (as of 4.7)
+    # LGBMClassifier label-encodes only eval_set, so string classes fail
+    # with eval_y
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", lgb.basic.LGBMDeprecationWarning)
+        model.fit(
+            Xt_train[fit_idx], y_train[fit_idx], eval_set=eval_set,
+            callbacks=[lgb.early_stopping(rounds, verbose=False)],
         )
+    return model.best_iteration_ or model.n_estimators
+
+
+def _fit_and_score(name, fold, model, Xt_train, y_train, Xt_test, y_test, scoring, threads,
+                   early_stopping=0):
+    # Runs in a worker on already-preprocessed matrices; BLAS/OpenMP
+    # pools are capped to this task's share
+    cpu_start = time.process_time()
+    rounds = error = None
+    try:
+        with threadpool_limits(limits=threads):
+            model = clone(model)
+            if early_stopping and isinstance(model, BOOSTED_MODELS):
+                rounds = _fit_early_stopping(model, Xt_train, y_train, early_stopping)
+            else:
+                model.fit(Xt_train, y_train)
+            score = get_scorer(scoring)(model, Xt_test, y_test)
+    except Exception as exc:
+        # The candidate scores -999; the reason is logged and returned
+        score, error = None, f"{type(exc).__name__}: {exc}"
+        logger.warning("%s failed on fold %d: %s", name, fold, error)
+    return name, fold, score, time.process_time() - cpu_start, rounds, error
+
+
+def _run_grid(models, folds, splits, scoring, threads, progress, early_stopping=0, errors=None,
+              **info):
+    """Fit every (model, split) pair; returns per-model fold scores, seconds,
+    CPU seconds and rounds.
+
+    The whole grid is one batch of tasks spread over the thread budget:
+    each worker fits one task at a time with its estimator's own thread
+    pool limited to ``threads // workers``, so the cores are busy without
+    the pools oversubscribing them.
+
+    A model's seconds are wall-clock, from the start of its first task to
+    the end of its last; candidates overlap, so they do not add up to the
+    grid's time. CPU seconds are summed over its tasks and all threads.
+    If ``errors`` is a dict, a failed model's first error is stored in it.
+    """
+    workers, per_task = thread_budget(len(models) * len(splits), threads)
+
+    n_tasks = len(models) * len(splits)
+    done = 0
+
+    def tasks():
+        # joblib pulls a task only when a worker is free (pre_dispatch =
+        # n_jobs, one task per batch), so this reports each (model, fold)
+        # as it starts. A cancellation raised here aborts the running
+        # tasks instead of waiting for the grid to drain.
+        for name, model in models.items():
+            for fold, (train, test) in enumerate(splits):
+                _report(progress, "cv", model=name, fold=fold + 1, folds=len(splits),
+                        done=done, tasks=n_tasks, **info)
+                started.setdefault(name, time.perf_counter())
+                yield delayed(_fit_and_score)(
+                    name, fold, with_threads(model, per_task), *folds.get(train, test),
+                    scoring, per_task, early_stopping,
+                )
+
+    fold_scores = {name: [] for name in models}
+    started, seconds = {}, dict.fromkeys(models, 0.0)
+    cpu_seconds = dict.fromkeys(models, 0.0)
+    rounds = {name: [] for name in models}
+
+    grid = Parallel(
+        n_jobs=workers, return_as="generator_unordered", pre_dispatch="n_jobs", batch_size=1
+    )
+    for name, fold, score, cpu, used, error in grid(tasks()):
+        if error is not None and errors is not None:
+            errors.setdefault(name, error)
+        fold_scores[name].append(score)
+        seconds[name] = time.perf_counter() - started[name]
+        cpu_seconds[name] += cpu
+        if used is not None:
+            rounds[name].append(used)
+        done += 1
 
-    preprocessor = build_preprocessor(X)
-    models = get_models(problem_type)
+    return fold_scores, seconds, cpu_seconds, rounds
 
-    scores = compare_models(models, preprocessor, X_train, y_train, problem_type)
 
-    best_model_name = max(scores, key=scores.get)
-    best_model = models[best_model_name]
+def _mean_scores(fold_scores):
+    scores = {}
+    for name, values in fold_scores.items():
+        if any(v is None for v in values):
+            scores[name] = -999  # prevent crash
+        else:
+            scores[name] = float(np.mean(values))
+    return scores
 
-    pipeline = Pipeline([
-        ("preprocessor", preprocessor),
-        ("model", best_model)
-    ])
 
-    pipeline.fit(X_train, y_train)
+def compare_models(models, preprocessor, X_train, y_train, problem_type, progress=None, threads=None,
+                   folds=None, errors=None):
+    """Cross-validate every candidate; returns (scores, seconds, CPU seconds
+    per candidate).
 
-    # Save feature metadata for SHAP
-    pipeline.feature_names_ = X.columns.tolist()
-    pipeline.target_name_ = target
+    Each fold is preprocessed once (see ``FoldCache``) and the (model x
+    fold) grid runs under the thread budget. Seconds are each candidate's
+    wall-clock time in the grid; CPU seconds are summed over its folds
+    (see ``_run_grid``). Pass ``folds`` to share the cache with a later
+    stage, and an ``errors`` dict to collect why candidates failed.
+    """
+    cv, scoring = _cv(problem_type)
+    splits = list(cv.split(X_train, y_train))
 
-    joblib.dump(pipeline, "best_model.pkl")
+    if folds is None:
+        folds = FoldCache(preprocessor, X_train, y_train)
+    folds.prepare(splits, n_jobs=thread_budget(len(splits), threads)[0], progress=progress)
 
-    y_pred = pipeline.predict(X_test)
+    fold_scores, seconds, cpu_seconds, _ = _run_grid(
+        models, folds, splits, scoring, threads, progress, errors=errors
+    )
+    return _mean_scores(fold_scores), seconds, cpu_seconds
+
+
+def _shrink_splits(splits, fraction, rng):
+    # Subsample each training fold; validation folds are left whole so
+    # scores stay comparable across sizes
+    if fraction >= 1:
+        return list(splits)
+    return [
+        (np.sort(rng.choice(train, max(1, int(len(train) * fraction)), replace=False)), test)
+        for train, test in splits
+    ]
+
+
+def halving_rungs(n_candidates, n_rows, n_folds=5, eta=HALVING_ETA, min_rows=HALVING_MIN_ROWS):
+    """(rows, folds) per rung, growing by ``eta``; the last is full CV."""
+    halvings = max(0, int(np.ceil(np.log(max(n_candidates, 1)) / np.log(eta) - 1e-9)))
+    rungs = []
+    for r in range(halvings + 1):
+        fraction = float(eta) ** (r - halvings)
+        rows = min(n_rows, max(min_rows, int(n_rows * fraction)))
+        folds = n_folds if r == halvings else max(2, int(np.ceil(n_folds * fraction)))
+        if rungs and rungs[-1] == (rows, folds):
+            continue  # small data: rungs collapse onto min_rows
+        rungs.append((rows, folds))
+    return rungs
+
+
+def _survivors(fold_scores, cap):
+    # Candidates whose mean is not clearly below the leader's given the
+    # spread across folds, best first and at most ``cap`` of them
+    stats = {}
+    for name, values in fold_scores.items():
+        if any(v is None for v in values):
+            continue
+        values = np.asarray(values, dtype=np.float64)
+        se = values.std(ddof=1) / np.sqrt(len(values)) if len(values) > 1 else 0.0
+        stats[name] = (values.mean(), se)
+    if not stats:
+        return list(fold_scores)[:cap]
+
+    ranked = sorted(stats, key=lambda name: stats[name][0], reverse=True)[:cap]
+    best_mean, best_se = stats[ranked[0]]
+    return [
+        name for name in ranked
+        if stats[name][0] >= best_mean - RACING_Z * np.hypot(stats[name][1], best_se)
+    ]
+
+
+def successive_halving(models, preprocessor, X_train, y_train, problem_type, progress=None,
+                       threads=None, early_stopping=EARLY_STOPPING_ROUNDS, folds=None, errors=None):
+    """Adaptive alternative to ``compare_models``.
+
+    Every candidate is first scored on a few folds of a row subsample.
+    Candidates trailing the leader by more than the fold-to-fold noise
+    are dropped, and at most the best 1/``HALVING_ETA`` (but two, if
+    they are tied) move on to the next rung, which uses ``HALVING_ETA``
+    times more rows. Selection ends as soon as one candidate is left, so
+    a clear winner is found on a small sample and only a close race
+    reaches full cross-validation. Training folds are subsampled but
+    validation folds are not, so rungs score on the same rows. Boosters
+    also stop early on a holdout cut from each training fold.
+
+    Returns (scores, seconds, cpu_seconds, rungs, rounds, finalists): each
+    candidate's score from the last rung it reached, its wall-clock and
+    CPU seconds summed over the rungs it ran on, a record of which candidates ran on which rung, the
+    boosting rounds chosen per fold on the last rung, and the candidates
+    still in the race at the end.
+    """
+    cv, scoring = _cv(problem_type)
+    splits = list(cv.split(X_train, y_train))
+    if folds is None:
+        folds = FoldCache(preprocessor, X_train, y_train)
+    rng = np.random.default_rng(42)
+
+    alive = dict(models)
+    scores, rounds = {}, {}
+    seconds = dict.fromkeys(models, 0.0)
+    cpu_seconds = dict.fromkeys(models, 0.0)
+    record = []
+
+    for r, (rows, n_folds) in enumerate(halving_rungs(len(models), len(X_train), len(splits))):
+        if len(alive) == 1 and record:
+            break
+
+        rung_splits = _shrink_splits(splits[:n_folds], rows / len(X_train), rng)
+
+        folds.prepare(rung_splits, n_jobs=thread_budget(n_folds, threads)[0], progress=progress, rung=r)
+
+        fold_scores, rung_seconds, rung_cpu, rounds = _run_grid(
+            alive, folds, rung_splits, scoring, threads, progress, early_stopping, errors, rung=r
+        )
+        scores.update(_mean_scores(fold_scores))
+        for name, value in rung_seconds.items():
+            seconds[name] += value
+            cpu_seconds[name] += rung_cpu[name]
+
+        record.append({"rows": rows, "folds": n_folds, "models": list(alive)})
+
+        cap = max(2, int(np.ceil(len(alive) / HALVING_ETA)))
+        alive = {name: alive[name] for name in _survivors(fold_scores, cap)}
+
+    return scores, seconds, cpu_seconds, record, rounds, list(alive)
+
+
+# -----------------------------------
+# Large tables: selection on a sample
+# -----------------------------------
+def selection_sample(X, y, problem_type, row_budget=None):
+    """At most ``row_budget`` rows of (X, y) for comparing candidates,
+    stratified by class for classification."""
+    row_budget = SELECTION_ROW_BUDGET if row_budget is None else row_budget
+    if not row_budget or len(X) <= row_budget:
+        return X, y
+
+    stratify = None
+    if problem_type != "regression":
+        # Classes too rare to appear in every stratum are sampled at random
+        counts = y.value_counts()
+        if counts.min() * row_budget / len(y) >= 2:
+            stratify = y
+
+    X_sel, _, y_sel, _ = train_test_split(
+        X, y, train_size=row_budget, stratify=stratify, random_state=42
+    )
+    return X_sel, y_sel
+
+
+def ranking_stability(models, folds, splits, scoring, scores, threads=None, progress=None,
+                      fractions=LEARNING_CURVE_FRACTIONS):
+    """Learning curve of the candidates' ranking.
+
+    Candidates are scored on ``fractions`` of each training fold (same
+    validation folds) and the ranking at each size is compared with the
+    one from the full sample by Kendall's tau. If the winner and the
+    order have already settled at half the sample, a larger sample would
+    most likely not change the decision either.
+    """
+    rng = np.random.default_rng(42)
+    valid = [name for name in models if scores.get(name, -999) != -999]
+    curve = []
+
+    for fraction in fractions:
+        sized = _shrink_splits(splits, fraction, rng)
+        folds.prepare(sized, n_jobs=thread_budget(len(sized), threads)[0], progress=progress,
+                      curve=fraction)
+        fold_scores, _, _, _ = _run_grid(
+            {name: models[name] for name in valid}, folds, sized, scoring, threads, progress,
+            curve=fraction,
+        )
+        curve.append((fraction, _mean_scores(fold_scores)))
+    curve.append((1.0, {name: scores[name] for name in valid}))
+
+    final = curve[-1][1]
+    winner = max(final, key=final.get) if final else None
+    points = []
+    for fraction, sized_scores in curve:
+        tau = np.nan
+        if len(valid) > 1:
+            tau = kendalltau(
+                [sized_scores[name] for name in valid], [final[name] for name in valid]
+            ).statistic
+        points.append({
+            "fraction": fraction,
+            "rows": int(round(fraction * len(folds.X))),
+            "scores": sized_scores,
+            "winner": max(sized_scores, key=sized_scores.get) if sized_scores else None,
+            "rank_agreement": None if np.isnan(tau) else float(tau),
+        })
+
+    half = points[-2] if len(points) > 1 else points[-1]
+    return {
+        "points": points,
+        "stable": half["winner"] == winner and (
+            half["rank_agreement"] is None or half["rank_agreement"] >= RANKING_STABLE_TAU
+        ),
+    }
+
+
+# -----------------------------------
+# Evaluation
+# -----------------------------------
+def evaluation_metrics(problem_type, y_test, y_pred, positive_proba=None):
+    """Hold-out metrics; ``positive_proba()`` gives binary scores for the ROC."""
 
     # -----------------------------------
     # Regression Metrics
@@ -186,13 +611,8 @@ def train_model(df, target):
         r2 = r2_score(y_test, y_pred)
 
         return {
-            "problem_type": problem_type,
-            "best_model": best_model_name,
-            "scores": scores,
-            "metrics": {
-                "rmse": float(rmse),
-                "r2": float(r2)
-            }
+            "rmse": float(rmse),
+            "r2": float(r2)
         }
 
     # -----------------------------------
@@ -204,27 +624,22 @@ def train_model(df, target):
     recall = recall_score(y_test, y_pred, average="weighted")
     cm = confusion_matrix(y_test, y_pred).tolist()
 
-    result = {
-        "problem_type": problem_type,
-        "best_model": best_model_name,
-        "scores": scores,
-        "metrics": {
-            "accuracy": float(acc),
-            "f1_score": float(f1),
-            "precision": float(precision),
-            "recall": float(recall),
-            "confusion_matrix": cm
-        }
+    metrics = {
+        "accuracy": float(acc),
+        "f1_score": float(f1),
+        "precision": float(precision),
+        "recall": float(recall),
+        "confusion_matrix": cm
     }
 
     # ROC for binary only
-    if problem_type == "binary":
+    if problem_type == "binary" and positive_proba is not None:
         try:
-            y_proba = pipeline.predict_proba(X_test)[:, 1]
+            y_proba = positive_proba()
             fpr, tpr, _ = roc_curve(y_test, y_proba)
             roc_auc = auc(fpr, tpr)
 
-            result["metrics"]["roc_curve"] = {
+            metrics["roc_curve"] = {
                 "fpr": fpr.tolist(),
                 "tpr": tpr.tolist(),
                 "auc": float(roc_auc)
@@ -232,4 +647,204 @@ def train_model(df, target):
         except Exception:
             pass
 
-    return result
\ No newline at end of file
+    return metrics
+
+
+# -----------------------------------
+# Train Best Model
+# -----------------------------------
+def train_model(df, target, cleaner=None, progress=None, threads=None, selection="full",
+                tune_seconds=0, tune_trials=TUNING_TRIALS, study_name=None, resume=True,
+                row_budget=None, learning_curve=False, dataset_id=None):
+    """Select, fit and evaluate the best model for ``target``.
+
+    ``progress(stage, **info)`` is called as training advances (stage is
+    one of split, cv, fit, save, evaluate; cv also passes model and
+    fold) and may raise ``TrainingCancelled`` to abort the run.
+    ``threads`` is the core budget (default ``TRAIN_THREADS``).
+    ``selection`` is "full" (5-fold CV for every candidate) or "adaptive"
+    (successive halving with boosting early stopping).
+
+    With ``tune_seconds`` > 0 the best ``TUNING_CANDIDATES`` candidates
+    are then tuned with Optuna for at most that long (or ``tune_trials``
+    trials). Studies named by ``study_name`` are resumed on the next run
+    unless ``resume`` is false.
+
+    Selection and tuning see at most ``row_budget`` training rows (default
+    ``SELECTION_ROW_BUDGET``, 0 for no limit), drawn stratified for
+    classification; only the final fit uses every row. ``learning_curve``
+    also scores the candidates on 1/4 and 1/2 of that sample to show
+    whether their ranking has settled.
+
+    The fitted pipeline is stored in the model registry together with
+    ``cleaner`` and is identified by ``model_id`` in the result.
+    """
+
+    start = time.perf_counter()
+
+    if target not in df.columns:
+        raise Exception("Invalid target column")
+
+    if selection not in SELECTION_MODES:
+        raise ValueError(f"selection must be one of {', '.join(SELECTION_MODES)}")
+
+    X = df.drop(columns=[target])
+    y = df[target]
+
+    _report(progress, "split")
+
+    problem_type = detect_problem_type(y)
+
+    if problem_type == "regression":
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, random_state=42
+        )
+    else:
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, stratify=y, random_state=42
+        )
+
+    preprocessor = build_preprocessor(X)
+    models = get_models(problem_type)
+
+    # Candidates are compared on a bounded sample; the winner is refit on
+    # all of X_train below
+    X_sel, y_sel = selection_sample(X_train, y_train, problem_type, row_budget)
+    folds = FoldCache(preprocessor, X_sel, y_sel)
+
+    cv_errors = {}
+
+    if selection == "adaptive":
+        scores, cv_seconds, cv_cpu_seconds, rungs, rounds, finalists = successive_halving(
+            models, preprocessor, X_sel, y_sel, problem_type, progress, threads,
+            folds=folds, errors=cv_errors,
+        )
+        selection_info = {"mode": selection, "rungs": rungs}
+    else:
+        scores, cv_seconds, cv_cpu_seconds = compare_models(
+            models, preprocessor, X_sel, y_sel, problem_type, progress, threads,
+            folds=folds, errors=cv_errors,
+        )
+        finalists, rounds = list(scores), {}
+        selection_info = {"mode": selection}
+
+    selection_info["rows"] = len(X_sel)
+    selection_info["train_rows"] = len(X_train)
+
+    if learning_curve:
+        cv, scoring = _cv(problem_type)
+        selection_info["learning_curve"] = ranking_stability(
+            {name: models[name] for name in finalists}, folds,
+            list(cv.split(X_sel, y_sel)), scoring, scores, threads, progress,
+        )
+
+    best_model_name = max(finalists, key=scores.get)
+    # The final fit is alone, so it gets the whole budget
+    best_model = with_threads(models[best_model_name], thread_budget(1, threads)[1])
+
+    # -----------------------------------
+    # Hyperparameter tuning (optional)
+    # -----------------------------------
+    tuning_info = None
+    if tune_seconds > 0:
+        # optuna is only imported when tuning is asked for
+        from services.tuning import tune
+
+        ranked = sorted(
+            (name for name in finalists if scores[name] != -999), key=scores.get, reverse=True
+        )[:TUNING_CANDIDATES]
+        cv, scoring = _cv(problem_type)
+        splits = list(cv.split(X_sel, y_sel))
+
+        # Trials are scored on full CV of the selection sample. Adaptive
+        # rung scores may come from fewer rows and folds, so the incumbent
+        # (as it would be refit) is scored on the same folds first.
+        incumbent_score = scores[best_model_name]
+        last_rung = selection_info.get("rungs", [{}])[-1]
+        if selection == "adaptive" and (
+            last_rung.get("rows") != len(X_sel) or last_rung.get("folds") != len(splits)
+            or best_model_name not in last_rung.get("models", ())
+        ):
+            incumbent = models[best_model_name]
+            if rounds.get(best_model_name):
+                incumbent = clone(incumbent).set_params(
+                    n_estimators=int(np.median(rounds[best_model_name]))
+                )
+            fold_scores, _, _, _ = _run_grid(
+                {best_model_name: incumbent}, folds, splits, scoring, threads, progress,
+                incumbent=True,
+            )
+            incumbent_score = _mean_scores(fold_scores)[best_model_name]
+
+        _report(progress, "tune", trials=0)
+        tuning_info = tune(
+            {name: models[name] for name in ranked}, folds, splits,
+            scoring, tune_seconds, n_trials=tune_trials, study_name=study_name,
+            resume=resume, threads=threads, progress=progress,
+        )
+
+        # Tuned settings replace the defaults only if they scored better
+        # on the same folds
+        tuning_info["incumbent_score"] = incumbent_score
+        tuning_info["improved"] = (
+            tuning_info["best_model"] is not None
+            and tuning_info["best_score"] > incumbent_score
+        )
+        if tuning_info["improved"]:
+            best_model_name = tuning_info["best_model"]
+            best_model = with_threads(
+                clone(models[best_model_name]).set_params(**tuning_info["best_params"]),
+                thread_budget(1, threads)[1],
+            )
+            rounds = {}
+
+    if rounds.get(best_model_name):
+        # Refit boosters with the tree count early stopping settled on
+        n_estimators = int(np.median(rounds[best_model_name]))
+        best_model.set_params(n_estimators=n_estimators)
+        selection_info["n_estimators"] = n_estimators
+
+    pipeline = Pipeline([
+        ("preprocessor", preprocessor),
+        ("model", best_model)
+    ])
+
+    _report(progress, "fit", model=best_model_name)
+    pipeline.fit(X_train, y_train)
+
+    # Save feature metadata for SHAP
+    pipeline.feature_names_ = X.columns.tolist()
+    pipeline.target_name_ = target
+
+    # The cleaner is stored with the model, so new rows can be scored
+    # with cleaner.transform() followed by pipeline.predict()
+    _report(progress, "save", model=best_model_name)
+    registered = ModelRegistry().register(
+        pipeline, cleaner,
+        holdout=X_test.head(HOLDOUT_ROWS),
+        dataset_id=dataset_id,
+        target=target,
+        problem_type=problem_type,
+        best_model=best_model_name,
+        scores=scores,
+        training_seconds=time.perf_counter() - start,
+        features=feature_schema(X),
+    )
+
+    _report(progress, "evaluate", model=best_model_name)
+    y_pred = pipeline.predict(X_test)
+
+    return {
+        "model_id": registered["model_id"],
+        "problem_type": problem_type,
+        "best_model": best_model_name,
+        "scores": scores,
+        "cv_seconds": cv_seconds,
+        "cv_cpu_seconds": cv_cpu_seconds,
+        "cv_errors": cv_errors,
+        "selection": selection_info,
+        "tuning": tuning_info,
+        "metrics": evaluation_metrics(
+            problem_type, y_test, y_pred, lambda: pipeline.predict_proba(X_test)[:, 1]
+        ),
+    }
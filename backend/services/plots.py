@@ -0,0 +1,462 @@
+import io
+import json
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+# Rendering processes; matplotlib holds the GIL while rasterizing, so
+# figures are drawn outside the API process.
+PLOT_WORKERS = int(os.environ.get("AUTOML_PLOT_WORKERS", 2))
+
+# Scatter plots of more rows are thinned to this many points, keeping
+# sparse regions and outliers (density-aware sampling)
+SCATTER_MAX_POINTS = int(os.environ.get("AUTOML_SCATTER_POINTS", 5000))
+SCATTER_GRID = 64
+
+# PNG bytes cached per dataset; clients choose the image size, so the
+# least recently requested images are dropped beyond this
+PLOT_CACHE_BYTES = int(os.environ.get("AUTOML_PLOT_CACHE_BYTES", 64 * 1024 ** 2))
+
+HIST_BINS = 30
+MAX_BARS = 50
+MAX_FLIERS = 1000
+MAX_PIXELS = 2000
+DPI = 100
+
+# Default figure sizes in pixels
+SIZES = {
+    "distribution": (800, 400),
+    "box": (600, 600),
+    "scatter": (800, 500),
+}
+
+
+# -----------------------------------
+# Summaries (API process, vectorized)
+# -----------------------------------
+# Only these small summaries cross to the rendering processes, never the
+# column itself.
+def _is_dates(values):
+    dtype = getattr(values, "dtype", None)
+    return pd.api.types.is_datetime64_any_dtype(dtype) or pd.api.types.is_timedelta64_dtype(dtype)
+
+
+def _is_plottable(values):
+    dtype = getattr(values, "dtype", np.asarray(values).dtype)
+    return pd.api.types.is_numeric_dtype(dtype) or _is_dates(values)
+
+
+def _numbers(values):
+    # Dates become seconds since the epoch (durations seconds), NaT NaN
+    if _is_dates(values):
+        values = pd.Series(values)
+        if pd.api.types.is_timedelta64_dtype(values.dtype):
+            return (values / pd.Timedelta(seconds=1)).to_numpy(np.float64)
+        zero = pd.Timestamp(0, tz=values.dt.tz)
+        return ((values - zero) / pd.Timedelta(seconds=1)).to_numpy(np.float64)
+    if not _is_plottable(values):
+        raise TypeError(f"{getattr(values, 'name', 'column')} is not numeric or a date")
+    return np.asarray(values, dtype=np.float64)
+
+
+def _finite(values):
+    values = _numbers(values)
+    return values[np.isfinite(values)]
+
+
+def histogram_summary(values, bins=HIST_BINS):
+    if not _is_plottable(values):
+        return count_summary(values)
+    dates = _is_dates(values)
+    values = _finite(values)
+    counts, edges = np.histogram(values, bins=bins)
+    return {"edges": edges, "counts": counts, "n": len(values), "dates": [dates]}
+
+
+def count_summary(values, max_bars=MAX_BARS):
+    """Counts of the ``max_bars`` most frequent values of a categorical
+    or text column (the histogram of a non-numeric column)."""
+    counts = pd.Series(values).value_counts()
+    return {
+        "categories": [str(c) for c in counts.index[:max_bars]],
+        "counts": counts.to_numpy(np.int64)[:max_bars],
+        "n": int(counts.sum()),
+        "n_categories": len(counts),
+    }
+
+
+def box_summary(values, max_fliers=MAX_FLIERS):
+    """Five-number summary with 1.5 IQR whiskers; at most ``max_fliers``
+    outliers, evenly spaced over the sorted outliers (extremes kept)."""
+    if not _is_plottable(values):
+        raise TypeError("box plots need a numeric or date column")
+    dates = [_is_dates(values)]
+    values = _finite(values)
+    if len(values) == 0:
+        return {"min": np.nan, "q1": np.nan, "med": np.nan, "q3": np.nan, "max": np.nan,
+                "whislo": np.nan, "whishi": np.nan, "mean": np.nan,
+                "fliers": np.empty(0), "n": 0, "n_fliers": 0, "dates": dates}
+
+    q1, med, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    lo, hi = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+    inside = (values >= lo) & (values <= hi)
+
+    fliers = np.sort(values[~inside])
+    n_fliers = len(fliers)
+    if n_fliers > max_fliers:
+        fliers = fliers[np.linspace(0, n_fliers - 1, max_fliers).round().astype(np.int64)]
+
+    return {
+        "min": values.min(), "q1": q1, "med": med, "q3": q3, "max": values.max(),
+        "whislo": values[inside].min(), "whishi": values[inside].max(),
+        "mean": values.mean(),
+        "fliers": fliers,
+        "n": len(values),
+        "n_fliers": n_fliers,
+        "dates": dates,
+    }
+
+
+def scatter_summary(x, y, max_points=SCATTER_MAX_POINTS, grid=SCATTER_GRID, seed=0):
+    """Points to draw plus a ``grid`` x ``grid`` count of all points.
+
+    Above ``max_points`` rows, each point is kept with weight inversely
+    proportional to the population of its grid cell, so sparse regions
+    and outliers survive while dense clusters are thinned.
+    """
+    if not (_is_plottable(x) and _is_plottable(y)):
+        raise TypeError("scatter plots need numeric or date columns")
+    dates = [_is_dates(x), _is_dates(y)]
+    x = _numbers(x)
+    y = _numbers(y)
+    ok = np.isfinite(x) & np.isfinite(y)
+    x, y = x[ok], y[ok]
+
+    if len(x) == 0:
+        return {"x": x, "y": y, "counts": np.zeros((grid, grid), dtype=np.int64),
+                "x_edges": np.zeros(grid + 1), "y_edges": np.zeros(grid + 1), "n": 0, "dates": dates}
+
+    counts, x_edges, y_edges = np.histogram2d(x, y, bins=grid)
+    counts = counts.astype(np.int64)
+
+    keep = np.arange(len(x))
+    if len(x) > max_points:
+        ix = np.clip(np.searchsorted(x_edges, x, side="right") - 1, 0, grid - 1)
+        iy = np.clip(np.searchsorted(y_edges, y, side="right") - 1, 0, grid - 1)
+        weight = 1.0 / counts[ix, iy]
+        rng = np.random.default_rng(seed)
+        keep = np.sort(rng.choice(len(x), size=max_points, replace=False, p=weight / weight.sum()))
+
+    return {"x": x[keep], "y": y[keep], "counts": counts,
+            "x_edges": x_edges, "y_edges": y_edges, "n": len(x), "dates": dates}
+
+
+# -----------------------------------
+# Rendering (worker processes)
+# -----------------------------------
+def _warm_up():
+    # Import pyplot once per worker and draw a throwaway figure, so the
+    # first real request does not pay for font and backend setup
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots()
+    ax.plot([0, 1])
+    fig.savefig(io.BytesIO(), format="png")
+    plt.close(fig)
+
+
+def _style(fig, ax):
+    ax.set_facecolor('#0f0f2a')
+    fig.patch.set_facecolor('#0a0a1a')
+    ax.tick_params(colors='#a0a0c0')
+    ax.spines[['bottom', 'left', 'top', 'right']].set_color('#2d2d4e')
+
+
+def _days(seconds, dates):
+    # Matplotlib's date axes count days since the epoch
+    return np.asarray(seconds) / 86400 if dates else seconds
+
+
+def _render(kind, summary, labels, size):
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(size[0] / DPI, size[1] / DPI), dpi=DPI)
+    dates = summary.get("dates", [False, False])
+
+    if kind == "distribution" and "categories" in summary:
+        column = labels[0]
+        ax.bar(summary["categories"], summary["counts"], color='#7c3aed', edgecolor='white', alpha=0.85)
+        ax.tick_params(axis='x', labelrotation=90)
+        ax.set_title(f"Distribution of {column}", fontsize=14, fontweight='bold')
+        ax.set_xlabel(column)
+        ax.set_ylabel("Frequency")
+
+    elif kind == "distribution":
+        column = labels[0]
+        edges = _days(summary["edges"], dates[0])
+        ax.hist(edges[:-1], bins=edges, weights=summary["counts"],
+                color='#7c3aed', edgecolor='white', alpha=0.85)
+        if dates[0]:
+            ax.xaxis_date()
+        ax.set_title(f"Distribution of {column}", fontsize=14, fontweight='bold')
+        ax.set_xlabel(column)
+        ax.set_ylabel("Frequency")
+
+    elif kind == "box":
+        column = labels[0]
+        stats = {
+            key: _days(summary[key], dates[0])
+            for key in ("q1", "med", "q3", "whislo", "whishi", "mean", "fliers")
+        }
+        bp = ax.bxp([stats], patch_artist=True, showmeans=False)
+        if dates[0]:
+            ax.yaxis_date()
+        for patch in bp['boxes']:
+            patch.set_facecolor('#7c3aed')
+            patch.set_alpha(0.7)
+        ax.set_title(f"Boxplot of {column}", fontsize=14, fontweight='bold')
+
+    else:
+        from matplotlib.colors import LogNorm
+
+        col1, col2 = labels
+        sampled = len(summary["x"]) < summary["n"]
+        if sampled:
+            # Sampling flattens density; the grid of all rows restores it
+            counts = np.ma.masked_equal(summary["counts"].T, 0)
+            ax.pcolormesh(_days(summary["x_edges"], dates[0]), _days(summary["y_edges"], dates[1]), counts,
+                          cmap='magma', norm=LogNorm(), alpha=0.8)
+        ax.scatter(_days(summary["x"], dates[0]), _days(summary["y"], dates[1]), color='#06b6d4',
+                   alpha=0.3 if sampled else 0.6, edgecolors='#7c3aed', linewidths=0.5,
+                   s=12 if sampled else 30)
+        if dates[0]:
+            ax.xaxis_date()
+        if dates[1]:
+            ax.yaxis_date()
+        ax.set_xlabel(col1, color='#a0a0c0')
+        ax.set_ylabel(col2, color='#a0a0c0')
+        title = f"{col1} vs {col2}"
+        if sampled:
+            title += f" ({len(summary['x']):,} of {summary['n']:,} points)"
+        ax.set_title(title, fontsize=14, fontweight='bold', color='white')
+
+    _style(fig, ax)
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight")
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+class PlotRenderer:
+    """Pool of pre-warmed Agg processes that turn summaries into PNGs.
+
+    Request threads only compute summaries and wait on a future, so a
+    slow rasterization never blocks other requests on the GIL.
+    """
+
+    def __init__(self, workers=PLOT_WORKERS):
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Spawn and warm up the workers in the background; called at app
+        startup (and on first use otherwise)."""
+        with self._lock:
+            if self._executor is None:
+                context = multiprocessing.get_context("spawn")
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=context, initializer=_warm_up,
+                )
+                # Workers are spawned on demand; one no-op each starts them all
+                for _ in range(self.workers):
+                    self._executor.submit(int)
+        return self._executor
+
+    def render(self, kind, summary, labels, size):
+        return self.start().submit(_render, kind, summary, labels, size).result()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+
+# -----------------------------------
+# Summaries as data (format=data / format=arrow)
+# -----------------------------------
+def _number(value, exact=False):
+    # Six significant digits are plenty on screen and halve the payload;
+    # dates (seconds since the epoch) need all of theirs
+    value = float(value)
+    if not np.isfinite(value):
+        return None
+    return value if exact else float(f"{value:.6g}")
+
+
+def _floats(values, exact=False):
+    return [_number(v, exact) for v in values]
+
+
+def plot_data(kind, summary, columns):
+    """A summary as JSON-ready lists and numbers."""
+    data = {"kind": kind, "columns": list(columns), "n": int(summary["n"])}
+    dates = summary.get("dates", [False, False])
+    if any(dates):
+        # Which axes hold dates, as seconds since the epoch
+        data["dates"] = summary["dates"]
+
+    if kind == "distribution" and "categories" in summary:
+        data["categories"] = summary["categories"]
+        data["counts"] = summary["counts"].tolist()
+        data["n_categories"] = int(summary["n_categories"])
+
+    elif kind == "distribution":
+        data["edges"] = _floats(summary["edges"], dates[0])
+        data["counts"] = summary["counts"].tolist()
+
+    elif kind == "box":
+        for key, name in [("min", "min"), ("q1", "q1"), ("med", "median"), ("q3", "q3"),
+                          ("max", "max"), ("whislo", "whisker_low"),
+                          ("whishi", "whisker_high"), ("mean", "mean")]:
+            data[name] = _number(summary[key], dates[0])
+        data["outliers"] = _floats(summary["fliers"], dates[0])
+        data["n_outliers"] = int(summary["n_fliers"])
+
+    else:
+        data["x"] = _floats(summary["x"], dates[0])
+        data["y"] = _floats(summary["y"], dates[1])
+        data["grid"] = {
+            "x_edges": _floats(summary["x_edges"], dates[0]),
+            "y_edges": _floats(summary["y_edges"], dates[1]),
+            "counts": summary["counts"].tolist(),
+        }
+
+    return data
+
+
+ARROW_COLUMNS = {
+    "distribution": lambda s: (
+        {"category": s["categories"], "count": s["counts"]} if "categories" in s
+        else {"bin_start": s["edges"][:-1], "bin_end": s["edges"][1:], "count": s["counts"]}
+    ),
+    "box": lambda s: {"outlier": s["fliers"]},
+    # float32 points, except date axes (float32 seconds are ~2 minutes apart)
+    "scatter": lambda s: {
+        axis: s[axis] if dates else s[axis].astype(np.float32)
+        for axis, dates in zip("xy", s.get("dates", [False, False]))
+    },
+}
+
+
+def plot_arrow(kind, summary, columns):
+    """A summary as an Arrow IPC stream: the per-bin / per-point arrays
+    as columns, everything else as JSON under the ``plot`` schema key."""
+    table_columns = ARROW_COLUMNS[kind](summary)
+    meta = {
+        key: value for key, value in plot_data(kind, summary, columns).items()
+        if key not in ("edges", "counts", "categories", "outliers", "x", "y")
+    }
+    table = pa.table(table_columns, metadata={"plot": json.dumps(meta)})
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+# -----------------------------------
+# Per-dataset PNG cache
+# -----------------------------------
+SUMMARIES = {
+    "distribution": lambda df, cols: histogram_summary(df[cols[0]]),
+    "box": lambda df, cols: box_summary(df[cols[0]]),
+    "scatter": lambda df, cols: scatter_summary(df[cols[0]], df[cols[1]]),
+}
+
+_locks_guard = threading.Lock()
+
+
+def plot_size(kind, width=None, height=None):
+    default_w, default_h = SIZES[kind]
+    return (
+        int(np.clip(width or default_w, 100, MAX_PIXELS)),
+        int(np.clip(height or default_h, 100, MAX_PIXELS)),
+    )
+
+
+def summary(entry, kind, columns, df, approx=False):
+    """The plot summary of ``columns``, cached in the dataset entry."""
+    key = ("plot_summary", kind, tuple(columns), approx)
+    if key not in entry.artifacts:
+        entry.artifacts[key] = SUMMARIES[kind](df, columns)
+    return entry.artifacts[key]
+
+
+def payload(entry, kind, columns, df, format, approx=False):
+    """A plot summary encoded as JSON (``format="data"``) or Arrow bytes,
+    cached in the dataset entry like the PNGs."""
+    key = ("plot_" + format, kind, tuple(columns), approx)
+    if key not in entry.artifacts:
+        data = summary(entry, kind, columns, df, approx)
+        entry.artifacts[key] = (
+            plot_arrow(kind, data, columns) if format == "arrow"
+            else json.dumps(plot_data(kind, data, columns)).encode()
+        )
+    return entry.artifacts[key]
+
+
+def _remember(entry, key, image):
+    # LRU over the entry's PNGs, at most PLOT_CACHE_BYTES (the newest is
+    # always kept)
+    with _locks_guard:
+        index = entry.artifacts.setdefault("plot_index", OrderedDict())
+        index[key] = len(image)
+        index.move_to_end(key)
+
+        total = sum(index.values())
+        while total > PLOT_CACHE_BYTES and len(index) > 1:
+            oldest, nbytes = index.popitem(last=False)
+            entry.artifacts.pop(oldest, None)
+            total -= nbytes
+
+
+def png(entry, renderer, kind, columns, df, size, approx=False):
+    """PNG bytes of a plot, cached per (dataset, kind, columns, size).
+
+    The dataset ID is the content hash, and an entry's artifacts are
+    dropped whenever its data changes or it is evicted, so cached
+    images never go stale. At most ``PLOT_CACHE_BYTES`` of images are
+    kept per dataset.
+    """
+    key = ("plot", kind, tuple(columns), size, approx)
+    image = entry.artifacts.get(key)
+    if image is not None:
+        _remember(entry, key, image)
+        return image
+
+    # Concurrent requests for the same plot render it once (one lock for
+    # all sizes, so locks do not pile up with the sizes requested)
+    with _locks_guard:
+        lock = entry.artifacts.setdefault(("plot_lock", kind, tuple(columns), approx), threading.Lock())
+
+    with lock:
+        image = entry.artifacts.get(key)
+        if image is None:
+            image = renderer.render(kind, summary(entry, kind, columns, df, approx), list(columns), size)
+            entry.artifacts[key] = image
+        _remember(entry, key, image)
+
+    return image
@@ -0,0 +1,170 @@
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import joblib
+import pandas as pd
+
+from services import storage
+
+
+# Trained pipelines live here, named by the SHA-256 of their pickled bytes:
+#   <model_id>.pkl          the fitted preprocessor/model Pipeline
+#   <model_id>.cleaner.pkl  the DataCleaner of the training data, if any
+#   <model_id>.holdout.parquet
+#                           held-out input rows, to check exports against
+#   <model_id>.json         metadata; written last, so a model is listed
+#                           only once its artifacts are complete
+#   <model_id>.<suffix>     optional exports (e.g. compiled.npz)
+MODEL_DIR = os.path.join(storage.CACHE_DIR, "models")
+
+# Unpickled pipelines kept in memory per API process
+MAX_LOADED_MODELS = int(os.environ.get("AUTOML_MAX_LOADED_MODELS", 4))
+
+# Test rows stored with a model for checking its exports
+HOLDOUT_ROWS = 500
+
+_MODEL_ID_RE = re.compile(r"[0-9a-f]{64}")
+
+
+def feature_schema(df):
+    """Column names and dtypes a model expects as input."""
+    return [{"name": str(col), "dtype": str(dtype)} for col, dtype in df.dtypes.items()]
+
+
+class LoadedModel:
+    """A registered pipeline, its cleaner and metadata, unpickled, plus
+    anything derived from them (e.g. a SHAP explainer)."""
+
+    def __init__(self, meta, pipeline, cleaner=None):
+        self.meta = meta
+        self.model_id = meta["model_id"]
+        self.pipeline = pipeline
+        self.cleaner = cleaner
+        self.artifacts = {}
+
+
+class ModelRegistry:
+    """Content-addressed store of trained models with an LRU of loaded ones.
+
+    Every artifact is written atomically, so concurrent trainings never
+    see or produce a half-written file, and a model ID always refers to
+    the same bytes. Training processes register models through their own
+    instance; the API process keeps one whose cache serves repeated
+    lookups without unpickling again.
+    """
+
+    def __init__(self, root=MODEL_DIR, max_loaded=MAX_LOADED_MODELS):
+        self.root = root
+        self.max_loaded = max_loaded
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, model_id, suffix):
+        if not _MODEL_ID_RE.fullmatch(model_id or ""):
+            return None
+        return os.path.join(self.root, f"{model_id}.{suffix}")
+
+    def register(self, pipeline, cleaner=None, holdout=None, **meta):
+        """Store a fitted pipeline; ``meta`` (dataset_id, target, scores, ...)
+        is saved alongside, and so is ``holdout``, a frame of test rows as
+        the pipeline's input. Returns the metadata including ``model_id``."""
+        buffer = io.BytesIO()
+        joblib.dump(pipeline, buffer)
+        data = buffer.getvalue()
+        model_id = hashlib.sha256(data).hexdigest()
+
+        meta = {**meta, "model_id": model_id, "created": time.time(), "bytes": len(data)}
+
+        storage._atomic_write(self._path(model_id, "pkl"), lambda sink: sink.write(data))
+        if cleaner is not None:
+            storage._atomic_write(
+                self._path(model_id, "cleaner.pkl"), lambda sink: joblib.dump(cleaner, sink)
+            )
+        if holdout is not None:
+            storage._atomic_write(
+                self._path(model_id, "holdout.parquet"),
+                lambda sink: holdout.reset_index(drop=True).to_parquet(sink),
+            )
+        storage._atomic_write(
+            self._path(model_id, "json"),
+            lambda sink: sink.write(json.dumps(meta, default=str).encode()),
+        )
+        return meta
+
+    def metadata(self, model_id):
+        path = self._path(model_id, "json")
+        if path is None or not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def list(self, dataset_id=None, target=None):
+        """Metadata of registered models, newest first."""
+        if not os.path.isdir(self.root):
+            return []
+
+        models = []
+        for name in os.listdir(self.root):
+            if not name.endswith(".json"):
+                continue
+            meta = self.metadata(name[:-len(".json")])
+            if meta is None:
+                continue
+            if dataset_id is not None and meta.get("dataset_id") != dataset_id:
+                continue
+            if target is not None and meta.get("target") != target:
+                continue
+            models.append(meta)
+
+        return sorted(models, key=lambda m: m["created"], reverse=True)
+
+    def latest(self, dataset_id=None, target=None):
+        models = self.list(dataset_id, target)
+        return models[0] if models else None
+
+    def artifact_path(self, model_id, suffix="pkl"):
+        path = self._path(model_id, suffix)
+        return path if path is not None and os.path.exists(path) else None
+
+    def holdout(self, model_id):
+        """The held-out rows stored with the model, or None."""
+        path = self.artifact_path(model_id, "holdout.parquet")
+        return pd.read_parquet(path) if path is not None else None
+
+    def add_artifact(self, model_id, suffix, data):
+        """Atomically store an extra file (bytes) for a registered model,
+        e.g. an export; returns its path."""
+        path = self._path(model_id, suffix)
+        storage._atomic_write(path, lambda sink: sink.write(data))
+        return path
+
+    def load(self, model_id):
+        """The registered model as a LoadedModel, or None if unknown."""
+        with self._lock:
+            loaded = self._loaded.get(model_id)
+            if loaded is not None:
+                self._loaded.move_to_end(model_id)
+                return loaded
+
+        meta = self.metadata(model_id)
+        if meta is None:
+            return None
+
+        cleaner_path = self._path(model_id, "cleaner.pkl")
+        loaded = LoadedModel(
+            meta,
+            joblib.load(self._path(model_id, "pkl")),
+            joblib.load(cleaner_path) if os.path.exists(cleaner_path) else None,
+        )
+
+        with self._lock:
+            self._loaded[model_id] = loaded
+            while len(self._loaded) > self.max_loaded:
+                self._loaded.popitem(last=False)
+        return loaded
@@ -0,0 +1,16 @@
+# Column type selection shared by cleaning, EDA and modelling.
+#
+# Ingestion downcasts numerics (float32, int8/16/32) and stores
+# low-cardinality text as category, so selecting on exact dtype names such
+# as "int64"/"object" would silently skip those columns.
+
+NUMERIC_DTYPES = "number"
+CATEGORICAL_DTYPES = ["object", "string", "category"]
+
+
+def numeric_columns(df):
+    return df.select_dtypes(include=NUMERIC_DTYPES).columns
+
+
+def categorical_columns(df):
+    return df.select_dtypes(include=CATEGORICAL_DTYPES).columns
@@ -0,0 +1,312 @@
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from services.registry import MAX_LOADED_MODELS
+
+
+# Most rows scored in one micro-batch, and how long the first request of a
+# batch waits for others to join it
+MAX_BATCH_ROWS = int(os.environ.get("AUTOML_PREDICT_BATCH_ROWS", 1024))
+BATCH_WAIT_SECONDS = float(os.environ.get("AUTOML_PREDICT_WAIT_MS", 2)) / 1000
+
+# Requests per model whose latency is kept for the percentiles
+LATENCY_WINDOW = 10_000
+
+# Rows per chunk when scoring an uploaded file
+PREDICT_CHUNK_ROWS = 50_000
+
+
+# -----------------------------------
+# Scoring a frame
+# -----------------------------------
+def _cast(df, features):
+    # JSON and CSV input carries no dtypes; give columns the training ones
+    df = df.copy()
+    for feature in features:
+        col, dtype = feature["name"], feature["dtype"]
+        if col not in df.columns:
+            continue
+        if dtype.startswith(("int", "uint", "float", "Int", "UInt", "Float")):
+            values = pd.to_numeric(df[col], errors="coerce")
+            # Back to the training dtype (e.g. float32 after ingest), so the
+            # pipeline computes in the same precision it was fitted in;
+            # integer columns with gaps stay float for the imputer
+            if dtype.startswith("float"):
+                values = values.astype(dtype)
+            elif dtype.startswith(("int", "uint")) and values.notna().all():
+                info = np.iinfo(dtype)
+                values = values.clip(info.min, info.max).astype(dtype)
+            df[col] = values
+        elif dtype.startswith("datetime"):
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+        elif dtype == "bool":
+            df[col] = df[col].astype(bool)
+        else:
+            df[col] = df[col].astype(object).where(df[col].notna())
+    return df
+
+
+def prepare_frame(model, df):
+    """Raw rows as the pipeline's input.
+
+    The rows go through the training data's cleaner (imputation, clipping,
+    date parsing) and are aligned to the model's input columns, so
+    missing columns are imputed and unknown ones ignored.
+    """
+    df = _cast(df, model.meta.get("features", []))
+    if model.cleaner is not None:
+        df = model.cleaner.transform(df)
+    return df.reindex(columns=model.pipeline.feature_names_)
+
+
+def predict_frame(model, df):
+    """Score raw rows with a LoadedModel (see prepare_frame). Returns
+    ``predictions`` and, for classifiers, ``probabilities`` and ``classes``.
+    """
+    pipeline = model.pipeline
+    X = prepare_frame(model, df)
+
+    result = {"predictions": np.asarray(pipeline.predict(X))}
+    if model.meta.get("problem_type") != "regression" and hasattr(pipeline, "predict_proba"):
+        result["probabilities"] = np.asarray(pipeline.predict_proba(X))
+        result["classes"] = list(pipeline.classes_)
+    return result
+
+
+def _rows(result, start, stop):
+    return {
+        key: value[start:stop] if isinstance(value, np.ndarray) else value
+        for key, value in result.items()
+    }
+
+
+# -----------------------------------
+# Micro-batching
+# -----------------------------------
+def _score(model, batch):
+    # batch: [(frame, future)]; one vectorized call for all frames
+    try:
+        result = predict_frame(model, pd.concat([df for df, _ in batch], ignore_index=True))
+    except Exception as e:
+        if len(batch) == 1:
+            batch[0][1].set_exception(e)
+            return
+        # One bad request must not fail the others: score them alone
+        for item in batch:
+            _score(model, [item])
+        return
+
+    start = 0
+    for df, future in batch:
+        future.set_result(_rows(result, start, start + len(df)))
+        start += len(df)
+
+
+class MicroBatcher:
+    """Coalesces concurrent scoring requests for one model.
+
+    Request threads enqueue their rows and wait on a future. A single
+    worker thread takes the first waiting request, collects whatever else
+    arrives within ``wait`` seconds (up to ``max_rows`` rows), scores the
+    concatenation with one vectorized call and hands each request its
+    slice. At low load a request waits at most ``wait``; under load the
+    batches grow and per-row cost falls.
+    """
+
+    def __init__(self, model, max_rows=MAX_BATCH_ROWS, wait=BATCH_WAIT_SECONDS):
+        self.model = model
+        self.max_rows = max_rows
+        self.wait = wait
+        self.batch_sizes = deque(maxlen=LATENCY_WINDOW)
+        self._queue = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, df):
+        future = Future()
+        with self._lock:
+            if not self._closed:
+                self._queue.put((df, future))
+                return future
+
+        # Evicted while the caller held it: score inline instead
+        _score(self.model, [(df, future)])
+        return future
+
+    def close(self):
+        # Requests queued before the sentinel are still answered
+        with self._lock:
+            self._closed = True
+            self._queue.put(None)
+
+    def _collect(self, first):
+        batch, rows = [first], len(first[0])
+        deadline = time.perf_counter() + self.wait
+        while rows < self.max_rows:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Closing: finish this batch, then stop
+                self._queue.put(None)
+                break
+            batch.append(item)
+            rows += len(item[0])
+        return batch
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            batch = self._collect(first)
+            self.batch_sizes.append(len(batch))
+            _score(self.model, batch)
+
+
+# -----------------------------------
+# Latency tracking
+# -----------------------------------
+class LatencyStats:
+    """Sliding window of request latencies (seconds)."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.count = 0
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.count += 1
+            self._latencies.append(seconds)
+
+    def summary(self):
+        with self._lock:
+            latencies = np.array(self._latencies)
+        if len(latencies) == 0:
+            return {"requests": self.count}
+
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        return {
+            "requests": self.count,
+            "p50_ms": float(p50),
+            "p99_ms": float(p99),
+            "max_ms": float(latencies.max() * 1000),
+            "window": len(latencies),
+        }
+
+
+# -----------------------------------
+# Prediction service (API process)
+# -----------------------------------
+class PredictionService:
+    """Keeps one MicroBatcher per recently used model and their latencies.
+
+    The batcher holds the unpickled pipeline, so a model stays in memory
+    for as long as it is among the last ``max_models`` used; only a model
+    without a batcher is loaded from ``registry``.
+    """
+
+    def __init__(self, registry, max_models=MAX_LOADED_MODELS):
+        self.registry = registry
+        self.max_models = max_models
+        self._batchers = OrderedDict()
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _batcher(self, model_id):
+        with self._lock:
+            batcher = self._batchers.get(model_id)
+            if batcher is not None:
+                self._batchers.move_to_end(model_id)
+                return batcher
+
+        model = self.registry.load(model_id)
+        if model is None:
+            return None
+
+        with self._lock:
+            batcher = self._batchers.get(model_id)
+            if batcher is None:
+                batcher = self._batchers[model_id] = MicroBatcher(model)
+                self._stats.setdefault(model_id, LatencyStats())
+
+            while len(self._batchers) > self.max_models:
+                _, evicted = self._batchers.popitem(last=False)
+                evicted.close()
+        return batcher
+
+    def model(self, model_id):
+        """The LoadedModel behind ``model_id``, or None if unknown."""
+        batcher = self._batcher(model_id)
+        return None if batcher is None else batcher.model
+
+    def predict(self, model_id, df):
+        """Score ``df`` through the model's micro-batcher; None if unknown."""
+        start = time.perf_counter()
+        batcher = self._batcher(model_id)
+        if batcher is None:
+            return None
+
+        result = batcher.submit(df).result()
+        self._stats[model_id].record(time.perf_counter() - start)
+        return result
+
+    def stats(self):
+        with self._lock:
+            batchers = dict(self._batchers)
+            stats = dict(self._stats)
+
+        summary = {}
+        for model_id, latency in stats.items():
+            summary[model_id] = latency.summary()
+            batcher = batchers.get(model_id)
+            if batcher is not None and batcher.batch_sizes:
+                summary[model_id]["mean_batch_requests"] = float(np.mean(batcher.batch_sizes))
+        return summary
+
+    def shutdown(self):
+        with self._lock:
+            for batcher in self._batchers.values():
+                batcher.close()
+            self._batchers.clear()
+
+
+# -----------------------------------
+# Batch scoring
+# -----------------------------------
+def read_chunks(fileobj, filename, rows=PREDICT_CHUNK_ROWS):
+    """Yield an uploaded CSV or Parquet file as DataFrame chunks."""
+    if filename.endswith(".parquet"):
+        for batch in pq.ParquetFile(fileobj).iter_batches(batch_size=rows):
+            yield batch.to_pandas()
+        return
+
+    yield from pd.read_csv(fileobj, chunksize=rows)
+
+
+def score_chunks(model, chunks):
+    """Score chunks one by one, yielding CSV text (header first).
+
+    Columns are ``prediction`` and, for classifiers, one
+    ``proba_<class>`` column per class; rows keep the input order.
+    """
+    for i, chunk in enumerate(chunks):
+        result = predict_frame(model, chunk)
+        out = pd.DataFrame({"prediction": result["predictions"]})
+        for j, cls in enumerate(result.get("classes", [])):
+            out[f"proba_{cls}"] = result["probabilities"][:, j]
+        yield out.to_csv(index=False, header=i == 0)
@@ -0,0 +1,355 @@
+import numpy as np
+import pandas as pd
+
+
+# Defaults: ~1% rank error for quantiles, ~0.8% relative error for
+# distinct counts, 20k sampled rows for histograms/scatter/correlation.
+KLL_K = 400
+HLL_P = 14
+SAMPLE_ROWS = 20_000
+
+
+# -----------------------------------
+# Quantiles: KLL
+# -----------------------------------
+def kll_rank_error(k):
+    # Normalized rank error at ~99% confidence (DataSketches' fit for KLL)
+    return 2.296 / k ** 0.9723
+
+
+class KLLSketch:
+    """Mergeable quantile sketch (Karnin, Lang & Liberty).
+
+    Items live in levels; an item at level h stands for 2**h inputs. A
+    level over capacity is sorted and every other item (random offset)
+    is promoted, so whole NumPy chunks are absorbed with a few sorts.
+    """
+
+    def __init__(self, k=KLL_K, c=2 / 3, seed=None):
+        self.k = k
+        self.c = c
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, h):
+        depth = len(self.levels) - 1 - h
+        return max(2, int(np.ceil(self.k * self.c ** depth)))
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            if len(self.levels[h]) > self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+
+                items = np.sort(self.levels[h])
+                # An odd item out stays behind so total weight stays exact
+                keep = items[len(items) - len(items) % 2:]
+                items = items[:len(items) - len(items) % 2]
+
+                promoted = items[self._rng.integers(2)::2]
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+                self.levels[h] = keep
+            h += 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], items])
+
+        self.n += other.n
+        self._compress()
+        return self
+
+    def quantiles(self, q):
+        q = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        if self.n == 0:
+            return np.full(len(q), np.nan)
+
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([
+            np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)
+        ])
+        order = np.argsort(items, kind="stable")
+        cumulative = np.cumsum(weights[order])
+
+        idx = np.searchsorted(cumulative, q * cumulative[-1], side="left")
+        return items[order][np.clip(idx, 0, len(items) - 1)]
+
+    def rank_error(self):
+        return kll_rank_error(self.k)
+
+
+# -----------------------------------
+# Distinct counts: HyperLogLog
+# -----------------------------------
+def _hash_values(values):
+    series = pd.Series(values).dropna()
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        # int and float chunks of the same column must hash alike
+        series = series.astype(np.float64)
+    return pd.util.hash_pandas_object(series, index=False).to_numpy()
+
+
+class HyperLogLog:
+    """Mergeable distinct-count sketch with 2**p one-byte registers."""
+
+    def __init__(self, p=HLL_P):
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def update(self, values):
+        h = _hash_values(values)
+        if len(h) == 0:
+            return self
+
+        p = np.uint64(self.p)
+        idx = (h >> (np.uint64(64) - p)).astype(np.int64)
+
+        # Position of the first set bit in the remaining 64 - p bits; the
+        # guard bit caps it at 64 - p + 1
+        w = (h << p) | (np.uint64(1) << (p - np.uint64(1)))
+        _, exponent = np.frexp(w.astype(np.float64))
+        rho = np.clip(65 - exponent, 1, 64 - self.p + 1).astype(np.uint8)
+
+        np.maximum.at(self.registers, idx, rho)
+        return self
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros > 0:
+            # Small-range correction (linear counting)
+            estimate = m * np.log(m / zeros)
+
+        return float(estimate)
+
+    def relative_error(self):
+        return 1.04 / np.sqrt(self.m)
+
+
+# -----------------------------------
+# Uniform row sample: bottom-k reservoir
+# -----------------------------------
+class ReservoirSample:
+    """Uniform sample of up to ``size`` rows, mergeable across chunks.
+
+    Every row gets a random key and the rows with the smallest keys are
+    kept; the union of two such samples, cut back to ``size``, is again a
+    uniform sample of the combined input.
+    """
+
+    def __init__(self, size=SAMPLE_ROWS, seed=None):
+        self.size = size
+        self.keys = np.empty(0)
+        self.rows = None
+        self._rng = np.random.default_rng(seed)
+
+    def _combine(self, keys, rows):
+        n_old = len(self.keys)
+        all_keys = np.concatenate([self.keys, keys])
+        keep = np.arange(len(all_keys))
+        if len(all_keys) > self.size:
+            keep = np.argpartition(all_keys, self.size)[:self.size]
+
+        old, new = keep[keep < n_old], keep[keep >= n_old] - n_old
+        parts = [rows.iloc[new]]
+        if self.rows is not None:
+            parts.insert(0, self.rows.iloc[old])
+
+        self.keys = np.concatenate([self.keys[old], keys[new]])
+        self.rows = pd.concat(parts, ignore_index=True)
+        return self
+
+    def update(self, frame):
+        return self._combine(self._rng.random(len(frame)), frame)
+
+    def merge(self, other):
+        if other.rows is None:
+            return self
+        return self._combine(other.keys, other.rows)
+
+
+# -----------------------------------
+# Whole-dataset sketch
+# -----------------------------------
+class DatasetSketch:
+    """Per-column sketches built chunk by chunk.
+
+    Exact: row and null counts, min/max, mean/variance (merged with Chan's
+    parallel formulas). Approximate: quantiles (KLL), distinct counts
+    (HyperLogLog) and a uniform sample of the numeric columns.
+    """
+
+    def __init__(self, k=KLL_K, p=HLL_P, sample_rows=SAMPLE_ROWS, seed=42):
+        self.k = k
+        self.p = p
+        self.rows = 0
+        self.null_counts = None
+        self.min = None
+        self.max = None
+        self.moments = {}
+        self.quantile_sketches = {}
+        self.distinct = {}
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self._seeds = seed
+        self.sample = ReservoirSample(sample_rows, seed=self._next_seed())
+
+    def _next_seed(self):
+        return self._seeds.spawn(1)[0]
+
+    def spawn(self):
+        """An empty sketch with the same settings and independent randomness,
+        e.g. for one chunk that is merged back afterwards."""
+        return DatasetSketch(self.k, self.p, self.sample.size, seed=self._next_seed())
+
+    def update(self, chunk):
+        self.rows += len(chunk)
+
+        nulls = chunk.isna().sum()
+        self.null_counts = nulls if self.null_counts is None else self.null_counts.add(nulls, fill_value=0)
+
+        for col in chunk.columns:
+            if col not in self.distinct:
+                self.distinct[col] = HyperLogLog(self.p)
+            self.distinct[col].update(chunk[col])
+
+        numeric = chunk.select_dtypes(include="number")
+        if numeric.shape[1] == 0:
+            return self
+
+        chunk_min, chunk_max = numeric.min(), numeric.max()
+        if self.min is None:
+            self.min, self.max = chunk_min, chunk_max
+        else:
+            self.min = pd.concat([self.min, chunk_min], axis=1).min(axis=1)
+            self.max = pd.concat([self.max, chunk_max], axis=1).max(axis=1)
+
+        count = numeric.count()
+        mean = numeric.mean()
+        m2 = numeric.var(ddof=0) * count
+        for col in numeric.columns:
+            self._merge_moments(col, (count[col], mean[col], m2[col]))
+
+            if col not in self.quantile_sketches:
+                self.quantile_sketches[col] = KLLSketch(self.k, seed=self._next_seed())
+            self.quantile_sketches[col].update(numeric[col].to_numpy())
+
+        self.sample.update(numeric.astype(np.float32))
+        return self
+
+    def _merge_moments(self, col, moments):
+        n_b, mean_b, m2_b = moments
+        if n_b == 0 or np.isnan(mean_b):
+            return
+        if col not in self.moments:
+            self.moments[col] = (n_b, mean_b, m2_b)
+            return
+
+        n_a, mean_a, m2_a = self.moments[col]
+        n = n_a + n_b
+        delta = mean_b - mean_a
+        self.moments[col] = (
+            n,
+            mean_a + delta * n_b / n,
+            m2_a + m2_b + delta * delta * n_a * n_b / n,
+        )
+
+    def merge(self, other):
+        self.rows += other.rows
+
+        if other.null_counts is not None:
+            self.null_counts = other.null_counts if self.null_counts is None else self.null_counts.add(other.null_counts, fill_value=0)
+        if other.min is not None:
+            self.min = other.min if self.min is None else pd.concat([self.min, other.min], axis=1).min(axis=1)
+            self.max = other.max if self.max is None else pd.concat([self.max, other.max], axis=1).max(axis=1)
+
+        for col, moments in other.moments.items():
+            self._merge_moments(col, moments)
+        for col, sketch in other.quantile_sketches.items():
+            if col in self.quantile_sketches:
+                self.quantile_sketches[col].merge(sketch)
+            else:
+                self.quantile_sketches[col] = sketch
+        for col, sketch in other.distinct.items():
+            if col in self.distinct:
+                self.distinct[col].merge(sketch)
+            else:
+                self.distinct[col] = sketch
+
+        self.sample.merge(other.sample)
+        return self
+
+    def rename(self, mapping):
+        for attr in ("null_counts", "min", "max"):
+            value = getattr(self, attr)
+            if value is not None:
+                setattr(self, attr, value.rename(index=mapping))
+        for attr in ("moments", "quantile_sketches", "distinct"):
+            value = getattr(self, attr)
+            setattr(self, attr, {mapping.get(k, k): v for k, v in value.items()})
+        if self.sample.rows is not None:
+            self.sample.rows = self.sample.rows.rename(columns=mapping)
+
+    # -----------------------------------
+    # Estimates
+    # -----------------------------------
+    def quantiles(self, q):
+        """Approximate quantiles of the numeric columns (DataFrame, rows = q)."""
+        q = list(q)
+        return pd.DataFrame(
+            {col: sketch.quantiles(q) for col, sketch in self.quantile_sketches.items()},
+            index=q,
+        )
+
+    def mean(self, col):
+        return self.moments[col][1]
+
+    def std(self, col):
+        n, _, m2 = self.moments[col]
+        return np.sqrt(m2 / (n - 1)) if n > 1 else np.nan
+
+    def distinct_counts(self):
+        return {col: int(round(sketch.count())) for col, sketch in self.distinct.items()}
+
+    def error_bounds(self):
+        sample_rows = 0 if self.sample.rows is None else len(self.sample.rows)
+        return {
+            "quantile_rank_error": kll_rank_error(self.k),
+            "distinct_relative_error": float(1.04 / np.sqrt(1 << self.p)),
+            "sample_rows": sample_rows,
+            # Standard error of a sampled correlation near r = 0
+            "correlation_standard_error": float(1 / np.sqrt(max(sample_rows - 3, 1))),
+        }
+
+    def to_dict(self):
+        return {
+            "rows": int(self.rows),
+            "null_counts": {} if self.null_counts is None else {
+                k: int(v) for k, v in self.null_counts.items()
+            },
+            "min": {} if self.min is None else self.min.astype(float).to_dict(),
+            "max": {} if self.max is None else self.max.astype(float).to_dict(),
+        }
@@ -1,7 +1,28 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
 from scipy import stats
 import pandas as pd
 import numpy as np
 
+from services import storage
+
+
+# Processes testing the pairs stat_test_matrix cannot vectorize
+STAT_WORKERS = int(os.environ.get("AUTOML_STAT_WORKERS", min(os.cpu_count() or 1, 8)))
+
+# Categorical levels with fewer rows are pooled for the group tests (a
+# Shapiro test needs 3 values), and at most this many of the largest
+# groups are checked for normality
+MIN_GROUP_SIZE = 3
+MAX_NORMALITY_GROUPS = 20
+
+# Fewer remaining pairs than this are tested inline, since starting the
+# tasks would cost more than it saves
+MIN_POOL_PAIRS = 16
+
 
 def is_normal(series):
     """Check normality using Shapiro test (sample if too large)."""
@@ -11,10 +32,44 @@ def is_normal(series):
         sample = sample.sample(5000, random_state=42)
 
     stat, p = stats.shapiro(sample)
-    return p > 0.05
+    return bool(p > 0.05)
+
+
+def _is_categorical(series):
+    # Datetime and timedelta columns are neither numeric nor categorical
+    dtype = series.dtype
+    return (
+        dtype == "object"
+        or pd.api.types.is_string_dtype(dtype)
+        or isinstance(dtype, pd.CategoricalDtype)
+        or pd.api.types.is_bool_dtype(dtype)
+    )
+
 
+def column_normality(df, columns, cache=None):
+    """is_normal of whole numeric columns, memoized in ``cache`` (e.g. a
+    dataset's artifacts). Columns with missing values are skipped: a
+    pair test drops rows, so their sample depends on the other column."""
+    normality = {}
+    for col in columns:
+        if not pd.api.types.is_numeric_dtype(df[col]) or df[col].isna().any():
+            continue
 
-def auto_test(df, col1, col2):
+        key = ("normal", col)
+        if cache is not None and key in cache:
+            normality[col] = cache[key]
+            continue
+
+        normality[col] = is_normal(df[col])
+        if cache is not None:
+            cache[key] = normality[col]
+
+    return normality
+
+
+def auto_test(df, col1, col2, normality=None):
+    """Pick and run the test for two columns. ``normality`` (from
+    column_normality) replaces the Shapiro tests when no rows are dropped."""
 
     if col1 not in df.columns or col2 not in df.columns:
         raise Exception("Invalid column names")
@@ -29,8 +84,11 @@ def auto_test(df, col1, col2):
     # -----------------------------------
     if pd.api.types.is_numeric_dtype(x) and pd.api.types.is_numeric_dtype(y):
 
-        normal_x = is_normal(x)
-        normal_y = is_normal(y)
+        if normality is not None and len(data) == len(df) and col1 in normality and col2 in normality:
+            normal_x, normal_y = normality[col1], normality[col2]
+        else:
+            normal_x = is_normal(x)
+            normal_y = is_normal(y)
 
         if normal_x and normal_y:
             stat, p = stats.pearsonr(x, y)
@@ -50,7 +108,7 @@ def auto_test(df, col1, col2):
     # -----------------------------------
     # Case 2: Categorical vs Categorical
     # -----------------------------------
-    if x.dtype == "object" and y.dtype == "object":
+    if _is_categorical(x) and _is_categorical(y):
 
         table = pd.crosstab(x, y)
 
@@ -73,48 +131,280 @@ def auto_test(df, col1, col2):
     if not pd.api.types.is_numeric_dtype(x):
         x, y = y, x
 
-    groups = [group.dropna() for _, group in pd.DataFrame({
-        "num": x,
-        "cat": y
-    }).groupby("cat")["num"]]
+    if not pd.api.types.is_numeric_dtype(x) or not _is_categorical(y):
+        raise Exception("Unsupported column types for a statistical test")
+
+    values = x.to_numpy(np.float64)
+    codes, k, pooled = group_codes(y)
+    values, codes = values[codes >= 0], codes[codes >= 0]
 
-    if len(groups) < 2:
+    if k < 2:
         raise Exception("Not enough groups for comparison")
 
+    counts = np.bincount(codes, minlength=k)
+    normal = groups_normal(values, codes, counts)
+    extra = {"groups": k, **({"pooled_levels": pooled} if pooled else {})}
+
     # Binary group → t-test or Mann-Whitney
-    if len(groups) == 2:
+    if k == 2:
 
-        normal = all(is_normal(g) for g in groups)
+        first, second = values[codes == 0], values[codes == 1]
 
         if normal:
-            stat, p = stats.ttest_ind(groups[0], groups[1])
+            stat, p = stats.ttest_ind(first, second)
             return {
                 "test": "Independent T-Test",
                 "stat": float(stat),
-                "p": float(p)
+                "p": float(p),
+                **extra
             }
         else:
-            stat, p = stats.mannwhitneyu(groups[0], groups[1])
+            stat, p = stats.mannwhitneyu(first, second)
             return {
                 "test": "Mann-Whitney U",
                 "stat": float(stat),
-                "p": float(p)
+                "p": float(p),
+                **extra
             }
 
     # More than 2 groups → ANOVA or Kruskal
-    normal = all(is_normal(g) for g in groups)
-
     if normal:
-        stat, p = stats.f_oneway(*groups)
+        stat, p = one_way_anova(values, codes, counts)
         return {
             "test": "ANOVA",
             "stat": float(stat),
-            "p": float(p)
+            "p": float(p),
+            **extra
         }
     else:
-        stat, p = stats.kruskal(*groups)
+        stat, p = kruskal_wallis(values, codes, counts)
         return {
             "test": "Kruskal-Wallis",
             "stat": float(stat),
-            "p": float(p)
-        }
\ No newline at end of file
+            "p": float(p),
+            **extra
+        }
+
+
+# -----------------------------------
+# Group tests on factorized codes
+# -----------------------------------
+def group_codes(labels, min_size=MIN_GROUP_SIZE):
+    """Group codes 0..k-1 in sorted label order, like groupby.
+
+    Levels with fewer than ``min_size`` rows are pooled into one last
+    group, or get code -1 if even the pool is that small. Returns
+    (codes, k, number of pooled levels).
+    """
+    codes, uniques = pd.factorize(labels, sort=True)
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    small = counts < min_size
+    if not small.any():
+        return codes, len(uniques), 0
+
+    remap = np.full(len(uniques) + 1, -1)
+    k = int((~small).sum())
+    remap[:-1][~small] = np.arange(k)
+    if counts[small].sum() >= min_size:
+        remap[:-1][small] = k
+        k += 1
+    return remap[codes], k, int(small.sum())
+
+
+def groups_normal(values, codes, counts, max_groups=MAX_NORMALITY_GROUPS):
+    """is_normal on the ``max_groups`` largest groups, stopping at the
+    first that is not; with many levels the rest add little but time."""
+    for group in np.argsort(-counts, kind="stable")[:max_groups]:
+        if not is_normal(pd.Series(values[codes == group])):
+            return False
+    return True
+
+
+def one_way_anova(values, codes, counts):
+    """f_oneway from per-group sums (np.bincount)."""
+    n, k = len(values), len(counts)
+    means = np.bincount(codes, values, minlength=k) / counts
+    between = np.sum(counts * (means - values.mean()) ** 2)
+    within = np.sum((values - means[codes]) ** 2)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        stat = (between / (k - 1)) / (within / (n - k))
+    return stat, stats.f.sf(stat, k - 1, n - k)
+
+
+def kruskal_wallis(values, codes, counts):
+    """kruskal from per-group rank sums (np.bincount), tie-corrected."""
+    n, k = len(values), len(counts)
+    ranks = stats.rankdata(values)
+    rank_sums = np.bincount(codes, ranks, minlength=k)
+    stat = 12 / (n * (n + 1)) * np.sum(rank_sums ** 2 / counts) - 3 * (n + 1)
+
+    _, ties = np.unique(values, return_counts=True)
+    correction = 1 - np.sum(ties ** 3 - ties) / (n ** 3 - n)
+    if correction == 0:
+        raise ValueError("All numbers are identical in kruskal")
+
+    stat /= correction
+    return stat, stats.chi2.sf(stat, k - 1)
+
+
+# -----------------------------------
+# All-pairs test matrix
+# -----------------------------------
+def _correlation_p(r, n):
+    # Two-sided p-value of a Pearson/Spearman coefficient (t with n-2 dof),
+    # as scipy computes it
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = r * np.sqrt((n - 2) / ((1 - r) * (1 + r)))
+    return 2 * stats.t.sf(np.abs(t), n - 2)
+
+
+def _number(value):
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+def _correlation_tests(df, pairs, normality):
+    """Pearson/Spearman for numeric pairs without missing values, from one
+    correlation matrix of the values and one of their ranks."""
+    columns = sorted({col for pair in pairs for col in pair})
+    index = {col: i for i, col in enumerate(columns)}
+    values = df[columns].to_numpy(np.float64)
+    n = len(values)
+
+    pearson = [pair for pair in pairs if normality[pair[0]] and normality[pair[1]]]
+    matrices = {}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if pearson:
+            matrices["Pearson Correlation"] = np.corrcoef(values, rowvar=False)
+        if len(pearson) < len(pairs):
+            matrices["Spearman Correlation"] = np.corrcoef(stats.rankdata(values, axis=0), rowvar=False)
+
+    results = {}
+    for col1, col2 in pairs:
+        test = "Pearson Correlation" if normality[col1] and normality[col2] else "Spearman Correlation"
+        r = matrices[test][index[col1], index[col2]]
+        results[col1, col2] = {"test": test, "stat": _number(r), "p": _number(_correlation_p(r, n))}
+    return results
+
+
+def _chi_square_tests(df, pairs):
+    """Chi-square tests with contingency tables counted from factorized
+    codes; each column is factorized once."""
+    codes = {}
+    for col in {col for pair in pairs for col in pair}:
+        code, uniques = pd.factorize(df[col])
+        codes[col] = (code, len(uniques))
+
+    results = {}
+    for col1, col2 in pairs:
+        (a, ka), (b, kb) = codes[col1], codes[col2]
+        both = (a >= 0) & (b >= 0)
+        table = np.bincount(a[both] * kb + b[both], minlength=ka * kb).reshape(ka, kb)
+        # Like crosstab, only levels that occur with the other column
+        table = table[table.any(axis=1)][:, table.any(axis=0)]
+
+        if table.size == 0:
+            results[col1, col2] = {"error": "Not enough data for Chi-Square"}
+            continue
+
+        stat, p, dof, _ = stats.chi2_contingency(table)
+        results[col1, col2] = {"test": "Chi-Square Test", "stat": _number(stat), "p": _number(p), "dof": int(dof)}
+    return results
+
+
+def _test_pairs(dataset_id, df, pairs, normality):
+    """auto_test for each pair (runs in a pool process). Cached datasets
+    are memory-mapped here instead of being pickled across."""
+    if df is None:
+        df = storage.load_frame(dataset_id)
+
+    results = {}
+    for col1, col2 in pairs:
+        try:
+            result = auto_test(df, col1, col2, normality)
+            results[col1, col2] = {key: _number(v) if key in ("stat", "p") else v for key, v in result.items()}
+        except Exception as e:
+            results[col1, col2] = {"error": str(e)}
+    return results
+
+
+class StatTestPool:
+    """Process pool for the pairs stat_test_matrix cannot vectorize."""
+
+    def __init__(self, workers=STAT_WORKERS):
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def executor(self):
+        # Lazily, so importing the app does not spawn anything
+        with self._lock:
+            if self._executor is None:
+                context = multiprocessing.get_context("spawn")
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=context)
+        return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+
+def stat_test_matrix(df, columns=None, cache=None, pool=None, dataset_id=None):
+    """auto_test for every pair of ``columns`` (default: all), batched.
+
+    - numeric pairs without missing values: Shapiro once per column
+      (memoized in ``cache``), then Pearson/Spearman for all pairs from
+      one correlation matrix of the values or of the ranks
+    - categorical pairs: contingency tables from factorized codes
+    - the rest (numeric vs categorical, numeric with missing values):
+      auto_test, spread over ``pool`` when there are enough of them. With
+      ``dataset_id`` of a cached dataset, workers memory-map it.
+
+    Returns one result per pair, in column order; a pair that cannot be
+    tested has an ``error`` instead of ``test``/``stat``/``p``.
+    """
+    columns = list(df.columns if columns is None else columns)
+    pairs = [(a, b) for i, a in enumerate(columns) for b in columns[i + 1:]]
+
+    numeric = {col for col in columns if pd.api.types.is_numeric_dtype(df[col])}
+    normality = column_normality(df, numeric, cache) if len(df) >= 3 else {}
+
+    correlated = [pair for pair in pairs if pair[0] in normality and pair[1] in normality]
+    # As in auto_test, numeric pairs come first: bool columns are both
+    # numeric and categorical, and two of them are correlated
+    labels = {col for col in columns if _is_categorical(df[col])}
+    categorical = [
+        pair for pair in pairs
+        if pair[0] in labels and pair[1] in labels and not (pair[0] in numeric and pair[1] in numeric)
+    ]
+    batched = set(correlated) | set(categorical)
+    rest = [pair for pair in pairs if pair not in batched]
+
+    results = {}
+    if correlated:
+        results.update(_correlation_tests(df, correlated, normality))
+    if categorical:
+        results.update(_chi_square_tests(df, categorical))
+
+    if pool is not None and pool.workers > 1 and len(rest) >= MIN_POOL_PAIRS:
+        executor = pool.executor()
+        tasks = max(1, min(len(rest), pool.workers * 4))
+        futures = []
+        for chunk in np.array_split(np.arange(len(rest)), tasks):
+            chunk_pairs = [rest[i] for i in chunk]
+            frame = None
+            if dataset_id is None:
+                frame = df[sorted({col for pair in chunk_pairs for col in pair})]
+            futures.append(executor.submit(_test_pairs, dataset_id, frame, chunk_pairs, normality))
+        for future in futures:
+            results.update(future.result())
+    elif rest:
+        results.update(_test_pairs(None, df, rest, normality))
+
+    return {
+        "columns": columns,
+        "tests": [{"col1": a, "col2": b, **results[a, b]} for a, b in pairs],
+    }
@@ -0,0 +1,107 @@
+import hashlib
+import os
+import re
+import tempfile
+
+import joblib
+import pyarrow as pa
+
+
+# Cleaned datasets are written here as uncompressed Arrow IPC files named by
+# the content hash of the uploaded bytes, so any worker can memory-map them.
+CACHE_DIR = os.environ.get("AUTOML_CACHE_DIR", "cache")
+
+# Part of the hash: bump whenever cleaning changes so stale frames are not
+# served for files uploaded before the change.
+CLEANING_VERSION = "3"
+
+_DIGEST_RE = re.compile(r"[0-9a-f]{64}")
+
+
+def file_digest(fileobj, block_size=1 << 20):
+    """SHA-256 of a file-like object, read in blocks; rewinds it afterwards."""
+    h = hashlib.sha256(CLEANING_VERSION.encode())
+
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(block_size), b""):
+        h.update(block)
+    fileobj.seek(0)
+
+    return h.hexdigest()
+
+
+def cache_path(digest, suffix="arrow"):
+    if not _DIGEST_RE.fullmatch(digest or ""):
+        return None
+    return os.path.join(CACHE_DIR, f"{digest}.{suffix}")
+
+
+def _atomic_write(path, write):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as sink:
+            write(sink)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def save_frame(digest, df):
+    """Atomically write a cleaned frame to the cache. Returns the path or None."""
+    path = cache_path(digest)
+    if path is None:
+        return None
+
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        # Mixed-type object columns cannot be stored; keep the dataset in memory only
+        return None
+
+    def write(sink):
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    _atomic_write(path, write)
+    return path
+
+
+def load_table(digest):
+    """Memory-map a cached dataset as an Arrow table, or None if not cached."""
+    path = cache_path(digest)
+    if path is None or not os.path.exists(path):
+        return None
+
+    # The table's buffers point straight into the mapping; it stays open for
+    # as long as they are referenced.
+    source = pa.memory_map(path, "r")
+    return pa.ipc.open_file(source).read_all()
+
+
+def load_frame(digest):
+    """Load a cached dataset as a DataFrame, or None if not cached.
+
+    split_blocks keeps one block per column so numeric columns without
+    nulls are zero-copy views of the memory-mapped file.
+    """
+    table = load_table(digest)
+    if table is None:
+        return None
+    return table.to_pandas(split_blocks=True)
+
+
+def save_cleaner(digest, cleaner):
+    """Store the fitted DataCleaner next to its cached frame."""
+    path = cache_path(digest, "cleaner.pkl")
+    if path is not None:
+        _atomic_write(path, lambda sink: joblib.dump(cleaner, sink))
+    return path
+
+
+def load_cleaner(digest):
+    path = cache_path(digest, "cleaner.pkl")
+    if path is None or not os.path.exists(path):
+        return None
+    return joblib.load(path)
@@ -0,0 +1,277 @@
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import time
+import warnings
+
+import joblib
+import numpy as np
+import optuna
+from optuna.storages import RDBStorage
+from optuna.trial import TrialState
+from sklearn.base import clone
+from sklearn.metrics import get_scorer
+from threadpoolctl import threadpool_limits
+
+from services import storage
+from services.model import with_threads, thread_budget, _report, MAX_TUNING_SECONDS, FoldCache
+
+
+# One SQLite file per study next to the dataset cache; a study is resumed
+# whenever the same dataset, target and candidates are tuned again on the
+# same CV folds (row budget and split config are part of the name).
+# SQLite rather than a journal file: workers are killed at the deadline,
+# and SQLite rolls back a half-written transaction where a journal's
+# file lock would be left behind.
+STUDY_DIR = os.path.join(storage.CACHE_DIR, "studies")
+
+# Trial processes per study (each gets an equal share of the thread budget)
+TUNING_WORKERS = int(os.environ.get("AUTOML_TUNING_WORKERS", 4))
+
+# "median" or "hyperband"; both prune on the running mean of fold scores
+TUNING_PRUNER = os.environ.get("AUTOML_TUNING_PRUNER", "median")
+
+# Running trials write a heartbeat this often; a RUNNING trial whose last
+# heartbeat is older than the grace period belongs to a dead worker
+HEARTBEAT_SECONDS = 5
+HEARTBEAT_GRACE_SECONDS = 30
+
+optuna.logging.set_verbosity(optuna.logging.WARNING)
+# Heartbeats have been "experimental" since optuna 2.9
+warnings.filterwarnings("ignore", category=optuna.exceptions.ExperimentalWarning)
+
+
+# -----------------------------------
+# Search spaces
+# -----------------------------------
+def suggest_params(trial, name):
+    """Hyperparameters for candidate ``name``; names are prefixed with it so
+    conditional spaces of different models never collide."""
+
+    def p(param):
+        return f"{name}.{param}"
+
+    if name == "LogisticRegression":
+        return {"C": trial.suggest_float(p("C"), 1e-3, 1e2, log=True)}
+
+    if name == "RandomForest":
+        return {
+            "n_estimators": trial.suggest_int(p("n_estimators"), 50, 400, log=True),
+            "max_depth": trial.suggest_int(p("max_depth"), 3, 32, log=True),
+            "min_samples_leaf": trial.suggest_int(p("min_samples_leaf"), 1, 20, log=True),
+            "max_features": trial.suggest_float(p("max_features"), 0.1, 1.0),
+        }
+
+    if name == "XGBoost":
+        return {
+            "n_estimators": trial.suggest_int(p("n_estimators"), 50, 600, log=True),
+            "max_depth": trial.suggest_int(p("max_depth"), 2, 10),
+            "learning_rate": trial.suggest_float(p("learning_rate"), 1e-2, 0.3, log=True),
+            "subsample": trial.suggest_float(p("subsample"), 0.5, 1.0),
+            "colsample_bytree": trial.suggest_float(p("colsample_bytree"), 0.5, 1.0),
+            "min_child_weight": trial.suggest_float(p("min_child_weight"), 1.0, 20.0, log=True),
+            "reg_lambda": trial.suggest_float(p("reg_lambda"), 1e-3, 10.0, log=True),
+        }
+
+    if name == "LightGBM":
+        return {
+            "n_estimators": trial.suggest_int(p("n_estimators"), 50, 600, log=True),
+            "num_leaves": trial.suggest_int(p("num_leaves"), 8, 256, log=True),
+            "learning_rate": trial.suggest_float(p("learning_rate"), 1e-2, 0.3, log=True),
+            "subsample": trial.suggest_float(p("subsample"), 0.5, 1.0),
+            "subsample_freq": 1,
+            "colsample_bytree": trial.suggest_float(p("colsample_bytree"), 0.5, 1.0),
+            "min_child_samples": trial.suggest_int(p("min_child_samples"), 5, 100, log=True),
+        }
+
+    return {}
+
+
+def trial_params(params, name):
+    """Estimator parameters of a finished trial's ``params``."""
+    prefix = f"{name}."
+    result = {k[len(prefix):]: v for k, v in params.items() if k.startswith(prefix)}
+    if name == "LightGBM" and "subsample" in result:
+        result["subsample_freq"] = 1
+    return result
+
+
+def _pruner(kind):
+    if kind == "hyperband":
+        return optuna.pruners.HyperbandPruner(min_resource=1, max_resource=5)
+    return optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=1)
+
+
+def _storage_url(study_name):
+    digest = hashlib.sha1(study_name.encode()).hexdigest()
+    os.makedirs(STUDY_DIR, exist_ok=True)
+    return f"sqlite:///{os.path.join(STUDY_DIR, digest)}.db"
+
+
+def _storage(url):
+    # Workers write concurrently; wait for SQLite's lock instead of failing
+    return RDBStorage(
+        url, engine_kwargs={"connect_args": {"timeout": 60}},
+        heartbeat_interval=HEARTBEAT_SECONDS, grace_period=HEARTBEAT_GRACE_SECONDS,
+    )
+
+
+def _folds_key(folds, splits, scoring):
+    # Scores are only comparable on the same rows, splits and metric
+    h = hashlib.sha1(f"{len(folds.X)}:{scoring}".encode())
+    for train, test in splits:
+        h.update(FoldCache.key(train, test).encode())
+    return h.hexdigest()[:12]
+
+
+# -----------------------------------
+# Trial workers (separate processes)
+# -----------------------------------
+def _objective(trial, candidates, folds, scoring, deadline, threads, run_id):
+    # Tags the trial so this run can fail it if its worker is terminated
+    trial.set_user_attr("run", run_id)
+    name = trial.suggest_categorical("model", sorted(candidates))
+    model = with_threads(clone(candidates[name]).set_params(**suggest_params(trial, name)), threads)
+
+    scores = []
+    for step, (Xt_train, y_train, Xt_test, y_test) in enumerate(folds):
+        if time.time() >= deadline:
+            # Out of time: stop between folds instead of being killed mid-fit
+            raise optuna.TrialPruned()
+
+        with threadpool_limits(limits=threads):
+            fitted = clone(model).fit(Xt_train, y_train)
+            scores.append(get_scorer(scoring)(fitted, Xt_test, y_test))
+
+        trial.report(float(np.mean(scores)), step)
+        if trial.should_prune():
+            raise optuna.TrialPruned()
+
+    return float(np.mean(scores))
+
+
+def _tune_worker(url, study_name, data_path, candidates, scoring, deadline,
+                 n_trials, threads, pruner, seed, run_id):
+    folds = joblib.load(data_path, mmap_mode="r")
+    study = optuna.load_study(
+        study_name=study_name,
+        storage=_storage(url),
+        sampler=optuna.samplers.TPESampler(seed=seed),
+        pruner=_pruner(pruner),
+    )
+    study.optimize(
+        lambda trial: _objective(trial, candidates, folds, scoring, deadline, threads, run_id),
+        timeout=max(deadline - time.time(), 0),
+        callbacks=[optuna.study.MaxTrialsCallback(
+            n_trials, states=(TrialState.COMPLETE, TrialState.PRUNED)
+        )],
+        catch=(ValueError, RuntimeError),
+    )
+
+
+# -----------------------------------
+# Tuning stage
+# -----------------------------------
+def tune(candidates, folds, splits, scoring, seconds, n_trials=100, study_name=None,
+         resume=True, threads=None, progress=None, pruner=TUNING_PRUNER):
+    """Search hyperparameters of ``candidates`` (name -> estimator) within
+    a strict wall-clock budget.
+
+    One Optuna study covers all candidates (the model is itself a
+    parameter). Trials run in ``TUNING_WORKERS`` processes sharing a
+    SQLite study, score the cached folds one at a time and report the
+    running mean so the pruner can stop weak trials after a fold or two.
+    ``n_trials`` counts finished trials, including those of earlier runs
+    when the study is resumed. The study name includes a digest of the
+    folds, so a study is only resumed on the rows and splits it was
+    scored on. Workers still busy at the deadline are terminated and
+    their trials marked failed, so this returns within ``seconds`` plus
+    process start-up. RUNNING trials of other runs are failed only once
+    their heartbeat has gone stale, so a concurrent run sharing the
+    study keeps its live trials.
+    """
+    start = time.time()
+    deadline = start + min(seconds, MAX_TUNING_SECONDS)
+    run_id = os.urandom(8).hex()
+
+    study_name = ":".join([
+        study_name or os.urandom(8).hex(), "+".join(sorted(candidates)),
+        _folds_key(folds, splits, scoring),
+    ])
+    url = _storage_url(study_name)
+    backend = _storage(url)
+    if not resume:
+        try:
+            optuna.delete_study(study_name=study_name, storage=backend)
+        except KeyError:
+            pass
+    study = optuna.create_study(
+        study_name=study_name, storage=backend, direction="maximize", load_if_exists=True,
+    )
+    # Trials left RUNNING by workers that died without a clean shutdown
+    optuna.storages.fail_stale_trials(study)
+
+    folds.prepare(splits, n_jobs=thread_budget(len(splits), threads)[0])
+
+    # Fold matrices are shared with the workers through a memory-mapped file
+    fd, data_path = tempfile.mkstemp(dir=STUDY_DIR, suffix=".folds")
+    os.close(fd)
+    joblib.dump([folds.get(train, test) for train, test in splits], data_path)
+
+    workers, per_worker = thread_budget(TUNING_WORKERS, threads)
+    context = multiprocessing.get_context("spawn")
+    procs = [
+        context.Process(
+            target=_tune_worker,
+            args=(url, study_name, data_path, candidates, scoring, deadline,
+                  n_trials, per_worker, pruner, seed, run_id),
+        )
+        for seed in range(workers)
+    ]
+
+    try:
+        for proc in procs:
+            proc.start()
+
+        while any(proc.is_alive() for proc in procs):
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            procs[0].join(timeout=min(1.0, remaining))
+            finished = study.get_trials(deepcopy=False, states=(TrialState.COMPLETE, TrialState.PRUNED))
+            _report(progress, "tune", trials=len(finished))
+    finally:
+        for proc in procs:
+            if proc.is_alive():
+                proc.terminate()
+        for proc in procs:
+            proc.join()
+        os.unlink(data_path)
+
+    # This run's workers are gone, so its trials cut off by the deadline
+    # would otherwise stay RUNNING until their heartbeat expires
+    for trial in study.get_trials(deepcopy=False, states=(TrialState.RUNNING,)):
+        if trial.user_attrs.get("run") == run_id:
+            backend.set_trial_state_values(trial._trial_id, TrialState.FAIL)
+
+    trials = study.get_trials(deepcopy=False)
+    complete = [t for t in trials if t.state == TrialState.COMPLETE]
+    summary = {
+        "seconds": time.time() - start,
+        "trials": len(complete),
+        "pruned": sum(t.state == TrialState.PRUNED for t in trials),
+        "resumed": any(t.datetime_start and t.datetime_start.timestamp() < start for t in trials),
+        "best_model": None,
+        "best_params": None,
+        "best_score": None,
+    }
+    if complete:
+        best = max(complete, key=lambda t: t.value)
+        name = best.params["model"]
+        summary.update(
+            best_model=name,
+            best_params=trial_params(best.params, name),
+            best_score=float(best.value),
+        )
+    return summary
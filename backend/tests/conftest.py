@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# Services read their configuration at import; keep caches out of the tree
+os.environ.setdefault("AUTOML_CACHE_DIR", tempfile.mkdtemp(prefix="automl-tests-"))
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,55 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from services.cleaning import DataCleaner
+
+
+def _raw(rows=400, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        " price ": rng.normal(100, 10, rows).astype(np.float32),
+        "count": rng.integers(0, 50, rows).astype(np.int16),
+        "city": rng.choice(["a", "b", "c"], rows).astype(object),
+        "day": pd.date_range("2024-01-01", periods=rows, freq="D").astype(str),
+        "constant": 1,
+        "sparse": np.where(rng.random(rows) < 0.8, np.nan, 1.0),
+    })
+    df.loc[::7, " price "] = np.nan
+    df.loc[::11, "city"] = None
+    df.loc[3, " price "] = 1e6
+    df.loc[5, "count"] = 30_000
+    return pd.concat([df, df.head(20)], ignore_index=True)
+
+
+def test_transform_repeats_fit_transform():
+    raw = _raw()
+    cleaner = DataCleaner()
+    cleaned = cleaner.fit_transform(raw.copy())
+
+    assert cleaner.dropped_columns_ == {"sparse": "missing", "constant": "constant"}
+    assert cleaner.date_columns_ == ["day"]
+    assert len(cleaned) == len(raw) - 20
+    assert cleaned.isna().sum().sum() == 0
+    assert cleaned["price"].max() < 1e6
+    assert cleaned["price"].dtype == np.float32
+    assert cleaned["count"].dtype == np.int16
+
+    again = cleaner.transform(raw.drop_duplicates()).reset_index(drop=True)
+    pd.testing.assert_frame_equal(again, cleaned)
+
+
+def test_pickled_cleaner_transforms_new_rows():
+    cleaner = DataCleaner()
+    cleaner.fit_transform(_raw())
+    restored = pickle.loads(pickle.dumps(cleaner))
+
+    new = _raw(50, seed=1).drop(columns=["sparse"])
+    new.loc[0, " price "] = np.nan
+    pd.testing.assert_frame_equal(restored.transform(new), cleaner.transform(new))
+
+    out = restored.transform(new)
+    assert list(out.columns) == cleaner.columns_
+    assert out.loc[0, "price"] == np.float32(cleaner.fill_values_["price"])
+    assert out["price"].between(cleaner.clip_lower_["price"], cleaner.clip_upper_["price"]).all()
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.pipeline import Pipeline
+
+from services.cleaning import DataCleaner
+from services.compiled import CompiledModel, compile_model
+from services.model import build_preprocessor, get_models
+from services.registry import LoadedModel, feature_schema
+from services.serving import predict_frame
+
+
+def _dataset(rows=1500, seed=0):
+    # float32/int8 columns as after ingest, and categoricals with more
+    # than 128 one-hot columns in total
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "x": rng.normal(size=rows).astype(np.float32),
+        "skew": rng.lognormal(size=rows).astype(np.float32),
+        "n": rng.integers(0, 100, rows).astype(np.int8),
+        "small": rng.choice([f"s{i}" for i in range(5)], rows),
+        "large": rng.choice([f"l{i}" for i in range(200)], rows),
+    })
+    df.loc[::13, "x"] = np.nan
+    df.loc[::17, "large"] = None
+    signal = df["x"].fillna(0) + np.log(df["skew"]) + df["n"] / 50 + df["large"].str.len().fillna(2) / 3
+    return df, signal.to_numpy()
+
+
+@pytest.mark.parametrize("problem_type", ["binary", "multiclass", "regression"])
+def test_compiled_predictions_match_pipeline(problem_type):
+    raw, signal = _dataset()
+    if problem_type == "binary":
+        raw["target"] = (signal > np.median(signal)).astype(int)
+    elif problem_type == "multiclass":
+        # String labels, which XGBoost only takes encoded
+        raw["target"] = pd.qcut(signal, 3, labels=["low", "mid", "high"]).astype(str)
+    else:
+        raw["target"] = signal
+
+    cleaner = DataCleaner()
+    clean = cleaner.fit_transform(raw)
+    X, y = clean.drop(columns="target"), clean["target"]
+    train, holdout = X.iloc[:1200], X.iloc[1200:]
+    features = feature_schema(X)
+
+    for name, model in get_models(problem_type).items():
+        pipeline = Pipeline([("preprocessor", build_preprocessor(X)), ("model", model)])
+        pipeline.fit(train, y.iloc[:1200])
+        pipeline.feature_names_ = list(X.columns)
+
+        width = pipeline.named_steps["preprocessor"].transform(holdout.head(1)).shape[1]
+        assert width > 128
+
+        compiled = CompiledModel(compile_model(pipeline, cleaner, problem_type, features, holdout=holdout))
+
+        # Fresh rows without dtypes, as the API receives them
+        rows = raw.drop(columns="target").iloc[1200:].astype(object)
+        expected = predict_frame(LoadedModel({"model_id": name, "features": features}, pipeline, cleaner), rows)
+        if problem_type == "regression":
+            np.testing.assert_allclose(compiled.predict(rows), expected["predictions"], rtol=1e-5, atol=1e-5)
+        else:
+            np.testing.assert_array_equal(compiled.predict(rows), expected["predictions"])
+            np.testing.assert_allclose(compiled.predict_proba(rows), expected["probabilities"], atol=1e-5)
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from services import eda
+from services.datasets import DatasetEntry
+
+
+@pytest.mark.parametrize("name", ["missing", "unique", "describe", "correlation", "histograms"])
+def test_approx_matches_exact_without_numeric_columns(name):
+    df = pd.DataFrame({"city": ["a", "b", None, "a"], "team": ["x", "x", "y", "y"]})
+    entry = DatasetEntry("text-only", df)
+
+    exact = eda.artifact(entry, name)
+    approx = eda.artifact(entry, name, approx=True)
+    if name == "unique":
+        assert approx.keys() == exact.keys()
+    else:
+        assert approx == exact
+
+
+def test_approx_eda_payloads_without_numeric_columns():
+    entry = DatasetEntry("text-only", pd.DataFrame({"city": ["a", "b", "c"]}))
+
+    assert eda.artifact(entry, "correlation", approx=True) == {}
+    assert eda.cached_basic_eda(entry, approx=True)["describe"] == {}
+    assert "approximate" in eda.cached_feature_analysis(entry, approx=True)
+
+
+def test_approx_correlation_close_to_exact():
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=5000)
+    df = pd.DataFrame({"x": x, "y": 2 * x + rng.normal(size=5000), "label": rng.choice(["p", "q"], 5000)})
+    entry = DatasetEntry("mixed", df)
+
+    exact = eda.artifact(entry, "correlation")
+    approx = eda.artifact(entry, "correlation", approx=True)
+    assert approx.keys() == exact.keys() == {"x", "y"}
+    assert approx["x"]["y"] == pytest.approx(exact["x"]["y"], abs=0.05)
@@ -0,0 +1,38 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from services.ingest import read_csv_chunked
+
+
+def _csv(rows):
+    return io.StringIO("\n".join(["id,city,score"] + [",".join(map(str, row)) for row in rows]))
+
+
+def test_category_column_empty_in_later_chunk():
+    # Sparse in the first chunk, empty in the second, numeric-looking in the third
+    rows = [(i, "a" if i % 3 else "", i * 0.5) for i in range(10)]
+    rows += [(i, "", i * 0.5) for i in range(10, 20)]
+    rows += [(i, i % 2, i * 0.5) for i in range(20, 30)]
+
+    df, _ = read_csv_chunked(_csv(rows), chunk_rows=10, sample_rows=10)
+
+    assert isinstance(df["city"].dtype, pd.CategoricalDtype)
+    assert len(df) == 30
+    assert df["city"].isna().sum() == 14
+    assert df["city"].iloc[20:].tolist() == ["0", "1"] * 5
+    assert set(df["city"].cat.categories) == {"a", "0", "1"}
+
+
+def test_chunks_match_single_read():
+    rng = np.random.default_rng(0)
+    rows = [(i, rng.choice(["x", "y", "z"]), round(float(rng.normal()), 3)) for i in range(50)]
+
+    chunked, _ = read_csv_chunked(_csv(rows), chunk_rows=7, sample_rows=7)
+    whole, _ = read_csv_chunked(_csv(rows))
+
+    pd.testing.assert_frame_equal(
+        chunked.astype({"city": object}), whole.astype({"city": object}), check_dtype=False,
+    )
+    assert chunked["score"].dtype == np.float32
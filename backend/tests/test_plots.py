@@ -0,0 +1,39 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from services import plots
+
+
+def test_categorical_distribution_counts_values():
+    column = pd.Series(["a", "b", "a", None, "c", "a"], name="city", dtype="category")
+    summary = plots.SUMMARIES["distribution"](column.to_frame(), ["city"])
+
+    data = plots.plot_data("distribution", summary, ["city"])
+    assert data["categories"] == ["a", "b", "c"]
+    assert data["counts"] == [3, 1, 1]
+    assert data["n"] == 5
+
+    table = pa.ipc.open_stream(plots.plot_arrow("distribution", summary, ["city"])).read_all()
+    assert table.column("category").to_pylist() == ["a", "b", "c"]
+    assert json.loads(table.schema.metadata[b"plot"])["n_categories"] == 3
+
+
+def test_dates_are_seconds_since_epoch():
+    when = pd.Series(pd.to_datetime(["2021-01-01", "2021-01-02", None]), name="when")
+    summary = plots.histogram_summary(when, bins=2)
+
+    data = plots.plot_data("distribution", summary, ["when"])
+    assert data["dates"] == [True]
+    assert data["edges"] == [1609459200.0, 1609502400.0, 1609545600.0]
+    assert data["n"] == 2
+
+
+@pytest.mark.parametrize("kind, columns", [("box", ["city"]), ("scatter", ["city", "x"])])
+def test_categorical_box_and_scatter_are_rejected(kind, columns):
+    df = pd.DataFrame({"city": ["a", "b", "c"], "x": np.arange(3.0)})
+    with pytest.raises(TypeError, match="numeric or date"):
+        plots.SUMMARIES[kind](df, columns)
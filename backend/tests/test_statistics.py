@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.statistics import auto_test, stat_test_matrix
+
+
+def _frame(rows=300, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.normal(size=rows)
+    df = pd.DataFrame({
+        "x": x,
+        "y": 0.5 * x + rng.normal(size=rows),
+        "skew": rng.lognormal(size=rows),
+        "gaps": rng.normal(size=rows),
+        "flag": x > 0,
+        "other_flag": rng.random(rows) > 0.5,
+        "group": rng.choice(["a", "b", "c"], rows).astype(object),
+        "pair": pd.Series(rng.choice(["p", "q"], rows), dtype="category"),
+        "text": pd.Series(rng.choice(["u", "v"], rows), dtype="str"),
+        "when": pd.date_range("2024-01-01", periods=rows, freq="D"),
+    })
+    df.loc[::9, "gaps"] = np.nan
+    df.loc[::11, "group"] = None
+    return df
+
+
+def _result(test):
+    return {key: value for key, value in test.items() if key not in ("col1", "col2")}
+
+
+def test_matrix_agrees_with_auto_test():
+    df = _frame()
+    matrix = stat_test_matrix(df, cache={})
+
+    for test in matrix["tests"]:
+        try:
+            expected = auto_test(df, test["col1"], test["col2"])
+        except Exception as e:
+            expected = {"error": str(e)}
+
+        got = _result(test)
+        assert got.keys() == expected.keys(), (test["col1"], test["col2"])
+        for key, value in expected.items():
+            if isinstance(value, float):
+                assert got[key] == pytest.approx(value, rel=1e-6, abs=1e-12, nan_ok=True), (test["col1"], test["col2"], key)
+            else:
+                assert got[key] == value, (test["col1"], test["col2"], key)
+
+
+def test_bool_pairs():
+    df = _frame()
+    tests = {(t["col1"], t["col2"]): t for t in stat_test_matrix(df, ["flag", "other_flag", "group"])["tests"]}
+
+    assert tests["flag", "other_flag"]["test"] in ("Pearson Correlation", "Spearman Correlation")
+    assert tests["flag", "group"]["test"] == "Chi-Square Test"
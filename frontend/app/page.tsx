@@ -171,16 +171,98 @@ function CorrelationHeatmap({ correlation }: { correlation: Record<string, Recor
   );
 }
 
+function BoxPlotSvg({ plot }: { plot: any }) {
+  if (plot.min === null) return <p style={{ color: "var(--text-muted)" }}>No numeric values</p>;
+  const span = plot.max - plot.min || 1;
+  const sx = (v: number) => 40 + ((v - plot.min) / span) * 520;
+  const ticks = [plot.min, plot.q1, plot.median, plot.q3, plot.max];
+  return (
+    <svg viewBox="0 0 600 140" style={{ width: "100%", maxHeight: 320 }}>
+      <line x1={sx(plot.whisker_low)} x2={sx(plot.whisker_high)} y1={60} y2={60} stroke="#a0a0c0" />
+      <line x1={sx(plot.whisker_low)} x2={sx(plot.whisker_low)} y1={45} y2={75} stroke="#a0a0c0" />
+      <line x1={sx(plot.whisker_high)} x2={sx(plot.whisker_high)} y1={45} y2={75} stroke="#a0a0c0" />
+      <rect x={sx(plot.q1)} y={35} width={Math.max(sx(plot.q3) - sx(plot.q1), 1)} height={50} fill="#7c3aed" fillOpacity={0.7} stroke="#7c3aed" />
+      <line x1={sx(plot.median)} x2={sx(plot.median)} y1={35} y2={85} stroke="#f97316" strokeWidth={2} />
+      {plot.outliers.map((v: number, i: number) => (
+        <circle key={i} cx={sx(v)} cy={60} r={3} fill="#06b6d4" fillOpacity={0.5} />
+      ))}
+      {ticks.map((v: number, i: number) => (
+        <text key={i} x={sx(v)} y={i % 2 ? 120 : 105} textAnchor="middle" fill="#a0a0c0" fontSize={10}>{Number(v.toPrecision(4))}</text>
+      ))}
+    </svg>
+  );
+}
+
+function PlotChart({ plot }: { plot: any }) {
+  if (!plot) return null;
+  const fmt = (v: number) => Number(v.toPrecision(3));
+  const tick = { fill: "#a0a0c0", fontSize: 11 };
+  const tooltip = { background: "#0f0f2a", border: "1px solid #7c3aed33", borderRadius: 8, color: "#f0f0ff" };
+  const [col1, col2] = plot.columns;
+
+  if (plot.kind === "box") {
+    return (
+      <>
+        <h3 style={{ fontSize: 14, fontWeight: 600, color: "var(--text-accent)", marginBottom: 16 }}>
+          Boxplot of {col1} {plot.n_outliers > plot.outliers.length && `(${plot.outliers.length.toLocaleString()} of ${plot.n_outliers.toLocaleString()} outliers shown)`}
+        </h3>
+        <BoxPlotSvg plot={plot} />
+      </>
+    );
+  }
+
+  if (plot.kind === "distribution") {
+    // Categorical columns come as counts per category; dates as epoch seconds
+    const edge = (v: number) => plot.dates?.[0] ? new Date(v * 1000).toISOString().slice(0, 10) : fmt(v);
+    const data = plot.counts.map((count: number, i: number) => ({
+      bin: plot.categories ? plot.categories[i] : `${edge(plot.edges[i])} – ${edge(plot.edges[i + 1])}`, count,
+    }));
+    return (
+      <>
+        <h3 style={{ fontSize: 14, fontWeight: 600, color: "var(--text-accent)", marginBottom: 16 }}>Distribution of {col1}</h3>
+        <ResponsiveContainer width="100%" height={360}>
+          <BarChart data={data} barCategoryGap={1}>
+            <CartesianGrid strokeDasharray="3 3" />
+            <XAxis dataKey="bin" tick={tick} interval="preserveStartEnd" />
+            <YAxis tick={tick} />
+            <Tooltip contentStyle={tooltip} />
+            <Bar dataKey="count" fill="#7c3aed" name="Frequency" />
+          </BarChart>
+        </ResponsiveContainer>
+      </>
+    );
+  }
+
+  const points = plot.x.map((x: number, i: number) => ({ x, y: plot.y[i] }));
+  return (
+    <>
+      <h3 style={{ fontSize: 14, fontWeight: 600, color: "var(--text-accent)", marginBottom: 16 }}>
+        {col1} vs {col2} {points.length < plot.n && `(${points.length.toLocaleString()} of ${plot.n.toLocaleString()} points)`}
+      </h3>
+      <ResponsiveContainer width="100%" height={400}>
+        <ScatterChart>
+          <CartesianGrid strokeDasharray="3 3" />
+          <XAxis type="number" dataKey="x" name={col1} tick={tick} domain={["auto", "auto"]} />
+          <YAxis type="number" dataKey="y" name={col2} tick={tick} domain={["auto", "auto"]} />
+          <Tooltip contentStyle={tooltip} />
+          <Scatter data={points} fill="#06b6d4" fillOpacity={0.5} isAnimationActive={false} />
+        </ScatterChart>
+      </ResponsiveContainer>
+    </>
+  );
+}
+
 /* ─── Main Dashboard ─────────────────────────────────────────────────── */
 export default function Dashboard() {
   const [file, setFile] = useState<File | null>(null);
+  const [datasetId, setDatasetId] = useState("");
   const [columns, setColumns] = useState<string[]>([]);
   const [target, setTarget] = useState("");
   const [eda, setEda] = useState<any>(null);
   const [edaFull, setEdaFull] = useState<any>(null);
   const [featureStats, setFeatureStats] = useState<any>(null);
   const [statResult, setStatResult] = useState<any>(null);
-  const [plotImg, setPlotImg] = useState("");
+  const [plot, setPlot] = useState<any>(null);
   const [modelResult, setModelResult] = useState<any>(null);
   const [shap, setShap] = useState<any>(null);
   const [preview, setPreview] = useState<any>(null);
@@ -262,12 +344,14 @@ export default function Dashboard() {
     try {
       const res = await axios.post(`${API}/upload`, formData);
       const cols = res.data.dataset_info?.column_names || [];
+      const id = res.data.dataset_id;
+      setDatasetId(id);
       setColumns(cols);
       setStep(1);
       addToast(`Dataset uploaded: ${res.data.dataset_info?.rows} rows, ${cols.length} columns`, "success");
       // auto load preview
       try {
-        const prev = await axios.get(`${API}/preview`);
+        const prev = await axios.get(`${API}/preview?dataset_id=${id}`);
         setPreview(prev.data);
       } catch { }
       setActiveTab("eda");
@@ -279,7 +363,7 @@ export default function Dashboard() {
 
   const loadEDA = async () => {
     try {
-      const res = await axios.get(`${API}/eda`);
+      const res = await axios.get(`${API}/eda?dataset_id=${datasetId}`);
       setEda(res.data);
       setStep(s => Math.max(s, 2));
       setActiveTab("eda");
@@ -289,7 +373,7 @@ export default function Dashboard() {
 
   const loadEdaFull = async () => {
     try {
-      const res = await axios.get(`${API}/eda_full`);
+      const res = await axios.get(`${API}/eda_full?dataset_id=${datasetId}`);
       setEdaFull(res.data);
       setActiveTab("eda_full");
     } catch (err: any) { addToast(err.response?.data?.detail || "EDA Full failed", "error"); }
@@ -297,7 +381,7 @@ export default function Dashboard() {
 
   const loadFeatureStats = async () => {
     try {
-      const res = await axios.get(`${API}/feature_analysis`);
+      const res = await axios.get(`${API}/feature_analysis?dataset_id=${datasetId}`);
       setFeatureStats(res.data);
       setActiveTab("feature");
     } catch (err: any) { addToast(err.response?.data?.detail || "Feature analysis failed", "error"); }
@@ -305,7 +389,7 @@ export default function Dashboard() {
 
   const runStatTest = async (col1: string, col2: string) => {
     try {
-      const res = await axios.get(`${API}/stat_test?col1=${col1}&col2=${col2}`);
+      const res = await axios.get(`${API}/stat_test?dataset_id=${datasetId}&col1=${col1}&col2=${col2}`);
       setStatResult(res.data);
       addToast("🔬 Statistical test complete", "success");
     } catch (err: any) { addToast(err.response?.data?.detail || "Stat test failed", "error"); }
@@ -313,10 +397,10 @@ export default function Dashboard() {
 
   const loadPlot = async (type: string, col1: string, col2?: string) => {
     try {
-      let url = `${API}/plot/${type}?col=${col1}`;
-      if (type === "scatter" && col2) url = `${API}/plot/scatter?col1=${col1}&col2=${col2}`;
+      let url = `${API}/plot/${type}?dataset_id=${datasetId}&col=${col1}&format=data`;
+      if (type === "scatter" && col2) url = `${API}/plot/scatter?dataset_id=${datasetId}&col1=${col1}&col2=${col2}&format=data`;
       const res = await axios.get(url);
-      setPlotImg(res.data.image);
+      setPlot(res.data);
       setActiveTab("plot");
     } catch (err: any) { addToast(err.response?.data?.detail || "Plot failed", "error"); }
   };
@@ -326,18 +410,25 @@ export default function Dashboard() {
     setLoading(true);
     addToast("🚀 Training models... this may take a moment", "info");
     try {
-      const res = await axios.post(`${API}/train?target=${target}`);
-      setModelResult(res.data.result ?? res.data);
+      const res = await axios.post(`${API}/train?dataset_id=${datasetId}&target=${target}`);
+      // Training runs as a background job; poll until it finishes
+      let job = res.data;
+      while (job.status === "queued" || job.status === "running" || job.status === "cancelling") {
+        await new Promise(r => setTimeout(r, 1000));
+        job = (await axios.get(`${API}/jobs/${job.job_id}`)).data;
+      }
+      if (job.status !== "done") throw { response: { data: { detail: job.error || `Training ${job.status}` } } };
+      setModelResult(job.result);
       setStep(s => Math.max(s, 3));
       setActiveTab("model");
-      addToast(`Best model: ${res.data.result?.best_model ?? res.data.best_model}`, "success");
+      addToast(`Best model: ${job.result.best_model}`, "success");
     } catch (err: any) { addToast(err.response?.data?.detail || "Training failed", "error"); }
     setLoading(false);
   };
 
   const loadShap = async () => {
     try {
-      const res = await axios.get(`${API}/shap`);
+      const res = await axios.get(`${API}/shap?dataset_id=${datasetId}&model_id=${modelResult.model_id}`);
       const data = res.data.features.map((f: string, i: number) => ({
         feature: f, importance: res.data.importance[i],
       })).sort((a: any, b: any) => b.importance - a.importance).slice(0, 15);
@@ -460,7 +551,7 @@ export default function Dashboard() {
           {/* Download model */}
           {modelResult && (
             <a
-              href={`${API}/download_model`}
+              href={`${API}/download_model?model_id=${modelResult.model_id}`}
               className="btn-ghost"
               style={{ width: "100%", justifyContent: "center", textDecoration: "none", padding: "10px 12px", fontSize: 13, color: "var(--neon-green)" }}
             >
@@ -722,9 +813,9 @@ export default function Dashboard() {
                   <button type="submit" className="btn-primary" style={{ flexShrink: 0 }}>{Icon.scatter} Generate</button>
                 </form>
               </div>
-              {plotImg && (
-                <div className="glass-card animate-scale-in" style={{ padding: 24, textAlign: "center" }}>
-                  <img src={`data:image/png;base64,${plotImg}`} alt="Plot" style={{ maxWidth: "100%", borderRadius: 12, boxShadow: "0 8px 32px rgba(0,0,0,0.5)" }} />
+              {plot && (
+                <div className="glass-card animate-scale-in" style={{ padding: 24 }}>
+                  <PlotChart plot={plot} />
                 </div>
               )}
             </div>